@@ -0,0 +1,206 @@
+import atexit
+import os
+import queue
+import struct
+import sys
+import threading
+import zipfile
+import zlib
+
+import numpy as np
+
+# Le nombre maximal d'images en attente d'encodage : au-delà, les nouvelles images sont sautées
+TAILLE_FILE = 8
+# Le nombre maximal de fils d'encodage
+NB_FILS_MAX = 4
+# Le niveau de compression zlib des images (rapide : l'espace de simulation est surtout uni)
+COMPRESSION = 3
+# La signature de tout fichier PNG
+SIGNATURE_PNG = b"\x89PNG\r\n\x1a\n"
+
+
+def bloc_png(type_bloc, donnees):
+    """ Crée un bloc d'un fichier PNG : sa taille, son type, ses données et leur somme de contrôle
+    ---
+    paramètres :
+
+        - type_bloc (bytes) le type du bloc, sur 4 octets
+        - donnees (bytes) le contenu du bloc
+
+    résultat :
+
+        - bytes
+    """
+    return struct.pack(">I", len(donnees)) + type_bloc + donnees + struct.pack(">I", zlib.crc32(type_bloc + donnees))
+
+
+def encoder_png(pixels):
+    """ Encode une image en PNG (zlib libère le GIL : plusieurs fils peuvent encoder en même temps)
+    ---
+    paramètre :
+
+        - pixels (np.array(uint8)) l'image, de forme (hauteur, largeur, 3)
+
+    résultat :
+
+        - bytes le contenu du fichier PNG
+    """
+    hauteur, largeur, _ = pixels.shape
+    # Chaque ligne commence par son filtre : 0, aucun filtre
+    lignes = np.zeros((hauteur, 3 * largeur + 1), dtype=np.uint8)
+    lignes[:, 1:] = pixels.reshape(hauteur, 3 * largeur)
+    # 8 bits par canal, couleurs RGB, sans entrelacement
+    en_tete = struct.pack(">IIBBBBB", largeur, hauteur, 8, 2, 0, 0, 0)
+    return SIGNATURE_PNG + bloc_png(b"IHDR", en_tete) + bloc_png(b"IDAT", zlib.compress(lignes, COMPRESSION)) + bloc_png(b"IEND", b"")
+
+
+def copier_surface(surface):
+    """ Copie le contenu d'une surface pygame, le plus vite possible pour ne pas ralentir la simulation
+    ---
+    paramètre :
+
+        - surface (pygame.Surface) la surface à copier
+
+    résultat :
+
+        - tuple(bytes, tuple) les octets de la surface et de quoi les décoder (voir decoder_copie)
+    """
+    largeur, hauteur = surface.get_size()
+    # Pour une surface de 32 bits, on copie la mémoire telle quelle : la conversion en RGB est faite par les fils d'encodage
+    if surface.get_bytesize() == 4:
+        decalages = surface.get_shifts()[:3]
+        # L'ordre des octets de chaque pixel dépend de la machine
+        if sys.byteorder == "big":
+            decalages = tuple(24 - decalage for decalage in decalages)
+        return surface.get_buffer().raw, (largeur, hauteur, surface.get_pitch(), 4, tuple(decalage // 8 for decalage in decalages))
+    # Les autres surfaces sont converties tout de suite
+    import pygame
+    return pygame.image.tobytes(surface, "RGB"), (largeur, hauteur, 3 * largeur, 3, (0, 1, 2))
+
+
+def decoder_copie(octets, format_copie):
+    """ Convertit une copie de surface en tableau de pixels RGB
+    ---
+    paramètres :
+
+        - octets (bytes) les octets copiés par copier_surface
+        - format_copie (tuple) la largeur, la hauteur, le nombre d'octets par ligne et par pixel, et la position des octets rouge, vert et bleu
+
+    résultat :
+
+        - np.array(uint8) de forme (hauteur, largeur, 3)
+    """
+    largeur, hauteur, pas, taille_pixel, canaux = format_copie
+    pixels = np.frombuffer(octets, dtype=np.uint8).reshape(hauteur, pas)[:, :taille_pixel * largeur].reshape(hauteur, largeur, taille_pixel)
+    return pixels[:, :, list(canaux)]
+
+
+class EnregistreurImages:
+
+    def __init__(self, nom, archive=False, taille_file=TAILLE_FILE, nb_fils=None):
+        """ Initialisation de l'enregistreur, qui encode les images d'une simulation en PNG depuis des fils d'exécution dédiés
+        ---
+        paramètres :
+
+            - nom (str) le dossier des images numérotées, ou le fichier zip si archive
+            - archive (bool) si les images sont écrites dans une seule archive zip plutôt qu'en fichiers séparés
+            - taille_file (int) le nombre maximal d'images en attente, au-delà duquel les images sont sautées
+            - nb_fils (int / None) le nombre de fils d'encodage (None pour un par cœur, au plus NB_FILS_MAX)
+        """
+        dossier = os.path.dirname(nom) if archive else nom
+        if dossier and not os.path.exists(dossier):
+            os.makedirs(dossier)
+        self.nom = nom
+        self.archive = zipfile.ZipFile(nom, "w", zipfile.ZIP_STORED) if archive else None
+        # L'archive est partagée par les fils d'encodage
+        self.verrou = threading.Lock()
+        self.numero = 0
+        self.nb_enregistrees = 0
+        self.nb_sautees = 0
+        # Les images en attente d'encodage, None signale la fin à un fil
+        self.file = queue.Queue(taille_file)
+        self.erreur = None
+        self.ferme = False
+        nb_fils = nb_fils or min(NB_FILS_MAX, os.cpu_count())
+        self.fils = [threading.Thread(target=self.encoder, daemon=True) for _ in range(nb_fils)]
+        for fil in self.fils:
+            fil.start()
+        # On garantit l'écriture des dernières images, même si le programme est quitté (Échap)
+        atexit.register(self.fermer)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+    def ajouter(self, surface, numero=None, attendre=False):
+        """ Copie une image pour l'encoder, ou la saute si les fils d'encodage sont en retard
+        ---
+        paramètres :
+
+            - surface (pygame.Surface) la surface à enregistrer (l'écran de la simulation, aussi avec le pilote vidéo "dummy")
+            - numero (int / None) le numéro de l'image, qui donne le nom du fichier (None pour le numéro suivant)
+            - attendre (bool) si on attend une place dans la file plutôt que de sauter l'image (pour ne pas perdre la dernière image)
+
+        résultat :
+
+            - bool (si l'image sera enregistrée)
+        """
+        if numero is None:
+            numero = self.numero
+        self.numero = numero + 1
+        # Quand la file est pleine, on saute l'image sans même la copier : la simulation n'attend jamais l'encodage
+        if not attendre and self.file.full():
+            self.nb_sautees += 1
+            return False
+        self.file.put((numero, *copier_surface(surface)))
+        return True
+
+
+    def encoder(self):
+        """ Boucle d'un fil d'encodage : convertit, encode et écrit chaque image
+        ---
+        """
+        while True:
+            image = self.file.get()
+            if image is None:
+                break
+            # Après une erreur, on vide la file sans rien écrire pour que la simulation ne soit pas bloquée
+            if self.erreur is not None:
+                continue
+            try:
+                numero, octets, format_copie = image
+                png = encoder_png(decoder_copie(octets, format_copie))
+                nom_image = f"image {numero:06d}.png"
+                if self.archive is not None:
+                    with self.verrou:
+                        self.archive.writestr(nom_image, png)
+                else:
+                    with open(os.path.join(self.nom, nom_image), "wb") as f:
+                        f.write(png)
+                with self.verrou:
+                    self.nb_enregistrees += 1
+            except Exception as e:
+                self.erreur = e
+
+
+    def fermer(self):
+        """ Encode les images en attente et ferme l'archive
+        ---
+        """
+        if self.ferme:
+            return
+        self.ferme = True
+        for _ in self.fils:
+            self.file.put(None)
+        for fil in self.fils:
+            fil.join()
+        if self.archive is not None:
+            self.archive.close()
+        atexit.unregister(self.fermer)
+        if self.erreur is not None:
+            raise self.erreur
@@ -0,0 +1,107 @@
+import atexit
+import queue
+import sqlite3
+import threading
+
+# Le nombre maximal de lignes écrites par transaction
+TAILLE_PAQUET = 1000
+
+
+class EnregistreurResultats:
+
+    def __init__(self, nom_fichier, categories, taille_paquet=TAILLE_PAQUET, graine=None):
+        """ Initialisation de l'enregistreur, qui écrit les lignes d'une table Sim{l} depuis un fil d'exécution dédié
+        ---
+        paramètres :
+
+            - nom_fichier (str) le nom de la base de donnée
+            - categories (list(str)) les catégories de la simulation (les colonnes de la table)
+            - taille_paquet (int) le nombre maximal de lignes écrites par transaction
+            - graine (tuple(int, tuple(int)) / None) l'entropie et la clée de la graine de la simulation, enregistrées dans la table Graines pour pouvoir la reproduire
+        """
+        self.nom_fichier = nom_fichier
+        self.categories = list(categories)
+        self.taille_paquet = taille_paquet
+        # On crée la table tout de suite, pour connaître son nom
+        bdd = sqlite3.connect(nom_fichier)
+        # Le journal WAL évite de réécrire la base à chaque transaction, et synchronous=NORMAL évite un fsync par transaction
+        bdd.execute("PRAGMA journal_mode=WAL")
+        # La table des graines est créée avant la première table Sim, qui reste donc toujours la dernière table de la base
+        with bdd:
+            bdd.execute("CREATE TABLE IF NOT EXISTS Graines (simulation text PRIMARY KEY, graine text)")
+        # On récupère le nombre de simulation
+        l = len(bdd.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'Sim%'").fetchall())
+        self.table = f"Sim{l}"
+        # On crée une table portant le numéro suivant, avec la même structure qu'avant
+        with bdd:
+            bdd.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (id integer PRIMARY KEY, {",".join([f'{clee} int' for clee in self.categories])})""")
+            # La graine est écrite en texte : elle peut dépasser 64 bits
+            bdd.execute("INSERT OR REPLACE INTO Graines VALUES (?, ?)", (self.table, None if graine is None else str(graine)))
+        bdd.close()
+
+        # Les lignes en attente d'écriture, None signale la fin
+        self.file = queue.Queue()
+        self.erreur = None
+        self.ferme = False
+        self.fil = threading.Thread(target=self.ecrire, daemon=True)
+        self.fil.start()
+        # On garantit l'écriture des dernières lignes, même si le programme est quitté (Échap)
+        atexit.register(self.fermer)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+    def ajouter(self, ligne):
+        """ Ajoute une ligne à écrire, sans attendre l'écriture
+        ---
+        paramètre :
+
+            - ligne (tuple(float)) une valeur par catégorie
+        """
+        self.file.put(tuple(ligne))
+
+
+    def ecrire(self):
+        """ Boucle du fil d'écriture : regroupe les lignes en attente et les écrit en une transaction
+        ---
+        """
+        bdd = sqlite3.connect(self.nom_fichier)
+        bdd.execute("PRAGMA synchronous=NORMAL")
+        requete = f"INSERT INTO {self.table} VALUES (NULL, {','.join('?' * len(self.categories))})"
+        fin = False
+        try:
+            while not fin:
+                # On attend au moins une ligne, puis on prend toutes celles déjà arrivées
+                lignes = [self.file.get()]
+                while len(lignes) < self.taille_paquet and not self.file.empty():
+                    lignes.append(self.file.get())
+                if lignes[-1] is None:
+                    lignes.pop()
+                    fin = True
+                if lignes:
+                    with bdd:
+                        bdd.executemany(requete, lignes)
+        except Exception as e:
+            self.erreur = e
+        finally:
+            bdd.close()
+
+
+    def fermer(self):
+        """ Écrit les lignes restantes et ferme la base de donnée
+        ---
+        """
+        if self.ferme:
+            return
+        self.ferme = True
+        self.file.put(None)
+        self.fil.join()
+        atexit.unregister(self.fermer)
+        if self.erreur is not None:
+            raise self.erreur
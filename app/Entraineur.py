@@ -96,11 +96,11 @@ class Entraineur:
                 dict_donnee = {'x': [], 'y': []}
                 # On ajoute chaque donnée d'entrée
                 for i in range(taille_paquets):
-                    dict_donnee['x'].append(np.asarray(donnees[pays][n + i], dtype=np.float64))
+                    dict_donnee['x'].append(np.asarray(donnees[pays][n + i], dtype=self.NN.dtype))
                 # Si on reste à 0 tout le long, ce n'est pas intéressant
                 if sum(dict_donnee['x']) != 0:
                     # On ajoute la sorite souhaitée
-                    dict_donnee['y'].append(np.asarray(donnees[pays][n + i + 1], dtype=np.float64))
+                    dict_donnee['y'].append(np.asarray(donnees[pays][n + i + 1], dtype=self.NN.dtype))
                     # On ajoute ce dictionnaire à la liste des données
                     self.paquets_tries[pays].append(dict_donnee)
                     nb_paquets += 1
@@ -168,14 +168,14 @@ class Entraineur:
             self.NN.nb_entrainement += 1
             # On récupère les données de test
             donnee_entrainement, donnee_test = self.extraire_donnees_depuis_paquet(self.donnee_de_test)
-            # On calcule la prédiction du réseau
-            erreur = donnee_test - NN.calcule_sortie(donnee_entrainement)
+            # On calcule la prédiction du réseau, sans garder d'état d'entraînement
+            erreur = donnee_test - self.NN.predire(donnee_entrainement)
             # On calcule l'erreur de la prédiction
             moyenne_erreur = sum(abs(erreur)) / len(erreur)
             print(f"Itération n° {k + 1}  \tPrécision : {(1 - moyenne_erreur[0]) * 100}\t%")
         # On extrait une séquence de test
         donnee_entrainement, donnee_test = self.extraire_donnees_depuis_paquet([self.donnee_de_test[0]])
-        sortie = NN.calcule_sortie(donnee_entrainement)
+        sortie = self.NN.predire(donnee_entrainement)
         # On affiche les résultats
         print(
             f"--- Fin de l'entrainement ---\nNombre d'itération : \t{nb_iteration}\nDurée : \t{datetime.datetime.strftime(datetime.datetime.utcfromtimestamp(time.perf_counter() - t), '%H h %M m %S s')}\nPrédiction : {sortie[0][0]}\t\tAtendu : {donnee_test[0][0]}")
@@ -197,6 +197,70 @@ class Entraineur:
         return [x[0] for x in self.cursor.execute(f"SELECT {categorie} from '{pays}'").fetchall()], N
 
 
+    def fenetres_depart(self, categorie, debut, nb_entree):
+        """ Récupère pour tous les pays de la base de donnée les valeurs de départ d'une prédiction
+        ---
+        paramètres :
+
+            - categorie (str) la catégorie dont on doit tirer les données
+            - debut (int) le jour de la première valeur
+            - nb_entree (int) le nombre de valeurs (celui d'entrée du réseau)
+
+        résultat :
+
+            list(str) (les pays qui ont assez de données et une population connue), np.array (leurs valeurs, de forme (nombre de pays, nb_entree)), np.array(int) (leur nombre de personnes)
+        """
+        liste_pays, fenetres, N = [], [], []
+        for pays in self.liste_pays:
+            valeurs = [x[0] for x in self.cursor.execute(f"SELECT {categorie} from '{pays}' LIMIT {nb_entree} OFFSET {debut}").fetchall()]
+            ligne = self.cursor.execute(f"SELECT Sains from '{pays}' where id = 1").fetchone()
+            # On écarte les pays dont le nombre de personnes est inconnu ou nul, qui sert à normaliser les valeurs
+            if len(valeurs) == nb_entree and ligne is not None and ligne[0] is not None and ligne[0] > 0:
+                liste_pays.append(pays)
+                fenetres.append(valeurs)
+                N.append(ligne[0])
+        return liste_pays, np.array(fenetres, dtype=np.float64).reshape(len(liste_pays), nb_entree), np.array(N, dtype=np.int64)
+
+
+    def prevoir(self, nb_iteration, fenetres, N, NN=None):
+        """ Lance la prédiction d'évolution de plusieurs séquences à la fois (par exemple tous les pays), chaque prédiction étant
+        ajoutée aux entrées de l'itération suivante
+        ---
+        paramètres :
+
+            - nb_iteration (int) le nombre d'itération
+            - fenetres (np.array, de forme (nombre de séquences, nombre d'entrées du réseau)) les valeurs de départ de chaque séquence
+            - N (np.array(int)) le nombre de personnes de chaque séquence, qui normalise les valeurs comme pour l'entraînement
+            - NN (RNN) le réseau à tester (par défaut self.NN)
+
+        résultat :
+
+            np.array (de forme (nombre de séquences, nb_iteration)) les valeurs prédites
+        """
+        # On récupère le réseau
+        NN = self.NN if NN is None else NN
+        N = np.asarray(N, dtype=NN.dtype).reshape(-1, 1)
+        # Les fenêtres normalisées sont des tampons circulaires : la valeur la plus ancienne est dans la colonne tete
+        tampon = np.array(fenetres, dtype=NN.dtype) / N
+        nb_sequences, nb_entree = tampon.shape
+        # L'ordre des colonnes d'une fenêtre pour chaque position de la tête
+        colonnes = np.arange(nb_entree)
+        ordres = (colonnes[:, None] + colonnes) % nb_entree
+        # Les tableaux d'entrée et de sortie du réseau, réutilisés à chaque itération
+        entree = np.empty_like(tampon)
+        sortie = np.empty((nb_sequences, 1), dtype=NN.dtype)
+        res = np.empty((nb_sequences, nb_iteration), dtype=NN.dtype)
+        for k in range(nb_iteration):
+            tete = k % nb_entree
+            # La prédiction du réseau, pour toutes les séquences à la fois
+            np.take(tampon, ordres[tete], axis=1, out=entree)
+            NN.predire(entree, sortie)
+            res[:, k] = sortie[:, 0]
+            # On remplace la valeur la plus ancienne par la prédiction, pour toujours avoir le même nombre d'entrée
+            tampon[:, tete] = sortie[:, 0]
+        return res * N
+
+
     def prediction(self, nb_iteration, sequence_depart, N, NN=None):
         """ Lance une prédiction d'évolution en fonction de l'entrée sur un nombre d'itération donné
         ---
@@ -211,18 +275,7 @@ class Entraineur:
 
             list(float)
         """
-        # On récupère le réseau
-        NN = self.NN if NN is None else NN
-        res = []
-        for _ in range(nb_iteration):
-            # La prédiction du réseau
-            n = NN.calcule_sortie(sequence_depart).tolist()[0][0] * N
-            # On ajoute la donnée au résultat
-            res.append(n)
-            # On élimine la première valeur, et on ajoute la dernière, pour toujours avoir le même nombre d'entrée
-            sequence_depart[0].pop(0)
-            sequence_depart[0].append(n)
-        return res
+        return self.prevoir(nb_iteration, sequence_depart, [N], NN)[0].tolist()
 
 
     def comparer(self, n, nb_model):
@@ -270,9 +323,11 @@ if __name__ == "__main__":
     START = 0
     # On essaie de prédire l'évolution du nombre d'infectés
     TYPE = "Infectés"
+    # Le type des nombres du réseau et des données (np.float32 divise par deux la mémoire et accélère l'entraînement)
+    PRECISION = np.float64
 
 
-    NN = RNN([NB_INPUT, 200, 200, 200, 200, 200, 200, 200, 200, 200, 200, 100, 1], 0, 1e-3)
+    NN = RNN([NB_INPUT, 200, 200, 200, 200, 200, 200, 200, 200, 200, 200, 100, 1], 0, 1e-3, PRECISION)
 
     # ./Model/struct(50-500-500-500-500-500-500-500-50-1)-lr(0.001)-tr(17600).json ~ 60 min
     # ./Model/struct(50-100-100-100-50-1)-lr(0.001)-tr(38800).msgpack peut le faire ~ 3/4 min
@@ -308,6 +363,12 @@ if __name__ == "__main__":
     # Les données générées par le réseau
     y = T.prediction(len(donnees_reeles) - NB_INPUT - START, i, N)
 
+    # La prédiction de tous les pays à la fois, sur la même durée
+    t = time.perf_counter()
+    liste_pays, fenetres, liste_N = T.fenetres_depart(TYPE, START, NB_INPUT)
+    previsions = T.prevoir(len(donnees_reeles) - NB_INPUT - START, fenetres, liste_N)
+    print(f"Prédiction de {len(liste_pays)} pays en {time.perf_counter() - t:.2f} s")
+
     # On affiche les données
     plt.plot(abcsisse, donnees_reeles, label="Réel")
     plt.plot(extraction_abcsisse, y, label="Après itérations")
@@ -0,0 +1,91 @@
+class GrilleSpatiale:
+
+    def __init__(self, taille_cellule):
+        """ Initialisation de la grille de voisinage (hachage spatial uniforme)
+        ---
+        paramètre :
+
+            - taille_cellule (int) le côté d'une cellule, au moins égal à la distance d'interaction
+        """
+        self.taille_cellule = taille_cellule
+        # Le dictionnaire qui à chaque cellule (i, j) associe l'ensemble des indices des personnes qui s'y trouvent
+        self.cellules = {}
+        # La cellule de chaque personne, par indice
+        self.cellule_personne = []
+
+
+    def cellule(self, x, y):
+        """ Donne la cellule contenant le point donné
+        ---
+        paramètres :
+
+            - x (int) la position en abscisse
+            - y (int) la position en ordonnée
+
+        résultat :
+
+            - tuple(int, int)
+        """
+        return int(x // self.taille_cellule), int(y // self.taille_cellule)
+
+
+    def construire(self, personnes):
+        """ Construit la grille depuis la liste des personnes
+        ---
+        paramètre :
+
+            - personnes (list(Personne)) la liste des personnes de la simulation
+        """
+        self.cellules = {}
+        self.cellule_personne = []
+        for indice, personne in enumerate(personnes):
+            cellule = self.cellule(personne.x, personne.y)
+            self.cellules.setdefault(cellule, set()).add(indice)
+            self.cellule_personne.append(cellule)
+
+
+    def deplacer(self, indice, x, y):
+        """ Met à jour la cellule d'une personne après son déplacement
+        ---
+        paramètres :
+
+            - indice (int) l'indice de la personne dans la liste de la simulation
+            - x (int) la nouvelle position en abscisse
+            - y (int) la nouvelle position en ordonnée
+        """
+        cellule = self.cellule(x, y)
+        ancienne = self.cellule_personne[indice]
+        # La personne n'a pas changé de cellule, il n'y a rien à faire
+        if cellule == ancienne:
+            return
+        # On retire la personne de son ancienne cellule, que l'on supprime si elle est vide
+        occupants = self.cellules[ancienne]
+        occupants.discard(indice)
+        if not occupants:
+            del self.cellules[ancienne]
+        # On l'ajoute à la nouvelle
+        self.cellules.setdefault(cellule, set()).add(indice)
+        self.cellule_personne[indice] = cellule
+
+
+    def voisins(self, x, y):
+        """ Donne les indices des personnes des 9 cellules autour du point donné
+        ---
+        paramètres :
+
+            - x (int) la position en abscisse
+            - y (int) la position en ordonnée
+
+        résultat :
+
+            - list(int) (triée, pour parcourir les personnes dans le même ordre que la liste de la simulation)
+        """
+        i, j = self.cellule(x, y)
+        indices = []
+        for ci in (i - 1, i, i + 1):
+            for cj in (j - 1, j, j + 1):
+                occupants = self.cellules.get((ci, cj))
+                if occupants:
+                    indices.extend(occupants)
+        indices.sort()
+        return indices
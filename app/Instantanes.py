@@ -0,0 +1,222 @@
+import atexit
+import glob
+import os
+import queue
+import threading
+import zlib
+
+import msgpack
+import numpy as np
+
+from simulation import Simulation
+
+# Les types msgpack ajoutés pour les tableaux numpy et les entiers de plus de 64 bits (état des générateurs numpy)
+TYPE_TABLEAU = 1
+TYPE_GRAND_ENTIER = 2
+# Le niveau de compression zlib des instantanés
+COMPRESSION = 6
+
+
+def _encoder(objet):
+    """ Convertit un objet en valeurs que msgpack sait écrire
+    ---
+    paramètre :
+
+        - objet l'état à convertir (dict, list, tuple, np.array, int, float, str, bool, None)
+
+    résultat :
+
+        - l'objet converti
+    """
+    if isinstance(objet, dict):
+        return {clee: _encoder(valeur) for clee, valeur in objet.items()}
+    if isinstance(objet, (list, tuple)):
+        return [_encoder(valeur) for valeur in objet]
+    if isinstance(objet, np.ndarray):
+        # Les tableaux sont écrits octet par octet, avec leur type et leur forme
+        return msgpack.ExtType(TYPE_TABLEAU, msgpack.packb([objet.dtype.str, list(objet.shape), np.ascontiguousarray(objet).tobytes()]))
+    if isinstance(objet, np.generic):
+        return objet.item()
+    if isinstance(objet, int) and not -2 ** 63 <= objet < 2 ** 64:
+        return msgpack.ExtType(TYPE_GRAND_ENTIER, str(objet).encode())
+    return objet
+
+
+def _decoder(code, donnees):
+    """ Relit les types ajoutés par _encoder
+    ---
+    paramètres :
+
+        - code (int) le type msgpack
+        - donnees (bytes) le contenu
+
+    résultat :
+
+        - np.array / int
+    """
+    if code == TYPE_TABLEAU:
+        dtype, forme, octets = msgpack.unpackb(donnees)
+        # On copie pour avoir un tableau modifiable
+        return np.frombuffer(octets, dtype=dtype).reshape(forme).copy()
+    if code == TYPE_GRAND_ENTIER:
+        return int(donnees.decode())
+    return msgpack.ExtType(code, donnees)
+
+
+def ecrire_instantane(nom_fichier, etat):
+    """ Écrit l'état d'une simulation dans un fichier binaire compressé
+    ---
+    paramètres :
+
+        - nom_fichier (str) le chemin du fichier
+        - etat (dict) le résultat de Simulation.capturer_etat
+    """
+    donnees = zlib.compress(msgpack.packb(_encoder(etat)), COMPRESSION)
+    # On passe par un fichier temporaire pour ne jamais laisser d'instantané incomplet
+    with open(nom_fichier + ".tmp", "wb") as f:
+        f.write(donnees)
+    os.replace(nom_fichier + ".tmp", nom_fichier)
+
+
+def charger_instantane(nom_fichier):
+    """ Lit l'état d'une simulation écrit par ecrire_instantane
+    ---
+    paramètre :
+
+        - nom_fichier (str) le chemin du fichier
+
+    résultat :
+
+        - dict
+    """
+    with open(nom_fichier, "rb") as f:
+        donnees = f.read()
+    # Les guérisons sont indexées par des numéros d'itération
+    return msgpack.unpackb(zlib.decompress(donnees), ext_hook=_decoder, strict_map_key=False)
+
+
+def dernier_instantane(dossier):
+    """ Donne le plus récent instantané d'un dossier
+    ---
+    paramètre :
+
+        - dossier (str) le dossier des instantanés
+
+    résultat :
+
+        - str / None (le chemin du fichier, None s'il n'y en a pas)
+    """
+    fichiers = sorted(glob.glob(os.path.join(dossier, "Instantane *.bin")))
+    return fichiers[-1] if fichiers else None
+
+
+def reprendre(nom_fichier, ecran=None):
+    """ Recrée une simulation depuis un instantané, qui continuera exactement comme l'originale
+    ---
+    paramètres :
+
+        - nom_fichier (str) le chemin de l'instantané
+        - ecran (Pygame.Surface / None) la surface sur laquelle afficher la simulation, None pour une simulation sans affichage
+
+    résultat :
+
+        - Simulation
+    """
+    etat = charger_instantane(nom_fichier)
+    classe = Simulation
+    if etat["type"] == "SimulationVectorisee":
+        from PopulationVectorisee import SimulationVectorisee as classe
+    elif etat["type"] == "SimulationDistribuee":
+        from SimulationDistribuee import SimulationDistribuee as classe
+    elif etat["type"] == "SimulationEvenements":
+        from SimulationEvenements import SimulationEvenements as classe
+    return classe.depuis_etat(etat, ecran)
+
+
+class Instantanes:
+
+    def __init__(self, dossier, periode, nb_conserves=2):
+        """ Initialisation de l'enregistreur d'instantanés, qui compresse et écrit depuis un fil d'exécution dédié
+        ---
+        paramètres :
+
+            - dossier (str) le dossier des instantanés
+            - periode (int) le nombre d'itérations entre deux instantanés
+            - nb_conserves (int) le nombre d'instantanés gardés sur le disque (les plus anciens sont supprimés)
+        """
+        self.dossier = dossier
+        self.periode = periode
+        self.nb_conserves = nb_conserves
+        if not os.path.exists(dossier):
+            os.makedirs(dossier)
+        # Un seul instantané en attente : si l'écriture prend du retard, on remplace l'ancien plutôt que de bloquer la simulation
+        self.file = queue.Queue(maxsize=1)
+        self.erreur = None
+        self.ferme = False
+        self.fil = threading.Thread(target=self.ecrire, daemon=True)
+        self.fil.start()
+        # On garantit l'écriture du dernier instantané, même si le programme est quitté (Échap)
+        atexit.register(self.fermer)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+    def enregistrer(self, simulation):
+        """ Capture l'état de la simulation si c'est une itération d'instantané, sans attendre l'écriture
+        ---
+        paramètre :
+
+            - simulation (Simulation) la simulation
+        """
+        if simulation.iteration % self.periode:
+            return
+        # La copie est faite ici, la simulation peut donc continuer pendant l'écriture
+        etat = simulation.capturer_etat()
+        try:
+            self.file.put_nowait(etat)
+        except queue.Full:
+            try:
+                self.file.get_nowait()
+            except queue.Empty:
+                pass
+            self.file.put(etat)
+
+
+    def ecrire(self):
+        """ Boucle du fil d'écriture : compresse et écrit chaque instantané, puis supprime les plus anciens
+        ---
+        """
+        try:
+            while True:
+                etat = self.file.get()
+                # None signale la fin
+                if etat is None:
+                    break
+                ecrire_instantane(os.path.join(self.dossier, f"Instantane {etat['iteration']:08d}.bin"), etat)
+                fichiers = sorted(glob.glob(os.path.join(self.dossier, "Instantane *.bin")))
+                for nom_fichier in fichiers[:-self.nb_conserves]:
+                    os.remove(nom_fichier)
+        except Exception as e:
+            self.erreur = e
+
+
+    def fermer(self):
+        """ Écrit l'instantané en attente et arrête le fil d'écriture
+        ---
+        """
+        if self.ferme:
+            return
+        self.ferme = True
+        # L'instantané en attente est écrit avant la fin (sauf si le fil s'est arrêté sur une erreur)
+        if self.fil.is_alive():
+            self.file.put(None)
+        self.fil.join()
+        atexit.unregister(self.fermer)
+        if self.erreur is not None:
+            raise self.erreur
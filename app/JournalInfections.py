@@ -0,0 +1,229 @@
+import atexit
+import os
+import queue
+import struct
+import threading
+import zlib
+
+import numpy as np
+
+# Les colonnes du journal et leur type : l'itération, l'indice de la personne contagieuse, celui de la personne infectée et la position de l'infection
+COLONNES = (("iteration", "<u4"), ("infecteur", "<i4"), ("infecte", "<i4"), ("x", "<i4"), ("y", "<i4"))
+# Le début de tout fichier de journal, suivi de la version du format
+MAGIE = b"JINF"
+VERSION = 1
+# L'en-tête d'un paquet : le nombre d'événements et la taille des colonnes compressées
+EN_TETE_PAQUET = struct.Struct("<II")
+# Le nombre d'événements gardés en mémoire avant d'écrire un paquet
+TAILLE_PAQUET = 65536
+# Le niveau de compression zlib des paquets (rapide : les colonnes triées se compressent bien)
+COMPRESSION = 1
+
+
+class JournalInfections:
+
+    def __init__(self, nom_fichier, taille_paquet=TAILLE_PAQUET):
+        """ Initialisation du journal, qui écrit les infections par paquets de colonnes depuis un fil d'exécution dédié
+        ---
+        paramètres :
+
+            - nom_fichier (str) le chemin du fichier, remplacé s'il existe
+            - taille_paquet (int) le nombre d'événements par paquet
+        """
+        dossier = os.path.dirname(nom_fichier)
+        if dossier and not os.path.exists(dossier):
+            os.makedirs(dossier)
+        self.nom_fichier = nom_fichier
+        self.taille_paquet = taille_paquet
+        # Les colonnes du paquet en cours de remplissage, et leur nombre d'événements
+        self.colonnes = {nom: np.empty(taille_paquet, dtype=dtype) for nom, dtype in COLONNES}
+        self.nb_evenements = 0
+        self.total = 0
+        self.fichier = open(nom_fichier, "wb")
+        self.fichier.write(MAGIE + struct.pack("<I", VERSION))
+        # Les paquets en attente de compression et d'écriture, None signale la fin
+        self.file = queue.Queue()
+        self.erreur = None
+        self.ferme = False
+        self.fil = threading.Thread(target=self.ecrire, daemon=True)
+        self.fil.start()
+        # On garantit l'écriture des derniers événements, même si le programme est quitté (Échap)
+        atexit.register(self.fermer)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+    def ajouter(self, iteration, infecteurs, infectes, x, y):
+        """ Ajoute les infections d'une itération au journal
+        ---
+        paramètres :
+
+            - iteration (int) le numéro de l'itération
+            - infecteurs (np.array(int) / list(int)) l'indice de la personne contagieuse de chaque infection
+            - infectes (np.array(int) / list(int)) l'indice de la personne infectée
+            - x, y (np.array(int) / list(int)) la position de la personne infectée
+        """
+        valeurs = {"infecteur": infecteurs, "infecte": infectes, "x": x, "y": y}
+        n = len(infectes)
+        fait = 0
+        # Les événements sont copiés dans le paquet en cours, qui est envoyé au fil d'écriture dès qu'il est plein
+        while fait < n:
+            nb = min(n - fait, self.taille_paquet - self.nb_evenements)
+            debut, fin = self.nb_evenements, self.nb_evenements + nb
+            self.colonnes["iteration"][debut:fin] = iteration
+            for nom, valeur in valeurs.items():
+                self.colonnes[nom][debut:fin] = valeur[fait:fait + nb]
+            self.nb_evenements = fin
+            fait += nb
+            if self.nb_evenements == self.taille_paquet:
+                self.vider()
+        self.total += n
+
+
+    def vider(self):
+        """ Envoie le paquet en cours au fil d'écriture
+        ---
+        """
+        if not self.nb_evenements:
+            return
+        # Une copie des colonnes est envoyée : le paquet peut aussitôt être rempli de nouveau
+        self.file.put([colonne[:self.nb_evenements].copy() for colonne in self.colonnes.values()])
+        self.nb_evenements = 0
+
+
+    def ecrire(self):
+        """ Boucle du fil d'écriture : compresse et écrit chaque paquet, colonne après colonne
+        ---
+        """
+        try:
+            while True:
+                paquet = self.file.get()
+                if paquet is None:
+                    break
+                donnees = zlib.compress(b"".join(colonne.tobytes() for colonne in paquet), COMPRESSION)
+                self.fichier.write(EN_TETE_PAQUET.pack(len(paquet[0]), len(donnees)))
+                self.fichier.write(donnees)
+        except Exception as e:
+            self.erreur = e
+        finally:
+            self.fichier.close()
+
+
+    def fermer(self):
+        """ Écrit les derniers événements et ferme le fichier
+        ---
+        """
+        if self.ferme:
+            return
+        self.ferme = True
+        self.vider()
+        self.file.put(None)
+        self.fil.join()
+        atexit.unregister(self.fermer)
+        if self.erreur is not None:
+            raise self.erreur
+
+
+def lire_paquets(nom_fichier):
+    """ Lit un journal paquet par paquet, sans le charger entièrement en mémoire
+    ---
+    paramètre :
+
+        - nom_fichier (str) le chemin du journal
+
+    résultat :
+
+        - générateur de dict(str: np.array) les colonnes de chaque paquet
+    """
+    with open(nom_fichier, "rb") as f:
+        en_tete = f.read(len(MAGIE) + 4)
+        if en_tete[:len(MAGIE)] != MAGIE:
+            raise ValueError(f"{nom_fichier} n'est pas un journal d'infections")
+        version, = struct.unpack("<I", en_tete[len(MAGIE):])
+        if version != VERSION:
+            raise ValueError(f"Version {version} du journal non prise en charge")
+        while True:
+            en_tete = f.read(EN_TETE_PAQUET.size)
+            # Un paquet incomplet (programme arrêté pendant l'écriture) termine la lecture
+            if len(en_tete) < EN_TETE_PAQUET.size:
+                return
+            nb, taille = EN_TETE_PAQUET.unpack(en_tete)
+            donnees = f.read(taille)
+            if len(donnees) < taille:
+                return
+            donnees = zlib.decompress(donnees)
+            paquet, debut = {}, 0
+            for nom, dtype in COLONNES:
+                paquet[nom] = np.frombuffer(donnees, dtype=dtype, count=nb, offset=debut)
+                debut += nb * np.dtype(dtype).itemsize
+            yield paquet
+
+
+def lire_journal(nom_fichier):
+    """ Lit tout un journal
+    ---
+    paramètre :
+
+        - nom_fichier (str) le chemin du journal
+
+    résultat :
+
+        - dict(str: np.array) chaque colonne, dans l'ordre des infections
+    """
+    paquets = list(lire_paquets(nom_fichier))
+    return {nom: np.concatenate([paquet[nom] for paquet in paquets]) if paquets else np.empty(0, dtype=dtype) for nom, dtype in COLONNES}
+
+
+def dates_infection(journal, nb_personnes):
+    """ Donne l'itération d'infection de chaque personne
+    ---
+    paramètres :
+
+        - journal (dict(str: np.array)) le résultat de lire_journal
+        - nb_personnes (int) le nombre de personnes de la simulation
+
+    résultat :
+
+        - np.array(int) l'itération d'infection, -1 pour les personnes jamais infectées ou déjà infectées au début
+    """
+    dates = np.full(nb_personnes, -1, dtype=np.int64)
+    dates[journal["infecte"]] = journal["iteration"]
+    return dates
+
+
+def intervalles_generation(journal, nb_personnes):
+    """ Calcule le nombre d'itérations entre l'infection de chaque personne contagieuse et chaque infection qu'elle cause
+    ---
+    paramètres :
+
+        - journal (dict(str: np.array)) le résultat de lire_journal
+        - nb_personnes (int) le nombre de personnes de la simulation
+
+    résultat :
+
+        - np.array(int) un intervalle par infection dont la personne contagieuse a elle-même une infection dans le journal
+    """
+    dates = dates_infection(journal, nb_personnes)[journal["infecteur"]]
+    connues = dates >= 0
+    return journal["iteration"][connues].astype(np.int64) - dates[connues]
+
+
+def infections_secondaires(journal, nb_personnes):
+    """ Compte les personnes infectées par chaque personne (les branches de l'arbre de transmission)
+    ---
+    paramètres :
+
+        - journal (dict(str: np.array)) le résultat de lire_journal
+        - nb_personnes (int) le nombre de personnes de la simulation
+
+    résultat :
+
+        - np.array(int) le nombre d'infections causées par chaque personne
+    """
+    return np.bincount(journal["infecteur"], minlength=nb_personnes)
@@ -0,0 +1,491 @@
+import atexit
+import multiprocessing
+import os
+import time
+
+import msgpack
+import numpy as np
+
+from Profileur import PROFILEUR
+from simulation import Comportement, Etat, creer_simulation, graines_repliques
+
+# Le nombre d'habitants représentés par une personne simulée
+ECHELLE = 100000
+# Le nombre minimal de personnes simulées par pays, pour que les petits pays aient une épidémie
+NB_PERSONNES_MIN = 50
+# La densité des populations, en personnes par million de pixels (comme la simulation affichée)
+DENSITE = 1200
+# Le nombre d'itérations entre deux échanges de voyageurs
+PERIODE_ECHANGE = 10
+# La proportion des personnes simulées qui voyagent à chaque échange
+TAUX_VOYAGE = .002
+# Le nombre d'itérations pendant lesquelles un voyageur arrivé traverse le pays à la vitesse maximale
+DUREE_DEPLACEMENT = 20
+# La distance minimale entre deux pays pour le modèle de gravité (en pixels de la carte), qui évite les flux infinis entre pays voisins
+DISTANCE_MIN = 20
+
+
+def lire_pays(nom_fichier="Pays.msgpack"):
+    """ Lit le nom, la population et le centre de chaque pays
+    ---
+    paramètre :
+
+        - nom_fichier (str) le fichier des pays
+
+    résultat :
+
+        - list(tuple(str, int, tuple(float, float))) le tag, la population et le centre de chaque pays, dans l'ordre du fichier
+    """
+    with open(nom_fichier, "rb") as f:
+        donnees = msgpack.unpackb(f.read())
+    liste_pays = []
+    for pays in donnees:
+        tag, donnees_pays = next(iter(pays.items()))
+        liste_pays.append((tag, donnees_pays["POP_EST"], centre(donnees_pays["geometry"])))
+    return liste_pays
+
+
+def centre(frontiere):
+    """ Donne le centre d'un pays : celui de son plus grand polygone, pour ne pas être déplacé par les îles et les territoires d'outre-mer
+    ---
+    paramètre :
+
+        - frontiere (list(list(tuple))) les polygones du contour du pays
+
+    résultat :
+
+        - tuple(float, float)
+    """
+    def aire(polygone):
+        x, y = polygone[:, 0], polygone[:, 1]
+        return abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1))) / 2
+
+    polygones = [np.array(polygone, dtype=np.float64) for polygone in frontiere]
+    x, y = max(polygones, key=aire).mean(axis=0)
+    return float(x), float(y)
+
+
+def flux_voyageurs(centres, nb_personnes, taux_voyage=TAUX_VOYAGE):
+    """ Calcule le nombre moyen de voyageurs échangés entre chaque paire de pays, selon un modèle de gravité
+    ---
+    paramètres :
+
+        - centres (np.array(float)) le centre de chaque pays, de forme (nb_pays, 2)
+        - nb_personnes (np.array(int)) le nombre de personnes simulées de chaque pays
+        - taux_voyage (float) la proportion des personnes qui voyagent à chaque échange
+
+    résultat :
+
+        - np.array(float) une matrice symétrique de diagonale nulle : le flux de chaque pays vers chaque autre, autant de voyageurs dans chaque sens
+    """
+    distances = np.hypot(*(centres[:, None, :] - centres[None, :, :]).transpose(2, 0, 1))
+    # Le flux est proportionnel aux deux populations et inversement proportionnel au carré de la distance
+    gravite = np.outer(nb_personnes, nb_personnes) / np.maximum(distances, DISTANCE_MIN) ** 2
+    np.fill_diagonal(gravite, 0)
+    # On normalise pour avoir en tout taux_voyage * nb_personnes départs
+    return gravite * (taux_voyage * nb_personnes.sum() / gravite.sum())
+
+
+def repartir_pays(nb_personnes, nb_groupes):
+    """ Répartit les pays entre des groupes de tailles proches, les plus grands pays d'abord
+    ---
+    paramètres :
+
+        - nb_personnes (np.array(int)) le nombre de personnes simulées de chaque pays
+        - nb_groupes (int) le nombre de groupes
+
+    résultat :
+
+        - list(np.array(int)) les indices des pays de chaque groupe, triés
+    """
+    groupes = [[] for _ in range(nb_groupes)]
+    charges = np.zeros(nb_groupes, dtype=np.int64)
+    for k in np.argsort(-nb_personnes, kind="stable").tolist():
+        g = int(np.argmin(charges))
+        groupes[g].append(k)
+        charges[g] += nb_personnes[k]
+    return [np.array(sorted(groupe), dtype=np.int64) for groupe in groupes]
+
+
+def _lancer_groupe(connexion, *arguments):
+    """ Boucle d'un processus de groupe de pays : exécute les commandes de la métapopulation jusqu'à la commande "fin"
+    ---
+    paramètres :
+
+        - connexion (Connection) la liaison avec la métapopulation
+        - arguments les paramètres de GroupePays
+    """
+    # Chaque groupe a son processus, les noyaux numba n'ont donc pas besoin de fils d'exécution supplémentaires
+    from numba import set_num_threads
+    set_num_threads(1)
+    groupe = GroupePays(*arguments)
+    try:
+        while True:
+            commande, *parametres = connexion.recv()
+            if commande == "fin":
+                break
+            connexion.send(getattr(groupe, commande)(*parametres))
+    except Exception as e:
+        # L'erreur est renvoyée à la métapopulation, qui la relance
+        connexion.send(e)
+
+
+# Les simulations d'une partie des pays, avancées ensemble dans un même processus.
+# Chaque pays a sa propre simulation vectorisée et son propre générateur : le résultat ne dépend pas de la répartition des pays.
+class GroupePays:
+
+    def __init__(self, pays, parametres, duree_deplacement):
+        """ Initialisation des simulations du groupe
+        ---
+        paramètres :
+
+            - pays (list(tuple(int, int, np.random.SeedSequence, bool))) pour chaque pays : le nombre de personnes, le côté de son espace, sa graine et s'il a une personne infectée au départ
+            - parametres (dict) les paramètres de creer_simulation communs à tous les pays (la quarantaine en proportion de la population)
+            - duree_deplacement (int) le nombre d'itérations pendant lesquelles un voyageur arrivé se déplace
+        """
+        parametres = dict(parametres)
+        proportion = parametres.pop("proportion_quarantaine")
+        self.simulations = []
+        for nb_personnes, cote, graine, foyer in pays:
+            simulation = creer_simulation(nb_personnes, cote, cote, round(proportion * nb_personnes), graine=graine, vectorise=True, **parametres)
+            # La simulation infecte toujours sa première personne, que l'on guérit hors des foyers
+            if not foyer:
+                simulation.remplacer_etats(np.zeros(1, dtype=np.int64), np.array([Etat.SAIN.value], dtype=np.int8), np.full(1, -1, dtype=np.int64))
+            self.simulations.append(simulation)
+        self.duree_deplacement = duree_deplacement
+        # Pour chaque pays, les voyageurs en déplacement, par itération de fin du déplacement
+        self.deplacements = [{} for _ in pays]
+        # Pour chaque pays, les personnes choisies pour l'échange en cours
+        self.places = [np.empty(0, dtype=np.int64) for _ in pays]
+
+
+    def avancer(self, nb_iterations):
+        """ Avance chaque simulation du groupe de plusieurs itérations
+        ---
+        paramètre :
+
+            - nb_iterations (int) le nombre d'itérations
+
+        résultats :
+
+            - np.array(int32) les sains, infectés et rétablis de chaque pays après chaque itération, de forme (nb_iterations, nb_pays, 3)
+            - np.array(bool) si chaque pays est en quarantaine à la fin
+        """
+        effectifs = np.empty((nb_iterations, len(self.simulations), 3), dtype=np.int32)
+        for k, simulation in enumerate(self.simulations):
+            deplacements = self.deplacements[k]
+            for t in range(nb_iterations):
+                # Un pays sans infecté n'a que ses déplacements à calculer, mais il reste avancé pour que tous les pays aient la même itération
+                simulation.mise_a_jour()
+                # Les voyageurs arrivés au bout de leur déplacement reprennent le comportement du pays
+                for indice in deplacements.pop(simulation.iteration, []):
+                    simulation.politique.retirer_exception(indice)
+                effectifs[t, k] = simulation.effectifs
+        quarantaines = np.array([simulation.politique.comportement == Comportement.QUARANTAINE for simulation in self.simulations])
+        return effectifs, quarantaines
+
+
+    def sortants(self, nombres):
+        """ Choisit les voyageurs qui quittent chaque pays du groupe
+        ---
+        paramètre :
+
+            - nombres (list(list(tuple(int, int)))) pour chaque pays, les pays de destination (dans l'ordre) et le nombre de voyageurs vers chacun
+
+        résultat :
+
+            - list(list(tuple(int, np.array(int), np.array(int)))) pour chaque pays et chaque destination : la destination, l'état et l'itération de guérison des voyageurs
+        """
+        departs = []
+        for k, simulation in enumerate(self.simulations):
+            total = sum(nombre for _, nombre in nombres[k])
+            # Les voyageurs qui partent laissent leur place à ceux qui arrivent (autant que de départs vers chaque pays)
+            self.places[k] = simulation.generateur.choice(simulation.nb_personnes, total, replace=False)
+            etats, guerisons = simulation.etats_personnes(self.places[k])
+            debuts = np.cumsum([0] + [nombre for _, nombre in nombres[k]])
+            departs.append([(destination, etats[debut:fin], guerisons[debut:fin]) for (destination, _), debut, fin in zip(nombres[k], debuts, debuts[1:])])
+        return departs
+
+
+    def entrants(self, arrivees):
+        """ Place les voyageurs arrivés dans chaque pays du groupe, à la place de ceux qui sont partis
+        ---
+        paramètre :
+
+            - arrivees (list(tuple(np.array(int), np.array(int)))) pour chaque pays, l'état et l'itération de guérison des voyageurs, dans l'ordre des départs
+        """
+        for k, simulation in enumerate(self.simulations):
+            places = self.places[k]
+            if not len(places):
+                continue
+            etats, guerisons = arrivees[k]
+            simulation.remplacer_etats(places, etats, guerisons)
+            # Les voyageurs traversent le pays avant de se comporter comme ses habitants
+            for indice in places.tolist():
+                simulation.politique.ajouter_exception(indice, Comportement.DEPLACEMENT)
+            self.deplacements[k].setdefault(simulation.iteration + self.duree_deplacement, []).extend(places.tolist())
+            self.places[k] = np.empty(0, dtype=np.int64)
+
+
+    def fermer(self):
+        """ Libère les ressources des simulations
+        ---
+        """
+        for simulation in self.simulations:
+            simulation.fermer()
+
+
+# Une simulation par pays, avancées en parallèle par groupes de pays et reliées par des échanges périodiques de voyageurs
+class Metapopulation:
+
+    def __init__(self, liste_pays, foyers, echelle=ECHELLE, proportion_quarantaine=0, seuil=.5, p=.5, rayon=6, compile=False,
+                 taux_voyage=TAUX_VOYAGE, periode=PERIODE_ECHANGE, duree_deplacement=DUREE_DEPLACEMENT, graine=None, nb_processus=None):
+        """ Initialisation de la métapopulation
+        ---
+        paramètres :
+
+            - liste_pays (list(tuple(str, int, tuple(float, float)))) le tag, la population et le centre de chaque pays (voir lire_pays)
+            - foyers (list(str)) les tags des pays qui ont une personne infectée au départ
+            - echelle (int) le nombre d'habitants représentés par une personne simulée
+            - proportion_quarantaine (float) la proportion de la population d'un pays infectée qui déclenche sa quarantaine (0 pour aucune mesure)
+            - seuil (float 0 <= seuil <= 1) le pourcentage du seuil de quarantaine à atteindre afin d'y mettre fin
+            - p (float, 0 <= p <= 1) la probabilité de contaminer une personne
+            - rayon (int) la taille des personnes
+            - compile (bool) si les populations sont calculées par les noyaux numba
+            - taux_voyage (float) la proportion des personnes qui voyagent à chaque échange
+            - periode (int) le nombre d'itérations entre deux échanges de voyageurs
+            - duree_deplacement (int) le nombre d'itérations pendant lesquelles un voyageur arrivé se déplace
+            - graine (int / None) la graine de la métapopulation (None pour en tirer une au hasard)
+            - nb_processus (int / None) le nombre de processus (None pour un par cœur, 0 pour tout calculer dans ce processus)
+        """
+        self.tags = [tag for tag, _, _ in liste_pays]
+        inconnus = set(foyers) - set(self.tags)
+        if inconnus:
+            raise ValueError(f"Pays inconnus : {', '.join(sorted(inconnus))}")
+        self.nb_pays = len(liste_pays)
+        self.nb_personnes = np.array([max(NB_PERSONNES_MIN, round(pop / echelle)) for _, pop, _ in liste_pays], dtype=np.int64)
+        # L'espace de chaque pays est carré, de côté choisi pour avoir la même densité partout
+        cotes = np.round(np.sqrt(self.nb_personnes / DENSITE) * 1000).astype(np.int64)
+        self.flux = flux_voyageurs(np.array([c for _, _, c in liste_pays], dtype=np.float64), self.nb_personnes, taux_voyage)
+        self.periode = periode
+        self.iteration = 0
+        # Une graine par pays, et une pour les tirages des échanges
+        self.graine, graines = graines_repliques(self.nb_pays + 1, graine)
+        self.generateur = np.random.default_rng(graines[-1])
+        # Les sains, infectés et rétablis de chaque pays à chaque itération, dans un tableau agrandi au besoin
+        self.effectifs = np.zeros((0, self.nb_pays, 3), dtype=np.int32)
+        self.quarantaines = np.zeros(self.nb_pays, dtype=bool)
+        self.terminee = False
+
+        parametres = {"proportion_quarantaine": proportion_quarantaine, "seuil": seuil, "p": p, "rayon": rayon, "compile": compile}
+        pays = [(int(n), int(cote), g, tag in foyers) for n, cote, g, tag in zip(self.nb_personnes, cotes, graines, self.tags)]
+        nb_processus = os.cpu_count() if nb_processus is None else nb_processus
+        self.groupes = repartir_pays(self.nb_personnes, max(1, min(nb_processus, self.nb_pays)))
+        self.ferme = False
+        self.connexions, self.processus = [], []
+        # Sans processus, un seul groupe calculé ici
+        if not nb_processus:
+            self.local = GroupePays(pays, parametres, duree_deplacement)
+            return
+        self.local = None
+        # spawn plutôt que fork : les processus ne doivent pas hériter des fils d'exécution de numba
+        contexte = multiprocessing.get_context("spawn")
+        for groupe in self.groupes:
+            connexion, connexion_groupe = contexte.Pipe()
+            processus = contexte.Process(target=_lancer_groupe, daemon=True,
+                                         args=(connexion_groupe, [pays[k] for k in groupe.tolist()], parametres, duree_deplacement))
+            processus.start()
+            connexion_groupe.close()
+            self.connexions.append(connexion)
+            self.processus.append(processus)
+        # On arrête les processus, même si le programme est quitté
+        atexit.register(self.fermer)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+    def commander(self, commande, parametres=None):
+        """ Envoie une commande à chaque groupe de pays et attend leurs réponses
+        ---
+        paramètres :
+
+            - commande (str) le nom de la méthode de GroupePays
+            - parametres (list(tuple) / None) les paramètres de chaque groupe (None pour aucun)
+
+        résultat :
+
+            - list une réponse par groupe
+        """
+        if parametres is None:
+            parametres = [()] * len(self.groupes)
+        if self.local is not None:
+            return [getattr(self.local, commande)(*parametres[0])]
+        for connexion, parametres_groupe in zip(self.connexions, parametres):
+            connexion.send((commande, *parametres_groupe))
+        reponses = [connexion.recv() for connexion in self.connexions]
+        for reponse in reponses:
+            if isinstance(reponse, Exception):
+                raise reponse
+        return reponses
+
+
+    def mise_a_jour(self):
+        """ Avance tous les pays d'une période, puis échange les voyageurs
+        ---
+        """
+        with PROFILEUR.phase("pays"):
+            reponses = self.commander("avancer", [(self.periode,)] * len(self.groupes))
+        # On agrandit le tableau des effectifs en doublant sa taille, pour ne pas le recopier à chaque période
+        fin = self.iteration + self.periode
+        if fin > len(self.effectifs):
+            effectifs = np.zeros((max(fin, 2 * len(self.effectifs)), self.nb_pays, 3), dtype=np.int32)
+            effectifs[:self.iteration] = self.effectifs[:self.iteration]
+            self.effectifs = effectifs
+        for groupe, (effectifs, quarantaines) in zip(self.groupes, reponses):
+            self.effectifs[self.iteration:fin, groupe] = effectifs
+            self.quarantaines[groupe] = quarantaines
+        self.iteration = fin
+        # Sans infecté nulle part, l'épidémie est terminée
+        if not self.effectifs[fin - 1, :, 1].any():
+            self.terminee = True
+            return
+        with PROFILEUR.phase("echange"):
+            self.echanger()
+
+
+    def echanger(self):
+        """ Tire le nombre de voyageurs entre chaque paire de pays et échange leurs états
+        ---
+        """
+        # Les pays en quarantaine ferment leurs frontières
+        ouverts = ~self.quarantaines
+        esperance = np.triu(self.flux * np.outer(ouverts, ouverts), 1)
+        nombres = self.generateur.poisson(esperance)
+        nombres = nombres + nombres.T
+        # Un pays ne peut pas envoyer plus de voyageurs que de personnes : on réduit ses échanges dans les deux sens
+        facteur = np.minimum(1, self.nb_personnes / np.maximum(nombres.sum(axis=1), 1))
+        nombres = np.floor(nombres * np.minimum.outer(facteur, facteur)).astype(np.int64)
+        if not nombres.any():
+            return
+
+        # Les voyageurs de a vers b prennent la place de ceux de b vers a : chaque pays liste ses partenaires dans l'ordre
+        departs = self.commander("sortants", [([[(b, nombres[a, b]) for b in np.flatnonzero(nombres[a]).tolist()] for a in groupe.tolist()],)
+                                              for groupe in self.groupes])
+        recus = [[] for _ in range(self.nb_pays)]
+        for groupe, departs_groupe in zip(self.groupes, departs):
+            for a, departs_pays in zip(groupe.tolist(), departs_groupe):
+                for b, etats, guerisons in departs_pays:
+                    recus[b].append((a, etats, guerisons))
+        arrivees = []
+        for groupe in self.groupes:
+            arrivees_groupe = []
+            for b in groupe.tolist():
+                # Les voyageurs sont rangés par pays d'origine, comme les places libérées le sont par pays de destination
+                recus[b].sort(key=lambda recu: recu[0])
+                if recus[b]:
+                    arrivees_groupe.append((np.concatenate([etats for _, etats, _ in recus[b]]), np.concatenate([guerisons for _, _, guerisons in recus[b]])))
+                else:
+                    arrivees_groupe.append((np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int64)))
+            arrivees.append((arrivees_groupe,))
+        self.commander("entrants", arrivees)
+
+
+    def executer(self, nb_iterations_max=None):
+        """ Avance la métapopulation jusqu'à la fin de l'épidémie
+        ---
+        paramètre :
+
+            - nb_iterations_max (int / None) le nombre maximal d'itérations (None pour aller jusqu'à la fin de l'épidémie)
+        """
+        while not self.terminee and (nb_iterations_max is None or self.iteration < nb_iterations_max):
+            self.mise_a_jour()
+
+
+    def series(self):
+        """ Donne les effectifs de chaque pays depuis le début
+        ---
+        résultat :
+
+            - np.array(int32) les sains, infectés et rétablis de chaque pays après chaque itération, de forme (nb_iterations, nb_pays, 3)
+        """
+        return self.effectifs[:self.iteration]
+
+
+    def donnees(self, tag):
+        """ Donne les effectifs d'un pays, au format des données d'une simulation
+        ---
+        paramètre :
+
+            - tag (str) le tag du pays
+
+        résultat :
+
+            - dict(str: list(int))
+        """
+        effectifs = self.series()[:, self.tags.index(tag)]
+        return {clee: effectifs[:, k].tolist() for k, clee in enumerate(("Sains", "Infectés", "Rétablis"))}
+
+
+    def enregistrer(self, nom_fichier):
+        """ Écrit les effectifs de chaque pays dans un fichier npz compressé
+        ---
+        paramètre :
+
+            - nom_fichier (str) le chemin du fichier
+        """
+        dossier = os.path.dirname(nom_fichier)
+        if dossier and not os.path.exists(dossier):
+            os.makedirs(dossier)
+        np.savez_compressed(nom_fichier, tags=np.array(self.tags), nb_personnes=self.nb_personnes, effectifs=self.series(), graine=str(self.graine))
+
+
+    def fermer(self):
+        """ Arrête les processus des groupes de pays
+        ---
+        """
+        if self.ferme:
+            return
+        self.ferme = True
+        if self.local is not None:
+            self.local.fermer()
+            return
+        for connexion in self.connexions:
+            try:
+                connexion.send(("fin",))
+            except (BrokenPipeError, OSError):
+                pass
+        for processus in self.processus:
+            processus.join()
+        atexit.unregister(self.fermer)
+
+
+if __name__ == "__main__":
+    # Les pays où commence l'épidémie
+    FOYERS = ["CHN"]
+    # Le nombre d'habitants par personne simulée
+    ECHELLE_SIMULATION = ECHELLE
+    # La proportion de la population d'un pays infectée qui déclenche sa quarantaine (0 pour aucune mesure)
+    PROPORTION_QUARANTAINE = .05
+    # Le nombre maximal d'itérations
+    NB_ITERATIONS_MAX = 3000
+    # La graine de la métapopulation
+    GRAINE = 0
+    # Le dossier de sauvegarde
+    NOM_DOSSIER = os.path.join("Simulation", "Métapopulation")
+
+    t = time.perf_counter()
+    with Metapopulation(lire_pays(), FOYERS, ECHELLE_SIMULATION, PROPORTION_QUARANTAINE, graine=GRAINE) as metapopulation:
+        print(f"{metapopulation.nb_pays} pays, {metapopulation.nb_personnes.sum()} personnes, {len(metapopulation.groupes)} processus")
+        while not metapopulation.terminee and metapopulation.iteration < NB_ITERATIONS_MAX:
+            metapopulation.mise_a_jour()
+            if metapopulation.iteration % 100 == 0:
+                sains, infectes, retablis = metapopulation.series()[-1].sum(axis=0).tolist()
+                print(f"Itération {metapopulation.iteration} : {sains} sains, {infectes} infectés, {retablis} rétablis, "
+                      f"{np.count_nonzero(metapopulation.series()[-1, :, 1])} pays avec des infectés ({time.perf_counter() - t:.1f} s)")
+    metapopulation.enregistrer(os.path.join(NOM_DOSSIER, f"Métapopulation - Échelle {ECHELLE_SIMULATION}, graine {metapopulation.graine}.npz"))
@@ -0,0 +1,342 @@
+import math
+
+import numpy as np
+# Cette bibliothète convertit le code python en code C pour accelérer les calculs, cache=True conserve le code compilé entre deux lancements
+from numba import njit, prange
+
+from PopulationVectorisee import PopulationVectorisee
+from Profileur import PROFILEUR
+from simulation import Comportement, Etat
+
+
+@njit(cache=True)
+def _construire_cellules(x, y, taille_cellule):
+    """ Range les personnes par cellule (tri par comptage)
+    ---
+    paramètres :
+
+        - x (np.array(int)) les positions en abscisse
+        - y (np.array(int)) les positions en ordonnée
+        - taille_cellule (int) le côté d'une cellule
+
+    résultats :
+
+        - np.array(int) la cellule de chaque personne
+        - np.array(int) l'indice, dans ordre, de la première personne de chaque cellule (une case de plus que de cellules)
+        - np.array(int) les indices des personnes, rangées par cellule
+        - int la hauteur de la grille, en nombre de cellules
+    """
+    n = len(x)
+    cx = np.empty(n, np.int64)
+    cy = np.empty(n, np.int64)
+    for i in range(n):
+        cx[i] = x[i] // taille_cellule
+        cy[i] = y[i] // taille_cellule
+    # On laisse une cellule vide de chaque côté pour ne pas avoir à tester les bords
+    cx_min, cy_min = cx.min(), cy.min()
+    largeur = cx.max() - cx_min + 3
+    hauteur = cy.max() - cy_min + 3
+    cles = (cx - cx_min + 1) * hauteur + (cy - cy_min + 1)
+    debut = np.zeros(largeur * hauteur + 1, np.int64)
+    for i in range(n):
+        debut[cles[i] + 1] += 1
+    for c in range(largeur * hauteur):
+        debut[c + 1] += debut[c]
+    ordre = np.empty(n, np.int64)
+    place = debut[:-1].copy()
+    for i in range(n):
+        ordre[place[cles[i]]] = i
+        place[cles[i]] += 1
+    return cles, debut, ordre, hauteur
+
+
+@njit(cache=True)
+def _corriger_vitesse(vx, vy, x, y, vmax, largeur_sim, hauteur_sim):
+    """ Renormalise la vitesse si elle dépasse la vitesse maximale, et la renvoie dans l'autre sens si on touche un bord
+    ---
+    paramètres :
+
+        - vx, vy (float) la vitesse après application de l'accélération
+        - x, y (int) la position
+        - vmax (float) la vitesse maximale
+        - largeur_sim, hauteur_sim (int) les dimensions de l'espace de simulation
+
+    résultat :
+
+        - float, float (la nouvelle vitesse)
+    """
+    v = vx ** 2 + vy ** 2
+    if v > vmax ** 2:
+        r = vmax / math.sqrt(v)
+        vx *= r
+        vy *= r
+    if x > largeur_sim or x < 0:
+        vx = - vx
+    if y > hauteur_sim or y < 0:
+        vy = - vy
+    return vx, vy
+
+
+@njit(cache=True, parallel=True)
+def _mettre_a_jour_vitesses_sans_repulsion(x, y, vx, vy, vmax, largeur_sim, hauteur_sim):
+    """ Calcule les nouvelles vitesses quand personne n'est en quarantaine, en parallèle sur les personnes
+    ---
+    paramètres :
+
+        - x, y (np.array(int)) les positions
+        - vx, vy (np.array(float)) les vitesses, modifiées sur place
+        - vmax (float) la vitesse maximale
+        - largeur_sim, hauteur_sim (int) les dimensions de l'espace de simulation
+    """
+    for i in prange(len(x)):
+        vx[i], vy[i] = _corriger_vitesse(vx[i], vy[i], x[i], y[i], vmax, largeur_sim, hauteur_sim)
+
+
+@njit(cache=True, parallel=True)
+def _mettre_a_jour_vitesses(x, y, vx, vy, nb_personnes, comportement, code_quarantaine, code_deplacement, rayon, k, f, vmax, largeur_sim, hauteur_sim, debut, ordre, hauteur):
+    """ Calcule les nouvelles vitesses (répulsion, frottement, renormalisation, rebonds), en parallèle sur les cellules
+    ---
+    paramètres :
+
+        - x, y (np.array(int)) les positions, les personnes au-delà de nb_personnes ne servent que de voisines
+        - vx, vy (np.array(float)) les vitesses, modifiées sur place
+        - nb_personnes (int) le nombre de personnes à faire avancer
+        - comportement (np.array(int)) le comportement de chaque personne à faire avancer, donné par les groupes de la politique
+        - code_quarantaine, code_deplacement (int) les valeurs de Comportement.QUARANTAINE et Comportement.DEPLACEMENT
+        - rayon, k, f, vmax (float) les constantes de Personne
+        - largeur_sim, hauteur_sim (int) les dimensions de l'espace de simulation
+        - debut, ordre, hauteur le résultat de _construire_cellules
+    """
+    portee = 5 * rayon
+    # Chaque fil traite les personnes de ses cellules, et n'écrit que leurs vitesses
+    for c in prange(len(debut) - 1):
+        for n in range(debut[c], debut[c + 1]):
+            i = ordre[n]
+            if i >= nb_personnes:
+                continue
+            ax = 0.
+            ay = 0.
+            if comportement[i] == code_quarantaine:
+                for ddx in range(-1, 2):
+                    for ddy in range(-1, 2):
+                        c2 = c + ddx * hauteur + ddy
+                        for m in range(debut[c2], debut[c2 + 1]):
+                            j = ordre[m]
+                            if j != i:
+                                dx = abs(x[i] - x[j])
+                                dy = abs(y[i] - y[j])
+                                if dx < portee and dy < portee:
+                                    angle = math.atan2(y[i] - y[j], x[i] - x[j])
+                                    force = k * (math.hypot(dy, dx) - 2 * rayon)
+                                    ax += force * math.cos(angle)
+                                    ay += force * math.sin(angle)
+                ax -= f * vx[i]
+                ay -= f * vy[i]
+            # Les personnes qui se déplacent vont tout droit à la vitesse maximale
+            elif comportement[i] == code_deplacement:
+                v = math.hypot(vx[i], vy[i])
+                if v > 0:
+                    vx[i] *= vmax / v
+                    vy[i] *= vmax / v
+            vx[i], vy[i] = _corriger_vitesse(vx[i] + ax, vy[i] + ay, x[i], y[i], vmax, largeur_sim, hauteur_sim)
+
+
+@njit(cache=True, parallel=True)
+def _vitesse_maximale(indices, vx, vy, vmax):
+    """ Porte la vitesse des personnes données à la vitesse maximale, sans changer leur direction
+    ---
+    paramètres :
+
+        - indices (np.array(int)) les indices des personnes qui se déplacent
+        - vx, vy (np.array(float)) les vitesses, modifiées sur place
+        - vmax (float) la vitesse maximale
+    """
+    for n in prange(len(indices)):
+        i = indices[n]
+        v = math.hypot(vx[i], vy[i])
+        if v > 0:
+            vx[i] *= vmax / v
+            vy[i] *= vmax / v
+
+
+def mettre_a_jour_vitesses(groupes, x, y, vx, vy, nb_personnes, rayon, k, f, vmax, largeur_sim, hauteur_sim):
+    """ Calcule les nouvelles vitesses des nb_personnes premières personnes, selon le comportement de leur groupe
+    ---
+    paramètres :
+
+        - groupes (list(tuple(Comportement, np.array(int) / None))) les groupes de la politique, avec les positions de leurs personnes (None pour toutes)
+        - x, y (np.array(int)) les positions, les personnes au-delà de nb_personnes ne servent que de voisines
+        - vx, vy (np.array(float)) les vitesses, modifiées sur place
+        - nb_personnes (int) le nombre de personnes à faire avancer
+        - rayon, k, f, vmax (float) les constantes de Personne
+        - largeur_sim, hauteur_sim (int) les dimensions de l'espace de simulation
+    """
+    # Sans quarantaine, il n'y a pas de répulsion et donc pas besoin de ranger les personnes par cellule
+    if not any(comportement == Comportement.QUARANTAINE and (indices is None or len(indices)) for comportement, indices in groupes):
+        for comportement, indices in groupes:
+            if comportement == Comportement.DEPLACEMENT:
+                _vitesse_maximale(np.arange(nb_personnes) if indices is None else indices, vx, vy, float(vmax))
+        _mettre_a_jour_vitesses_sans_repulsion(x[:nb_personnes], y[:nb_personnes], vx[:nb_personnes], vy[:nb_personnes], float(vmax), largeur_sim, hauteur_sim)
+        return
+    # Les groupes deviennent un masque : le comportement de chaque personne, lu par le noyau parallèle sur les cellules
+    comportement = np.empty(nb_personnes, dtype=np.int8)
+    for valeur, indices in groupes:
+        comportement[slice(None) if indices is None else indices] = valeur.value
+    with PROFILEUR.phase("repulsion"):
+        cles, debut, ordre, hauteur = _construire_cellules(x, y, 5 * rayon)
+        _mettre_a_jour_vitesses(x, y, vx, vy, nb_personnes, comportement, Comportement.QUARANTAINE.value, Comportement.DEPLACEMENT.value,
+                                float(rayon), float(k), float(f), float(vmax), largeur_sim, hauteur_sim, debut, ordre, hauteur)
+
+
+@njit(cache=True, parallel=True)
+def _deplacer(x, y, vx, vy):
+    """ Applique le schéma d'Euler pour la position (troncature, comme int())
+    ---
+    paramètres :
+
+        - x, y (np.array(int)) les positions, modifiées sur place
+        - vx, vy (np.array(float)) les vitesses
+    """
+    for i in prange(len(x)):
+        x[i] += int(vx[i])
+        y[i] += int(vy[i])
+
+
+@njit(cache=True, parallel=True)
+def _propager_infection(contagieux, x, y, etat, code_sain, rayon, debut, ordre, cles, hauteur, touche):
+    """ Marque les personnes saines en collision avec une personne contagieuse, en parallèle sur les personnes contagieuses
+    ---
+    paramètres :
+
+        - contagieux (np.array(int)) les indices des personnes infectées dont le tirage est favorable
+        - x, y (np.array(int)) les positions
+        - etat (np.array(int)) l'état de chaque personne
+        - code_sain (int) la valeur de Etat.SAIN
+        - rayon (float) la taille des personnes
+        - debut, ordre, cles, hauteur le résultat de _construire_cellules
+        - touche (np.array(bool)) mis à True pour chaque personne touchée (plusieurs fils peuvent écrire la même valeur)
+    """
+    for n in prange(len(contagieux)):
+        i = contagieux[n]
+        for ddx in range(-1, 2):
+            for ddy in range(-1, 2):
+                c2 = cles[i] + ddx * hauteur + ddy
+                for m in range(debut[c2], debut[c2 + 1]):
+                    j = ordre[m]
+                    if etat[j] == code_sain:
+                        # Le même test que Personne.collision
+                        dx = x[i] - x[j]
+                        dy = y[i] - y[j]
+                        if dx < 1.5 * 2 * rayon and dy < 1.5 * 2 * rayon and dx ** 2 + dy ** 2 <= 4 * 4 * rayon ** 2:
+                            touche[j] = True
+
+
+@njit(cache=True, parallel=True)
+def _trouver_infecteurs(nouveaux, est_contagieux, x, y, rayon, debut, ordre, cles, hauteur, numeros, infecteurs):
+    """ Cherche, pour chaque personne nouvellement infectée, la personne contagieuse de plus petit numéro qui la touche
+    ---
+    paramètres :
+
+        - nouveaux (np.array(int)) les indices des personnes nouvellement infectées
+        - est_contagieux (np.array(bool)) si chaque personne est contagieuse à cette itération
+        - x, y (np.array(int)) les positions
+        - rayon (float) la taille des personnes
+        - debut, ordre, cles, hauteur le résultat de _construire_cellules
+        - numeros (np.array(int)) le numéro de chaque personne dans la simulation
+        - infecteurs (np.array(int)) le numéro de la personne contagieuse pour chaque personne de nouveaux, rempli ici
+    """
+    for n in prange(len(nouveaux)):
+        j = nouveaux[n]
+        meilleur = -1
+        for ddx in range(-1, 2):
+            for ddy in range(-1, 2):
+                c2 = cles[j] + ddx * hauteur + ddy
+                for m in range(debut[c2], debut[c2 + 1]):
+                    i = ordre[m]
+                    if est_contagieux[i] and (meilleur < 0 or numeros[i] < meilleur):
+                        # Le même test que _propager_infection
+                        dx = x[i] - x[j]
+                        dy = y[i] - y[j]
+                        if dx < 1.5 * 2 * rayon and dy < 1.5 * 2 * rayon and dx ** 2 + dy ** 2 <= 4 * 4 * rayon ** 2:
+                            meilleur = numeros[i]
+        infecteurs[n] = meilleur
+
+
+def trouver_infecteurs(nouveaux, contagieux, x, y, rayon, numeros):
+    """ Retrouve la personne qui a infecté chaque personne nouvellement infectée
+    ---
+    paramètres :
+
+        - nouveaux (np.array(int)) les indices des personnes nouvellement infectées
+        - contagieux (np.array(int)) les indices des personnes contagieuses à cette itération
+        - x, y (np.array(int)) les positions, les mêmes que lors de la propagation
+        - rayon (float) la taille des personnes
+        - numeros (np.array(int)) le numéro de chaque personne dans la simulation
+
+    résultat :
+
+        - np.array(int) le numéro de la personne contagieuse de plus petit numéro qui touche chaque personne
+    """
+    est_contagieux = np.zeros(len(x), dtype=np.bool_)
+    est_contagieux[contagieux] = True
+    cles, debut, ordre, hauteur = _construire_cellules(x, y, 5 * rayon)
+    infecteurs = np.empty(len(nouveaux), dtype=np.int64)
+    _trouver_infecteurs(nouveaux, est_contagieux, x, y, float(rayon), debut, ordre, cles, hauteur, numeros, infecteurs)
+    return infecteurs
+
+
+# Les tirages aléatoires sont faits en bloc par le générateur numpy de la population, avant l'appel des noyaux :
+# le résultat ne dépend donc que de la graine, et pas du nombre de fils d'exécution.
+class PopulationCompilee(PopulationVectorisee):
+
+    def mise_a_jour(self, largeur_sim, hauteur_sim, groupes):
+        """ Calcul de l'étape suivante pour toutes les personnes à la fois
+        ---
+        paramètres :
+
+            - largeur_sim (int) la largeur de l'espace de simulation
+            - hauteur_sim (int) la hauteur de l'espace de simulation
+            - groupes (list(tuple(Comportement, np.array(int) / None))) les groupes de la politique de la simulation
+        """
+        mettre_a_jour_vitesses(groupes, self.x, self.y, self.vx, self.vy, self.nb_personnes, self.RAYON, self.k, self.f, self.VMAX, largeur_sim, hauteur_sim)
+        _deplacer(self.x, self.y, self.vx, self.vy)
+
+
+    def propager_infection(self, infectes):
+        """ Infecte les personnes saines en collision avec une personne infectée
+        ---
+        paramètre :
+
+            - infectes (np.array(int)) les indices des personnes infectées au début de l'itération
+
+        résultat :
+
+            - np.array(int) les indices des personnes nouvellement infectées, triés
+        """
+        # Chaque personne infectée a une probabilité p d'infecter au cours de cette itération
+        tirages = self.generateur.integers(0, 101, len(infectes))
+        contagieux = infectes[tirages <= self.p[infectes] * 100]
+        # On les garde pour retrouver qui a infecté qui, si la simulation tient un journal
+        self.contagieux = contagieux
+        if not len(contagieux):
+            return np.empty(0, dtype=np.int64)
+        cles, debut, ordre, hauteur = _construire_cellules(self.x, self.y, 5 * self.RAYON)
+        touche = np.zeros(self.nb_personnes, dtype=np.bool_)
+        _propager_infection(contagieux, self.x, self.y, self.etat, Etat.SAIN.value, float(self.RAYON), debut, ordre, cles, hauteur, touche)
+        nouveaux = np.flatnonzero(touche)
+        self.etat[nouveaux] = Etat.INFECTE.value
+        return nouveaux
+
+
+    def infecteurs(self, nouveaux):
+        """ Retrouve la personne qui a infecté chaque personne nouvellement infectée, à appeler juste après propager_infection
+        ---
+        paramètre :
+
+            - nouveaux (np.array(int)) le résultat de propager_infection
+
+        résultat :
+
+            - np.array(int) pour chaque personne, la personne contagieuse d'indice le plus petit qui la touche
+        """
+        return trouver_infecteurs(nouveaux, self.contagieux, self.x, self.y, self.RAYON, np.arange(self.nb_personnes))
@@ -0,0 +1,562 @@
+import os
+
+import numpy as np
+
+from Profileur import PROFILEUR
+from simulation import Comportement, Etat, Simulation, colors
+
+# Empêche l'import de pygame d'afficher du texte
+os.environ['PYGAME_HIDE_SUPPORT_PROMPT'] = 'True'
+
+import pygame
+
+# Le nombre maximal de personnes dont on cherche les voisins en une fois, pour borner la mémoire utilisée
+TAILLE_BLOC = 4096
+
+
+class GrilleVectorisee:
+
+    def __init__(self, taille_cellule):
+        """ Initialisation de la grille de voisinage vectorisée (cellules triées par clée)
+        ---
+        paramètre :
+
+            - taille_cellule (int) le côté d'une cellule, au moins égal à la distance d'interaction
+        """
+        self.taille_cellule = taille_cellule
+        self.ordre = None
+        self.cles_triees = None
+        self.cles = None
+        self.hauteur_grille = 0
+
+
+    def construire(self, x, y):
+        """ Range les personnes par cellule
+        ---
+        paramètres :
+
+            - x (np.array(int)) les positions en abscisse
+            - y (np.array(int)) les positions en ordonnée
+        """
+        cx = np.floor_divide(x, self.taille_cellule)
+        cy = np.floor_divide(y, self.taille_cellule)
+        # On décale les cellules pour qu'elles soient positives, avec une cellule vide de chaque côté
+        cx -= cx.min() - 1
+        cy -= cy.min() - 1
+        self.hauteur_grille = int(cy.max()) + 2
+        self.cles = cx * self.hauteur_grille + cy
+        # Le tri stable de clées sur 16 bits est un tri par base, bien plus rapide, pour le même ordre
+        cles = self.cles.astype(np.uint16) if self.cles.max(initial=0) < 2 ** 16 else self.cles
+        self.ordre = np.argsort(cles, kind="stable")
+        self.cles_triees = self.cles[self.ordre]
+
+
+    def paires(self, indices):
+        """ Donne les paires (personne donnée, personne d'une des 9 cellules voisines)
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes dont on cherche les voisins
+
+        résultats :
+
+            - np.array(int) les indices des personnes données
+            - np.array(int) les indices de leurs voisins potentiels
+        """
+        cles = self.cles[indices]
+        liste_i, liste_j = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                cle = cles + dx * self.hauteur_grille + dy
+                # Les personnes de la cellule voisine sont contiguës dans l'ordre trié
+                debut = np.searchsorted(self.cles_triees, cle, "left")
+                nb = np.searchsorted(self.cles_triees, cle, "right") - debut
+                total = int(nb.sum())
+                if total == 0:
+                    continue
+                # On déroule chaque intervalle [debut, debut + nb[
+                decalage = np.arange(total) - np.repeat(np.cumsum(nb) - nb, nb)
+                liste_i.append(np.repeat(indices, nb))
+                liste_j.append(self.ordre[np.repeat(debut, nb) + decalage])
+        if not liste_i:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(liste_i), np.concatenate(liste_j)
+
+
+    def voisins(self, indice):
+        """ Donne les personnes des 9 cellules voisines de celle d'une personne, elle comprise
+        ---
+        paramètre :
+
+            - indice (int) l'indice de la personne
+
+        résultat :
+
+            - np.array(int) les indices des personnes
+        """
+        # Les 3 cellules d'une colonne ont des clées consécutives : leurs personnes sont contiguës dans l'ordre trié
+        colonnes = self.cles[indice] + self.hauteur_grille * np.arange(-1, 2)
+        debut = np.searchsorted(self.cles_triees, colonnes - 1, "left")
+        fin = np.searchsorted(self.cles_triees, colonnes + 1, "right")
+        return np.concatenate([self.ordre[a:b] for a, b in zip(debut.tolist(), fin.tolist())])
+
+
+class PopulationVectorisee:
+
+    def __init__(self, x, y, vx, vy, p, rayon, tps_infecte, generateur=None):
+        """ Initialisation d'une population stockée colonne par colonne dans des tableaux numpy
+        ---
+        paramètres :
+
+            - x (np.array(int)) les positions en abscisse
+            - y (np.array(int)) les positions en ordonnée
+            - vx (np.array(float)) les vitesses en abscisse
+            - vy (np.array(float)) les vitesses en ordonnée
+            - p (np.array(float), 0 <= p <= 1) les probabilités de contaminer une personne
+            - rayon (int) la taille des personnes
+            - tps_infecte (np.array(int)) le nombre d'itérations pendant lesquelles chaque personne reste infectée (sa guérison est programmée par la simulation)
+            - generateur (np.random.Generator) le générateur de nombres aléatoires
+        """
+        self.nb_personnes = len(x)
+        self.x = np.ascontiguousarray(x, dtype=np.int64)
+        self.y = np.ascontiguousarray(y, dtype=np.int64)
+        self.vx = np.ascontiguousarray(vx, dtype=np.float64)
+        self.vy = np.ascontiguousarray(vy, dtype=np.float64)
+        self.p = np.ascontiguousarray(p, dtype=np.float64)
+        self.tps_infecte = np.ascontiguousarray(tps_infecte, dtype=np.int64)
+        # L'état de chaque personne (valeurs de l'énumération), le comportement est donné par la politique de la simulation
+        self.etat = np.full(self.nb_personnes, Etat.SAIN.value, dtype=np.int8)
+        self.generateur = np.random.default_rng() if generateur is None else generateur
+        # Les mêmes constantes que pour Personne
+        self.RAYON = rayon
+        self.VMAX = 5
+        self.f = 1
+        self.k = 1
+        # Les cellules couvrent la distance de répulsion (5 rayons) et donc celle de collision
+        self.grille = GrilleVectorisee(5 * rayon)
+
+
+    @classmethod
+    def aleatoire(cls, nb_personnes, largeur_sim, hauteur_sim, p, rayon, generateur=None):
+        """ Crée une population aléatoire, selon les mêmes lois que les personnes de simulation.py
+        ---
+        paramètres :
+
+            - nb_personnes (int) le nombre de personnes
+            - largeur_sim (int) la largeur de l'espace de simulation
+            - hauteur_sim (int) la hauteur de l'espace de simulation
+            - p (float, 0 <= p <= 1) la probabilité de contaminer une personne
+            - rayon (int) la taille des personnes
+            - generateur (np.random.Generator) le générateur de nombres aléatoires
+
+        résultat :
+
+            - PopulationVectorisee
+        """
+        generateur = np.random.default_rng() if generateur is None else generateur
+        v = generateur.integers(0, 501, nb_personnes) / 100
+        theta = generateur.integers(0, 629, nb_personnes) / 100
+        x = generateur.integers(0, largeur_sim + 1, nb_personnes)
+        y = generateur.integers(0, hauteur_sim + 1, nb_personnes)
+        tps_infecte = generateur.integers(40, 61, nb_personnes)
+        return cls(x, y, v * np.cos(theta), v * np.sin(theta), np.full(nb_personnes, p), rayon, tps_infecte, generateur)
+
+
+    @classmethod
+    def depuis_personnes(cls, personnes, generateur=None):
+        """ Convertit une liste de personnes en population vectorisée
+        ---
+        paramètres :
+
+            - personnes (list(Personne)) la liste des personnes
+            - generateur (np.random.Generator) le générateur de nombres aléatoires
+
+        résultat :
+
+            - PopulationVectorisee
+        """
+        population = cls(
+            [p.x for p in personnes], [p.y for p in personnes],
+            [p.vx for p in personnes], [p.vy for p in personnes],
+            [p.p for p in personnes], max(p.RAYON for p in personnes),
+            [p.TPS_INFECTE for p in personnes], generateur)
+        population.etat[:] = [p.etat.value for p in personnes]
+        return population
+
+
+    def repulsion(self, indices):
+        """ Calcule l'accélération de répulsion des personnes données, comme Personne.repulsion
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes en quarantaine
+
+        résultats :
+
+            - np.array(float) l'accélération en abscisse des personnes données
+            - np.array(float) l'accélération en ordonnée des personnes données
+        """
+        ax = np.zeros(self.nb_personnes)
+        ay = np.zeros(self.nb_personnes)
+        self.grille.construire(self.x, self.y)
+        for debut in range(0, len(indices), TAILLE_BLOC):
+            i, j = self.grille.paires(indices[debut:debut + TAILLE_BLOC])
+            dx = self.x[i] - self.x[j]
+            dy = self.y[i] - self.y[j]
+            # On ne garde que les autres personnes suffisament proches
+            proche = (i != j) & (np.abs(dx) < 5 * self.RAYON) & (np.abs(dy) < 5 * self.RAYON)
+            i, dx, dy = i[proche], dx[proche], dy[proche]
+            angle = np.arctan2(dy, dx)
+            f = self.k * (np.hypot(dy, dx) - 2 * self.RAYON)
+            ax += np.bincount(i, f * np.cos(angle), self.nb_personnes)
+            ay += np.bincount(i, f * np.sin(angle), self.nb_personnes)
+        # On ajoute le frottement fluide
+        return ax[indices] - self.f * self.vx[indices], ay[indices] - self.f * self.vy[indices]
+
+
+    def mise_a_jour(self, largeur_sim, hauteur_sim, groupes):
+        """ Calcul de l'étape suivante pour toutes les personnes à la fois
+        ---
+        paramètres :
+
+            - largeur_sim (int) la largeur de l'espace de simulation
+            - hauteur_sim (int) la hauteur de l'espace de simulation
+            - groupes (list(tuple(Comportement, np.array(int) / None))) les groupes de la politique de la simulation
+        """
+        for comportement, indices in groupes:
+            if indices is None:
+                indices = np.arange(self.nb_personnes)
+            # Pendant une quarantaine, on introduit une force de répulsion et de frottement fluide
+            if comportement == Comportement.QUARANTAINE and len(indices):
+                with PROFILEUR.phase("repulsion"):
+                    ax, ay = self.repulsion(indices)
+                self.vx[indices] += ax
+                self.vy[indices] += ay
+            # Les personnes qui se déplacent vont tout droit à la vitesse maximale
+            elif comportement == Comportement.DEPLACEMENT:
+                self.vitesse_maximale(indices)
+        # On renormalise les vitesses qui dépassent la vitesse maximale
+        v = self.vx ** 2 + self.vy ** 2
+        trop_rapide = v > self.VMAX ** 2
+        r = self.VMAX / np.sqrt(v[trop_rapide])
+        self.vx[trop_rapide] *= r
+        self.vy[trop_rapide] *= r
+        # Si on touche un bord, on part dans l'autre sens
+        np.negative(self.vx, out=self.vx, where=(self.x > largeur_sim) | (self.x < 0))
+        np.negative(self.vy, out=self.vy, where=(self.y > hauteur_sim) | (self.y < 0))
+        # On applique le schéma d'Euler pour la position (troncature, comme int())
+        self.x += np.trunc(self.vx).astype(np.int64)
+        self.y += np.trunc(self.vy).astype(np.int64)
+
+
+    def vitesse_maximale(self, indices):
+        """ Porte la vitesse des personnes données à la vitesse maximale, sans changer leur direction
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes qui se déplacent
+        """
+        v = np.hypot(self.vx[indices], self.vy[indices])
+        mobiles = indices[v > 0]
+        r = self.VMAX / v[v > 0]
+        self.vx[mobiles] *= r
+        self.vy[mobiles] *= r
+
+
+    def propager_infection(self, infectes):
+        """ Infecte les personnes saines en collision avec une personne infectée, comme Personne.collision
+        ---
+        paramètre :
+
+            - infectes (np.array(int)) les indices des personnes infectées au début de l'itération
+
+        résultat :
+
+            - np.array(int) les indices des personnes nouvellement infectées, triés
+        """
+        # Chaque personne infectée a une probabilité p d'infecter au cours de cette itération
+        tirages = self.generateur.integers(0, 101, len(infectes))
+        contagieux = infectes[tirages <= self.p[infectes] * 100]
+        # On les garde pour retrouver qui a infecté qui, si la simulation tient un journal
+        self.contagieux = contagieux
+        if not len(contagieux):
+            return np.empty(0, dtype=np.int64)
+        self.grille.construire(self.x, self.y)
+        nouveaux = []
+        for debut in range(0, len(contagieux), TAILLE_BLOC):
+            i, j = self.grille.paires(contagieux[debut:debut + TAILLE_BLOC])
+            # On ne garde que les personnes saines
+            saine = self.etat[j] == Etat.SAIN.value
+            i, j = i[saine], j[saine]
+            # On regarde si les particules sont suffisament proches, puis si la distance est inférieur à celle entre 2 diamètres
+            dx = self.x[i] - self.x[j]
+            dy = self.y[i] - self.y[j]
+            collision = (dx < 1.5 * 2 * self.RAYON) & (dy < 1.5 * 2 * self.RAYON) & (dx ** 2 + dy ** 2 <= 4 * 4 * self.RAYON ** 2)
+            # Ces personnes sont alors infectées
+            self.etat[j[collision]] = Etat.INFECTE.value
+            nouveaux.append(j[collision])
+        return np.unique(np.concatenate(nouveaux))
+
+
+    def infecteurs(self, nouveaux):
+        """ Retrouve la personne qui a infecté chaque personne nouvellement infectée, à appeler juste après propager_infection
+        ---
+        paramètre :
+
+            - nouveaux (np.array(int)) le résultat de propager_infection
+
+        résultat :
+
+            - np.array(int) pour chaque personne, la personne contagieuse d'indice le plus petit qui la touche
+        """
+        # La grille est encore celle de propager_infection, les personnes n'ont pas bougé depuis
+        nouvelle = np.zeros(self.nb_personnes, dtype=bool)
+        nouvelle[nouveaux] = True
+        liste_i, liste_j = [], []
+        for debut in range(0, len(self.contagieux), TAILLE_BLOC):
+            i, j = self.grille.paires(self.contagieux[debut:debut + TAILLE_BLOC])
+            i, j = i[nouvelle[j]], j[nouvelle[j]]
+            # Le même test que dans propager_infection
+            dx = self.x[i] - self.x[j]
+            dy = self.y[i] - self.y[j]
+            collision = (dx < 1.5 * 2 * self.RAYON) & (dy < 1.5 * 2 * self.RAYON) & (dx ** 2 + dy ** 2 <= 4 * 4 * self.RAYON ** 2)
+            liste_i.append(i[collision])
+            liste_j.append(j[collision])
+        i, j = np.concatenate(liste_i), np.concatenate(liste_j)
+        # Pour chaque personne infectée (triées comme nouveaux), la première paire est celle de la plus petite personne contagieuse
+        ordre = np.lexsort((i, j))
+        i, j = i[ordre], j[ordre]
+        premiere = np.ones(len(j), dtype=bool)
+        premiere[1:] = j[1:] != j[:-1]
+        return i[premiere]
+
+
+class SimulationVectorisee(Simulation):
+
+    def __init__(self, population, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil):
+        """ Initialisation de la simulation sur une population vectorisée
+        ---
+        paramètres :
+
+            - population (PopulationVectorisee) la population de la simulation
+            - largeur_sim (int) la largeur de l'espace de la simulation
+            - hauteur_sim (int) la hauteur de l'espace de la simulation
+            - ecran (Pygame.Surface) la surface sur laquelle afficher la simulation
+            - taux_incidence (int) le nombre de personnes infectés simultanément avant de mettre en place une quarantaine
+            - seuil (float 0 <= seuil <= 1) le pourcentage de taux_incidence à atteindre afin de mettre fin à la quarantaine
+        """
+        super().__init__(population, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil)
+
+
+    def initialiser_population(self, population, grille):
+        """ Initialisation de la population et de ses compartiments
+        ---
+        paramètres :
+
+            - population (PopulationVectorisee) la population de la simulation
+            - grille (bool) inutilisé, la population a toujours sa propre grille
+        """
+        self.population = population
+        self.nb_personnes = population.nb_personnes
+        self.grille = None
+        # La simulation tire ses nombres aléatoires avec le générateur de la population
+        self.generateur = population.generateur
+        # On infecte une personne
+        population.etat[0] = Etat.INFECTE.value
+        # Le nombre de personnes de chaque compartiment (sains, infectés, rétablis), tenu à jour à chaque changement d'état
+        self.effectifs = np.bincount(population.etat, minlength=4)[1:].tolist()
+        # Les indices des personnes infectées
+        self.indices_infectes = np.flatnonzero(population.etat == Etat.INFECTE.value)
+        # Les personnes infectées pendant l'itération en cours
+        self.nouveaux_infectes = np.empty(0, dtype=np.int64)
+        # Les guérisons programmées : le numéro d'itération associé à la liste des tableaux d'indices des personnes qui guérissent
+        self.guerisons = {}
+        self.programmer_guerisons(self.indices_infectes)
+
+
+    def programmer_guerisons(self, indices, iterations=None):
+        """ Programme la guérison des personnes qui viennent d'être infectées
+        ---
+        paramètres :
+
+            - indices (np.array(int)) les indices des personnes
+            - iterations (np.array(int) / None) l'itération de guérison de chaque personne (None pour la fin de leur temps d'infection)
+        """
+        if iterations is None:
+            iterations = self.iteration + self.population.tps_infecte[indices]
+        for iteration in np.unique(iterations).tolist():
+            self.guerisons.setdefault(iteration, []).append(indices[iterations == iteration])
+
+
+    def reassignation(self):
+        """ Met à jour les compartiments avec les changements d'état de cette itération
+        ---
+        """
+        # Les personnes dont la guérison est programmée à cette itération sont rétablies
+        gueris = self.guerisons.pop(self.iteration, None)
+        if gueris:
+            gueris = np.concatenate(gueris)
+            self.population.etat[gueris] = Etat.RETABLI.value
+            self.indices_infectes = self.indices_infectes[~np.isin(self.indices_infectes, gueris)]
+            self.effectifs[1] -= len(gueris)
+            self.effectifs[2] += len(gueris)
+        # Les personnes infectées pendant l'itération rejoignent les infectés
+        nouveaux = self.nouveaux_infectes
+        if len(nouveaux):
+            # On écrit qui a infecté qui, où et quand
+            if self.journal is not None:
+                self.journal.ajouter(self.iteration, self.population.infecteurs(nouveaux), nouveaux, self.population.x[nouveaux], self.population.y[nouveaux])
+            self.indices_infectes = np.concatenate((self.indices_infectes, nouveaux))
+            self.effectifs[0] -= len(nouveaux)
+            self.effectifs[1] += len(nouveaux)
+            self.programmer_guerisons(nouveaux)
+            self.nouveaux_infectes = np.empty(0, dtype=np.int64)
+
+
+    def etats_personnes(self, indices):
+        """ Donne l'état de personnes et leur itération de guérison, pour les transférer dans une autre simulation
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes
+
+        résultats :
+
+            - np.array(int) l'état de chaque personne (valeurs de Etat)
+            - np.array(int) l'itération de guérison programmée, -1 pour les personnes non infectées
+        """
+        guerisons = np.full(len(indices), -1, dtype=np.int64)
+        for iteration, tableaux in self.guerisons.items():
+            for tableau in tableaux:
+                guerisons[np.isin(indices, tableau)] = iteration
+        return self.population.etat[indices].copy(), guerisons
+
+
+    def remplacer_etats(self, indices, etats, guerisons):
+        """ Remplace l'état de personnes (par celui de voyageurs venus d'une autre simulation), en tenant à jour les compartiments
+        ---
+        paramètres :
+
+            - indices (np.array(int)) les indices des personnes, distincts
+            - etats (np.array(int)) le nouvel état de chaque personne (valeurs de Etat)
+            - guerisons (np.array(int)) l'itération de guérison des personnes infectées, postérieure à l'itération en cours
+        """
+        population = self.population
+        anciens = population.etat[indices]
+        # Les personnes qui étaient infectées ne guériront plus ici
+        retires = indices[anciens == Etat.INFECTE.value]
+        if len(retires):
+            self.indices_infectes = self.indices_infectes[~np.isin(self.indices_infectes, retires)]
+            self.guerisons = {iteration: [tableau[~np.isin(tableau, retires)] for tableau in tableaux] for iteration, tableaux in self.guerisons.items()}
+        ecarts = np.bincount(etats, minlength=4)[1:] - np.bincount(anciens, minlength=4)[1:]
+        self.effectifs = (np.array(self.effectifs) + ecarts).tolist()
+        population.etat[indices] = etats
+        # Les nouveaux infectés gardent leur date de guérison
+        infectes = etats == Etat.INFECTE.value
+        if infectes.any():
+            self.indices_infectes = np.concatenate((self.indices_infectes, indices[infectes]))
+            self.programmer_guerisons(indices[infectes], guerisons[infectes])
+            self.terminee = False
+
+
+    def nb_infectes(self):
+        """ Donne le nombre de personnes du compartiment des infectés
+        ---
+        résultat :
+
+            - int
+        """
+        return self.effectifs[1]
+
+
+    def mise_a_jour_donnees(self):
+        """ Met à jour les données de la simulation
+        ---
+        """
+        for clee, effectif in zip(self.donnees, self.effectifs):
+            self.donnees[clee].append(effectif)
+
+
+    def deplacer_personnes(self):
+        """ Fait avancer toutes les personnes d'une itération
+        ---
+        """
+        self.population.mise_a_jour(self.largeur_sim, self.hauteur_sim, self.politique.groupes(self.nb_personnes))
+
+
+    def propager_infection(self):
+        """ Infecte les personnes saines en contact avec une personne infectée
+        ---
+        """
+        self.nouveaux_infectes = self.population.propager_infection(self.indices_infectes)
+
+
+    def capturer_population(self):
+        """ Copie l'état de la population et des compartiments
+        ---
+        résultat :
+
+            - dict
+        """
+        population = self.population
+        etat = {clee: getattr(population, clee).copy() for clee in ("x", "y", "vx", "vy", "p", "tps_infecte", "etat")}
+        etat.update({"classe": type(population).__name__,
+                     "rayon": population.RAYON,
+                     "generateur": population.generateur.bit_generator.state,
+                     # L'ordre des infectés fixe l'ordre des tirages, on le conserve
+                     "indices_infectes": self.indices_infectes.copy(),
+                     "nouveaux_infectes": self.nouveaux_infectes.copy(),
+                     "effectifs": list(self.effectifs),
+                     "guerisons": {iteration: np.concatenate(indices) for iteration, indices in self.guerisons.items()}})
+        return etat
+
+
+    def restaurer_population(self, etat):
+        """ Remet la population et les compartiments dans un état capturé par capturer_population
+        ---
+        paramètre :
+
+            - etat (dict) le résultat de capturer_population
+        """
+        population = self.population
+        for clee in ("x", "y", "vx", "vy", "p", "tps_infecte", "etat"):
+            getattr(population, clee)[:] = etat[clee]
+        population.generateur.bit_generator.state = etat["generateur"]
+        self.indices_infectes = np.array(etat["indices_infectes"], dtype=np.int64)
+        self.nouveaux_infectes = np.array(etat["nouveaux_infectes"], dtype=np.int64)
+        self.effectifs = list(etat["effectifs"])
+        self.guerisons = {iteration: [np.array(indices, dtype=np.int64)] for iteration, indices in etat["guerisons"].items()}
+
+
+    @classmethod
+    def depuis_etat(cls, etat, ecran=None):
+        """ Recrée une simulation depuis un état capturé par capturer_etat
+        ---
+        paramètres :
+
+            - etat (dict) le résultat de capturer_etat
+            - ecran (Pygame.Surface / None) la surface sur laquelle afficher la simulation, None pour une simulation sans affichage
+
+        résultat :
+
+            - SimulationVectorisee
+        """
+        colonnes = etat["population"]
+        classe = PopulationVectorisee
+        if colonnes["classe"] == "PopulationCompilee":
+            from PopulationCompilee import PopulationCompilee as classe
+        # Les colonnes sont remplies par restaurer_population, y compris l'état du générateur
+        population = classe(colonnes["x"], colonnes["y"], colonnes["vx"], colonnes["vy"], colonnes["p"], colonnes["rayon"], colonnes["tps_infecte"], np.random.default_rng())
+        simulation = cls(population, etat["largeur_sim"], etat["hauteur_sim"], ecran, etat["taux_incidence"], etat["seuil"])
+        simulation.restaurer_etat(etat)
+        return simulation
+
+
+    def afficher_personnes(self):
+        """ Affiche chaque personne de la simulation
+        ---
+        """
+        population = self.population
+        haut = self.DIST_HAUT - 50
+        for x, y, etat in zip(population.x.tolist(), population.y.tolist(), population.etat.tolist()):
+            pygame.draw.circle(self.ecran, colors[etat - 1], (x, y + haut), population.RAYON)
@@ -0,0 +1,262 @@
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Le nombre de classes des histogrammes par doublement de la durée : les quantiles sont estimés à 1 / SOUS_CLASSES près
+SOUS_CLASSES = 8
+# Le nombre de classes des histogrammes, assez pour toutes les durées en nanosecondes sur 64 bits
+NB_CLASSES = SOUS_CLASSES * 61
+# Le nombre maximal d'événements gardés pour la trace (les plus anciens sont oubliés)
+NB_EVENEMENTS_MAX = 200000
+# Le contexte renvoyé quand le profileur est désactivé, qui ne fait rien
+_INACTIF = contextlib.nullcontext()
+
+
+def classe(duree):
+    """ Donne la classe d'une durée dans les histogrammes (classes de largeur proportionnelle à la durée)
+    ---
+    paramètre :
+
+        - duree (int) la durée, en nanosecondes
+
+    résultat :
+
+        - int
+    """
+    b = duree.bit_length()
+    if b <= 3:
+        return duree
+    # Les 4 premiers bits de la durée donnent la sous-classe, à l'intérieur du doublement b
+    return (b - 3) * SOUS_CLASSES + (duree >> (b - 4)) - SOUS_CLASSES
+
+
+def borne(c):
+    """ Donne la borne supérieure (exclue) d'une classe des histogrammes
+    ---
+    paramètre :
+
+        - c (int) la classe
+
+    résultat :
+
+        - int (en nanosecondes)
+    """
+    if c < SOUS_CLASSES:
+        return c + 1
+    e = c // SOUS_CLASSES
+    return (SOUS_CLASSES + c % SOUS_CLASSES + 1) << (e - 1)
+
+
+# La mesure d'une phase, créée à l'entrée d'un bloc with et enregistrée à sa sortie
+class _Mesure:
+
+    __slots__ = ("profileur", "nom", "debut")
+
+    def __init__(self, profileur, nom):
+        self.profileur = profileur
+        self.nom = nom
+
+
+    def __enter__(self):
+        self.profileur.pile().append(self.nom)
+        self.debut = time.perf_counter_ns()
+
+
+    def __exit__(self, *exc):
+        self.profileur.ajouter(self.nom, self.debut, time.perf_counter_ns())
+        self.profileur.pile().pop()
+
+
+# Mesure le temps passé dans chaque phase d'une itération : un histogramme des durées par phase, et les derniers événements pour une trace
+class Profileur:
+
+    def __init__(self, actif=False, nb_evenements_max=NB_EVENEMENTS_MAX):
+        """ Initialisation du profileur
+        ---
+        paramètres :
+
+            - actif (bool) si les phases sont mesurées dès la création
+            - nb_evenements_max (int) le nombre maximal d'événements gardés pour la trace
+        """
+        self.actif = actif
+        self.nb_evenements_max = nb_evenements_max
+        self.reinitialiser()
+
+
+    def activer(self):
+        """ Commence à mesurer les phases
+        ---
+        """
+        self.actif = True
+
+
+    def desactiver(self):
+        """ Arrête de mesurer les phases, les mesures déjà faites sont gardées
+        ---
+        """
+        self.actif = False
+
+
+    def basculer(self):
+        """ Active le profileur s'il est désactivé, et inversement
+        ---
+        """
+        self.actif = not self.actif
+
+
+    def reinitialiser(self):
+        """ Oublie toutes les mesures
+        ---
+        """
+        # Pour chaque phase, dans l'ordre de première entrée : [nombre, total, minimum, maximum, histogramme, phase qui la contient]
+        self.phases = {}
+        # Les phases en cours de chaque fil d'exécution
+        self.local = threading.local()
+        self.evenements = collections.deque(maxlen=self.nb_evenements_max)
+        self.origine = time.perf_counter_ns()
+
+
+    def pile(self):
+        """ Donne les phases en cours dans le fil d'exécution, de la plus englobante à la plus intérieure
+        ---
+        résultat :
+
+            - list(str)
+        """
+        pile = getattr(self.local, "pile", None)
+        if pile is None:
+            pile = self.local.pile = []
+        return pile
+
+
+    def phase(self, nom):
+        """ Mesure la durée d'un bloc with, les phases peuvent être imbriquées
+        ---
+        paramètre :
+
+            - nom (str) le nom de la phase
+
+        résultat :
+
+            - contexte pour with (qui ne fait rien si le profileur est désactivé)
+        """
+        if not self.actif:
+            return _INACTIF
+        # Les phases sont créées à l'entrée : une phase apparaît avant celles qu'elle contient
+        if nom not in self.phases:
+            # La phase qui la contient est celle de la première entrée, None pour une phase mesurée séparément
+            pile = self.pile()
+            self.phases[nom] = [0, 0, 2 ** 63, 0, [0] * NB_CLASSES, pile[-1] if pile else None]
+        return _Mesure(self, nom)
+
+
+    def ajouter(self, nom, debut, fin):
+        """ Enregistre une mesure
+        ---
+        paramètres :
+
+            - nom (str) le nom de la phase
+            - debut, fin (int) les instants de début et de fin, en nanosecondes (time.perf_counter_ns)
+        """
+        duree = fin - debut
+        statistiques = self.phases[nom]
+        statistiques[0] += 1
+        statistiques[1] += duree
+        if duree < statistiques[2]:
+            statistiques[2] = duree
+        if duree > statistiques[3]:
+            statistiques[3] = duree
+        statistiques[4][classe(duree)] += 1
+        self.evenements.append((nom, debut, duree, threading.get_ident()))
+
+
+    def quantile(self, nom, q):
+        """ Estime un quantile des durées d'une phase à partir de son histogramme
+        ---
+        paramètres :
+
+            - nom (str) le nom de la phase
+            - q (float, 0 <= q <= 1) le quantile
+
+        résultat :
+
+            - int (la borne supérieure de la classe du quantile, en nanosecondes)
+        """
+        nombre, _, minimum, maximum, histogramme, _ = self.phases[nom]
+        cumul = 0
+        for c, effectif in enumerate(histogramme):
+            cumul += effectif
+            if cumul >= q * nombre:
+                # La borne de la classe ne peut pas dépasser les durées observées
+                return max(minimum, min(borne(c), maximum))
+        return maximum
+
+
+    def resume(self):
+        """ Calcule les statistiques de chaque phase
+        ---
+        résultat :
+
+            - list(dict) une ligne par phase, chacune suivie des phases qu'elle contient : nom, profondeur (0 pour une phase mesurée
+              séparément), nombre, total, moyenne, minimum, médiane, 95e centile et maximum (en secondes)
+        """
+        enfants = {}
+        for nom, statistiques in self.phases.items():
+            enfants.setdefault(statistiques[5], []).append(nom)
+        # On parcourt l'arbre des phases en profondeur, une phase étant toujours créée après celle qui la contient
+        ordre = []
+        a_parcourir = [(nom, 0) for nom in reversed(enfants.get(None, []))]
+        while a_parcourir:
+            nom, profondeur = a_parcourir.pop()
+            ordre.append((nom, profondeur))
+            a_parcourir.extend((enfant, profondeur + 1) for enfant in reversed(enfants.get(nom, [])))
+        lignes = []
+        for nom, profondeur in ordre:
+            nombre, total, minimum, maximum = self.phases[nom][:4]
+            # Une phase en cours n'a pas encore de mesure
+            if not nombre:
+                continue
+            lignes.append({"phase": nom, "profondeur": profondeur, "nombre": nombre, "total": total / 1e9, "moyenne": total / nombre / 1e9, "minimum": minimum / 1e9,
+                           "mediane": self.quantile(nom, .5) / 1e9, "q95": self.quantile(nom, .95) / 1e9, "maximum": maximum / 1e9})
+        return lignes
+
+
+    def tableau(self):
+        """ Met en forme le résumé des phases, les durées en millisecondes ; une phase est décalée sous celle qui la contient, les phases
+        sans décalage sont mesurées séparément (leurs durées ne s'additionnent pas)
+        ---
+        résultat :
+
+            - str
+        """
+        lignes = ["(une phase décalée est comprise dans la phase moins décalée au-dessus d'elle ; les phases sans décalage sont mesurées séparément)",
+                  f"{'phase':16} {'nombre':>8} {'total':>10} {'moyenne':>9} {'min':>9} {'médiane':>9} {'95 %':>9} {'max':>9}"]
+        for ligne in self.resume():
+            lignes.append(f"{'  ' * ligne['profondeur'] + ligne['phase']:16} {ligne['nombre']:8d} {ligne['total'] * 1e3:10.1f}"
+                          + "".join(f" {ligne[clee] * 1e3:9.3f}" for clee in ("moyenne", "minimum", "mediane", "q95", "maximum")))
+        return "\n".join(lignes)
+
+
+    def ecrire_trace(self, nom_fichier):
+        """ Écrit les derniers événements au format json de chrome://tracing (et de Perfetto)
+        ---
+        paramètre :
+
+            - nom_fichier (str) le chemin du fichier
+        """
+        dossier = os.path.dirname(nom_fichier)
+        if dossier and not os.path.exists(dossier):
+            os.makedirs(dossier)
+        pid = os.getpid()
+        # Les événements "X" ont un début et une durée, en microsecondes
+        evenements = [{"name": nom, "ph": "X", "ts": (debut - self.origine) / 1e3, "dur": duree / 1e3, "pid": pid, "tid": fil}
+                      for nom, debut, duree, fil in self.evenements]
+        with open(nom_fichier, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": evenements, "displayTimeUnit": "ms"}, f)
+
+
+# Le profileur du processus, désactivé par défaut : les simulations y mesurent leurs phases
+PROFILEUR = Profileur()
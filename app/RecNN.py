@@ -1,11 +1,15 @@
 import json
 import os
+import threading
 
 import msgpack
 import numpy as np
 # Cette bibliothète convertit le code python en code C pour accelérer les calculs
 from numba import njit
 
+# Le nombre de données calculées ensemble par predire : la mémoire de travail ne dépend pas de la taille des données
+TAILLE_BLOC_PREDICTION = 1024
+
 
 def relu(x):
     """ La fonction de régression linéaire
@@ -114,44 +118,211 @@ def _retropropagation(erreur, input, poids, biais, lr, activations):
     return poids, biais, n_erreur
 
 
+@njit(cache=True)
+def _pas_entrainement(parametres, dimensions, x, y, lr, activations, erreurs, gradient):
+    """ Fait une étape d'entraînement complète (prédiction, erreur et rétropropagation de toutes les couches) en un seul appel,
+    les mêmes calculs que calcule_sortie puis retropropagation, sans aucune allocation
+    ---
+    paramètres :
+
+        - parametres (np.array(float32 / float64)) les poids et biais de toutes les couches (voir decouper_parametres), modifiés sur place, du type de tous les autres tableaux
+        - dimensions (np.array(int)) l'architecture du réseau
+        - x (np.array) les données en entrée, de forme (taille du paquet, dimensions[0])
+        - y (np.array) les données attendues, de forme (taille du paquet, dimensions[-1])
+        - lr (float, 0 <= lr <= 1) le taux d'apprentissage, du même type que les tableaux (numba compile une version par type)
+        - activations (np.array) le tampon des sorties de toutes les couches, de taille (taille du paquet) * sum(dimensions[1:])
+        - erreurs (np.array) les deux tampons des erreurs, de forme (2, (taille du paquet) * max(dimensions))
+        - gradient (np.array) le tampon de la jacobienne des poids, de taille max(dimensions[k] * dimensions[k + 1])
+    """
+    nb = x.shape[0]
+    nb_couches = len(dimensions) - 1
+    # Le début des paramètres et des sorties de chaque couche dans les tableaux
+    debuts_parametres = np.zeros(nb_couches + 1, dtype=np.int64)
+    debuts_activations = np.zeros(nb_couches + 1, dtype=np.int64)
+    for k in range(nb_couches):
+        debuts_parametres[k + 1] = debuts_parametres[k] + (dimensions[k] + 1) * dimensions[k + 1]
+        debuts_activations[k + 1] = debuts_activations[k] + nb * dimensions[k + 1]
+
+    # Prédiction : la sortie de chaque couche est calculée dans le tampon des activations
+    entree = x
+    for k in range(nb_couches):
+        nb_entree, nb_neurones = dimensions[k], dimensions[k + 1]
+        debut = debuts_parametres[k]
+        poids = parametres[debut:debut + nb_entree * nb_neurones].reshape(nb_entree, nb_neurones)
+        biais = parametres[debut + nb_entree * nb_neurones:debut + (nb_entree + 1) * nb_neurones]
+        sortie = activations[debuts_activations[k]:debuts_activations[k + 1]].reshape(nb, nb_neurones)
+        np.dot(entree, poids, sortie)
+        for i in range(nb):
+            for j in range(nb_neurones):
+                sortie[i, j] = sigmoid(sortie[i, j] + biais[j])
+        entree = sortie
+
+    # L'erreur de la dernière couche, multipliée par la dérivée de son activation
+    nb_neurones = dimensions[nb_couches]
+    tampon = 0
+    erreur = erreurs[tampon, :nb * nb_neurones].reshape(nb, nb_neurones)
+    for i in range(nb):
+        for j in range(nb_neurones):
+            erreur[i, j] = 2 * (y[i, j] - entree[i, j]) * sigmoid_der(entree[i, j])
+
+    # Rétropropagation, de la dernière couche à la première
+    for k in range(nb_couches - 1, -1, -1):
+        nb_entree, nb_neurones = dimensions[k], dimensions[k + 1]
+        debut = debuts_parametres[k]
+        poids = parametres[debut:debut + nb_entree * nb_neurones].reshape(nb_entree, nb_neurones)
+        biais = parametres[debut + nb_entree * nb_neurones:debut + (nb_entree + 1) * nb_neurones]
+        if k == 0:
+            entree = x
+        else:
+            entree = activations[debuts_activations[k - 1]:debuts_activations[k]].reshape(nb, nb_entree)
+        # La jacobienne des poids
+        d_poids = gradient[:nb_entree * nb_neurones].reshape(nb_entree, nb_neurones)
+        np.dot(entree.T, erreur, d_poids)
+        # L'erreur transmise à la couche précédente, calculée avec les poids avant leur mise à jour dans l'autre tampon
+        if k > 0:
+            tampon = 1 - tampon
+            n_erreur = erreurs[tampon, :nb * nb_entree].reshape(nb, nb_entree)
+            np.dot(erreur, poids.T, n_erreur)
+        # On met à jour les poids et les biais (la jacobienne des biais est la somme de celle des poids, comme _retropropagation)
+        for i in range(nb_entree):
+            for j in range(nb_neurones):
+                biais[j] += lr * d_poids[i, j]
+                poids[i, j] += lr * d_poids[i, j]
+        if k > 0:
+            for i in range(nb):
+                for j in range(nb_entree):
+                    n_erreur[i, j] *= sigmoid_der(entree[i, j])
+            erreur = n_erreur
+
+
+@njit(cache=True, nogil=True)
+def _predire(parametres, dimensions, x, tampons, sortie):
+    """ Calcule la prédiction du réseau par blocs de données, sans rien garder pour l'entraînement (le GIL est relâché)
+    ---
+    paramètres :
+
+        - parametres (np.array) les poids et biais de toutes les couches (voir decouper_parametres)
+        - dimensions (np.array(int)) l'architecture du réseau
+        - x (np.array) les données en entrée, de forme (nombre de données, dimensions[0])
+        - tampons (np.array) les deux tampons des sorties des couches cachées, de forme (2, (taille d'un bloc) * max(dimensions))
+        - sortie (np.array) le tableau des prédictions, de forme (nombre de données, dimensions[-1]), rempli sur place
+    """
+    nb_couches = len(dimensions) - 1
+    taille_bloc = tampons.shape[1] // dimensions.max()
+    for debut in range(0, x.shape[0], taille_bloc):
+        fin = min(debut + taille_bloc, x.shape[0])
+        nb = fin - debut
+        entree = x[debut:fin]
+        debut_parametres = 0
+        for k in range(nb_couches):
+            nb_entree, nb_neurones = dimensions[k], dimensions[k + 1]
+            poids = parametres[debut_parametres:debut_parametres + nb_entree * nb_neurones].reshape(nb_entree, nb_neurones)
+            biais = parametres[debut_parametres + nb_entree * nb_neurones:debut_parametres + (nb_entree + 1) * nb_neurones]
+            debut_parametres += (nb_entree + 1) * nb_neurones
+            # Les couches cachées écrivent tour à tour dans les deux tampons, la dernière directement dans la sortie
+            if k == nb_couches - 1:
+                resultat = sortie[debut:fin]
+            else:
+                resultat = tampons[k % 2, :nb * nb_neurones].reshape(nb, nb_neurones)
+            np.dot(entree, poids, resultat)
+            for i in range(nb):
+                for j in range(nb_neurones):
+                    resultat[i, j] = sigmoid(resultat[i, j] + biais[j])
+            entree = resultat
+
+
+def decouper_parametres(parametres, dimension_couche):
+    """ Découpe le tableau de tous les paramètres du réseau en poids et biais de chaque couche
+    ---
+    paramètres :
+
+        - parametres (np.array) le tableau à une dimension des paramètres, rangés couche par couche (poids puis biais)
+        - dimension_couche (list(int), len >= 2) l'architecture du réseau
+
+    résultats :
+
+        - list(np.array) les poids de chaque couche, des vues de parametres
+        - list(np.array) les biais de chaque couche, des vues de parametres
+    """
+    poids, biais = [], []
+    debut = 0
+    for nb_entree, nb_neurones in zip(dimension_couche[:-1], dimension_couche[1:]):
+        poids.append(parametres[debut:debut + nb_entree * nb_neurones].reshape(nb_entree, nb_neurones))
+        debut += nb_entree * nb_neurones
+        biais.append(parametres[debut:debut + nb_neurones])
+        debut += nb_neurones
+    return poids, biais
+
+
+def nb_parametres(dimension_couche):
+    """ Compte les poids et biais d'un réseau
+    ---
+    paramètre :
+
+        - dimension_couche (list(int), len >= 2) l'architecture du réseau
+
+    résultat :
+
+        - int
+    """
+    return sum((nb_entree + 1) * nb_neurones for nb_entree, nb_neurones in zip(dimension_couche[:-1], dimension_couche[1:]))
+
+
+def lire_fichier(nom_fichier):
+    """ Lit un fichier de sauvegarde de réseau
+    ---
+    paramètre :
+
+        - nom_fichier (str) le nom du fichier, json ou msgpack
+
+    résultat :
+
+        - dict(numéro de la couche (str): {w : list(list(float)), b : list(list(float))}, lr : float, dtype : str)
+    """
+    # On ouvre le fichier en fonction de son type
+    if nom_fichier.endswith(".json"):
+        return json.load(open(nom_fichier))
+    with open(nom_fichier, "rb") as donnee_file:
+        return msgpack.unpackb(donnee_file.read())
+
+
 # https://dustinstansbury.github.io/theclevermachine/derivation-backpropagation
 
 class RNN:
 
-    def __init__(self, dimension_couche, n, lr):
-        """ Initialisation récursive du réseau de neurone
+    def __init__(self, dimension_couche, n=0, lr=1e-3, dtype=np.float64):
+        """ Initialisation du réseau de neurone, dont les couches sont rangées dans un seul tableau
         ---
         paramètres :
 
             - dimension_couche (list(int), len >= 2) l'architecture du réseau
-            - n (int) le numéro de la couche
+            - n (int) le numéro de la première couche (dans les fichiers de sauvegarde)
             - lr (float, 0 < lr <= 1) le taux d'apprentissage
+            - dtype (np.dtype / str) le type des poids, biais, activations et gradients (np.float32 divise par deux la mémoire utilisée)
         """
         self.nb_entrainement = 0
-        self.dernier_enfant = None
-        self.parent = None
-        self.enfant = None
         self.num = n
         self.lr = lr
-        # De manière récursive le nb de neurones de cette couche est celui d'entrée de la couche suivante
-        self.nb_entree, self.nb_neurones = dimension_couche[0], dimension_couche[1]
-        # On crée la matrice de poids de manière aléatoire
-        self.poids = np.random.randn(self.nb_entree, self.nb_neurones)
-        # On initialisee les poids à 0 par défaut
-        self.biais = np.zeros(dimension_couche[1])
-        self.dimension_couche = dimension_couche
+        self.dimension_couche = list(dimension_couche)
+        self.dimensions = np.array(dimension_couche, dtype=np.int64)
+        self.nb_couches = len(dimension_couche) - 1
+        self.dtype = np.dtype(dtype)
+        # Tous les poids et biais sont rangés bout à bout dans un seul tableau, les poids et biais de chaque couche en sont des vues
+        self.parametres = np.zeros(nb_parametres(dimension_couche), dtype=self.dtype)
+        self.poids, self.biais = decouper_parametres(self.parametres, dimension_couche)
+        # On crée les matrices de poids de manière aléatoire, couche après couche, les biais sont à 0 par défaut
+        for poids in self.poids:
+            poids[:] = np.random.randn(*poids.shape)
+        # Les entrées et les sorties de chaque couche lors du dernier calcul, utilisées par la rétropropagation
+        self.entrees = [None] * self.nb_couches
+        self.activations = [None] * self.nb_couches
+        # Les tampons de l'étape d'entraînement compilée, alloués une seule fois par taille de paquet
+        self.tampons = {}
+        # Les tampons de predire, propres à chaque fil d'exécution
+        self.local = threading.local()
         # Le type de fichier de sauvegarde, par défaut les fichier msgpack sont plus compactes et plus précis, mais json est lisible
         self.utiliser_json = False
         self.nom_fichier = ""
-        # Si on peut encore crée une couche
-        if len(dimension_couche) > 2:
-            # le réseau enfant
-            self.enfant = RNN(dimension_couche[1:], n + 1, lr)
-            # On met en place les relation d'hérédité
-            self.enfant.parent = self
-            self.dernier_enfant = self.enfant.dernier_enfant
-        else:
-            self.dernier_enfant = self
 
 
     def __str__(self):
@@ -161,10 +332,7 @@ class RNN:
 
             str
         """
-        s = f"Couche n° {self.num}\npoids :\n{self.poids}\nbiais :\n{self.biais}"
-        if self.enfant:
-            s += "\n\n" + self.enfant.__str__()
-        return s
+        return "\n\n".join(f"Couche n° {self.num + k}\npoids :\n{poids}\nbiais :\n{biais}" for k, (poids, biais) in enumerate(zip(self.poids, self.biais)))
 
 
     def calcule_sortie(self, entree):
@@ -178,15 +346,38 @@ class RNN:
 
             list(list(float))
         """
-        # On sauvegarde les données en entrée
-        self.input = entree
-        # On calcule la répoonse de la couche
-        self.activations = _calcule_sortie(entree, self.poids, self.biais)
-        # Si c'est la derniere couche
-        if not self.enfant:
-            return self.activations
-        # Sinon on utilise la récursivité
-        return self.enfant.calcule_sortie(self.activations)
+        entree = np.asarray(entree, dtype=self.dtype)
+        # On calcule la réponse de chaque couche à partir de celle de la précédente, en gardant les entrées et sorties
+        for k in range(self.nb_couches):
+            self.entrees[k] = entree
+            entree = self.activations[k] = _calcule_sortie(entree, self.poids[k], self.biais[k])
+        return entree
+
+
+    def predire(self, entree, sortie=None):
+        """ Calcul de la prédiction du réseau sans rien garder pour l'entraînement, utilisable par plusieurs fils en même temps
+        (tant que le réseau n'est pas entraîné pendant ce temps)
+        ---
+        paramètres :
+
+            - entree (np.array, de forme (nombre de données, dimension_couche[0])) les données en entrée, par exemple toutes les
+              fenêtres de tous les pays d'un coup
+            - sortie (np.array / None) le tableau de forme (nombre de données, dimension_couche[-1]) et du type du réseau où écrire
+              les prédictions, réutilisable d'un appel à l'autre (None pour en créer un)
+
+        résultat :
+
+            - np.array (sortie)
+        """
+        x = np.ascontiguousarray(entree, dtype=self.dtype)
+        if sortie is None:
+            sortie = np.empty((len(x), self.dimension_couche[-1]), dtype=self.dtype)
+        # Chaque fil a ses tampons, créés à son premier appel
+        tampons = getattr(self.local, "tampons", None)
+        if tampons is None:
+            tampons = self.local.tampons = np.empty((2, TAILLE_BLOC_PREDICTION * max(self.dimension_couche)), dtype=self.dtype)
+        _predire(self.parametres, self.dimensions, x, tampons, sortie)
+        return sortie
 
 
     def retropropagation(self, erreur):
@@ -196,45 +387,56 @@ class RNN:
 
             - erreur (list(list(float)), dim = dimension_couche[-1]) l'erreur commise par le réseau
         """
-        # On modifie les poids et biais et on transmet l'erreur récursivement
-        self.poids, self.biais, n_erreur = _retropropagation(erreur, self.input, self.poids, self.biais, self.lr, self.activations)
-        if self.parent:
-            self.parent.retropropagation(n_erreur)
+        erreur = np.asarray(erreur, dtype=self.dtype)
+        lr = self.dtype.type(self.lr)
+        # On modifie les poids et biais (sur place) en remontant les couches, chacune transmettant l'erreur à la précédente
+        for k in range(self.nb_couches - 1, -1, -1):
+            _, _, erreur = _retropropagation(erreur, self.entrees[k], self.poids[k], self.biais[k], lr, self.activations[k])
+
+
+    def tampons_paquet(self, taille_paquet):
+        """ Donne les tampons de l'étape d'entraînement pour une taille de paquet, créés au premier paquet de cette taille
+        ---
+        paramètre :
+
+            - taille_paquet (int) le nombre de données du paquet
+
+        résultat :
+
+            - tuple(np.array) les tampons des activations, des erreurs et de la jacobienne des poids (voir _pas_entrainement)
+        """
+        if taille_paquet not in self.tampons:
+            dimensions = self.dimension_couche
+            self.tampons[taille_paquet] = (np.empty(taille_paquet * sum(dimensions[1:]), dtype=self.dtype),
+                                           np.empty((2, taille_paquet * max(dimensions)), dtype=self.dtype),
+                                           np.empty(max(n * m for n, m in zip(dimensions[:-1], dimensions[1:])), dtype=self.dtype))
+        return self.tampons[taille_paquet]
 
 
     def entrainer(self, donnee_entrainement, donnee_test):
-        """ Lance une prédiction et corrige en fonction du résultat
+        """ Lance une prédiction et corrige en fonction du résultat, toutes les couches en un seul appel compilé
         ---
         paramètres :
 
             - x (list(list(float))) les données en entrée du réseau
             - y (list(list(float))) les données attendue en fin de réseau
         """
-        # Prédiction du réseau
-        sortie = self.calcule_sortie(np.array(donnee_entrainement))
-        # Calcul de l'erreur
-        erreur = 2 * (donnee_test - sortie)
-        # Corrige le réseau
-        self.dernier_enfant.retropropagation(erreur)
+        x = np.ascontiguousarray(donnee_entrainement, dtype=self.dtype)
+        y = np.ascontiguousarray(donnee_test, dtype=self.dtype)
+        _pas_entrainement(self.parametres, self.dimensions, x, y, self.dtype.type(self.lr), *self.tampons_paquet(len(x)))
 
 
-    def sauvegarde_rec(self, donnee):
-        """ Fonction récursive auxilliare de sauvegarde du réseau
+    def donnees_sauvegarde(self):
+        """ Donne les valeurs du réseau à sauvegarder
         ---
-        paramètre :
-
-            - donnee (dict(numéro de la couche (str): {w : list(list(float)), b : list(list(float))}))
-
         résultat :
 
-            dict(numéro de la couche (str): {w : list(list(float)), b : list(list(float))})
+            dict(numéro de la couche (str): {w : list(list(float)), b : list(list(float))}, lr : float, dtype : str)
         """
-        # On ajoute les données au dictionnaire
-        donnee[f'{self.num}'] = {"w": self.poids.tolist(), "b": self.biais.tolist()}
-        # On le complète récursivement
-        if not self.enfant:
-            return donnee
-        return self.enfant.sauvegarde_rec(donnee)
+        donnee = {'lr': self.lr, 'dtype': self.dtype.name}
+        for k, (poids, biais) in enumerate(zip(self.poids, self.biais)):
+            donnee[f'{self.num + k}'] = {"w": poids.tolist(), "b": biais.tolist()}
+        return donnee
 
 
     def sauvegarder(self, utiliser_json=True):
@@ -248,7 +450,7 @@ class RNN:
         if not os.path.exists("./Model"):
             os.makedirs("./Model")
         # On crée le dictionnaire des données
-        donnee = self.sauvegarde_rec({'lr': self.lr})
+        donnee = self.donnees_sauvegarde()
         # On sauvegarde
         if self.utiliser_json:
             json.dump(donnee, open(f"./Model/{self.nom}.json", "w"))
@@ -270,22 +472,19 @@ class RNN:
                                          ) + ")-lr(" + str(self.lr) + ")" + f"-tr({self.nb_entrainement})"
 
 
-    def charger(self, nom_fichier):
-        """ Charge le réseau depuis le fichier
+    def charger(self, nom_fichier, donnee=None):
+        """ Charge le réseau depuis le fichier (les valeurs sont converties dans le type du réseau)
         ---
-        paramètre :
+        paramètres :
 
             - nom_fichier (str) le nom du fichier
+            - donnee (dict / None) le contenu du fichier s'il a déjà été lu par lire_fichier
         """
         self.nom_fichier = nom_fichier
-        # On ouvre le fichier en fonction de son type
         if nom_fichier.endswith(".json"):
-            donnee = json.load(open(nom_fichier))
             self.json = True
-        elif nom_fichier.endswith(".msgpack"):
-            with open(nom_fichier, "rb") as donnee_file:
-                byte_donnee = donnee_file.read()
-                donnee = msgpack.unpackb(byte_donnee)
+        if donnee is None:
+            donnee = lire_fichier(nom_fichier)
         # le nom du fichier
         self.name = os.path.basename(nom_fichier)
         # On paramètre le réseau
@@ -299,13 +498,11 @@ class RNN:
 
             - donnee (dict(numéro de la couche (str): {w : list(list(float)), b : list(list(float))}))
         """
-        # On assigne les poids et biais en fonction des valeurs
-        couche = donnee[f'{self.num}']
-        self.poids = np.array(couche['w'])
-        self.biais = np.array(couche['b'])
-        # On complète récursivement
-        if self.enfant:
-            self.enfant.parametrer(donnee)
+        # On copie les valeurs dans le tableau des paramètres, couche par couche
+        for k, (poids, biais) in enumerate(zip(self.poids, self.biais)):
+            couche = donnee[f'{self.num + k}']
+            poids[:] = couche['w']
+            biais[:] = couche['b']
 
 
     @staticmethod
@@ -320,9 +517,11 @@ class RNN:
         dimension_couche = [int(x) for x in nom_fichier.split("struct(")[1].split(")")[0].split("-")]
         lr = float(nom_fichier.split("lr(")[1].split(")")[0])
         t = int(nom_fichier.split("tr(")[1].split(")")[0])
+        # Le type des valeurs est écrit dans le fichier, les anciens fichiers sont en float64
+        donnee = lire_fichier(nom_fichier)
         # On crée un réseaau
-        NN = RNN(dimension_couche, 0, lr)
+        NN = RNN(dimension_couche, 0, lr, donnee.get('dtype', 'float64'))
         # On charge les valeurs enregistrées
-        NN.charger(nom_fichier)
+        NN.charger(nom_fichier, donnee)
         NN.nb_entrainement = t
         return NN
@@ -0,0 +1,527 @@
+import atexit
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+from numba import set_num_threads
+
+from PopulationCompilee import _construire_cellules, _propager_infection, mettre_a_jour_vitesses, trouver_infecteurs
+from PopulationVectorisee import PopulationVectorisee, SimulationVectorisee
+from simulation import Comportement, Etat, Politique
+
+# Les colonnes de la population placées en mémoire partagée
+COLONNES = ("x", "y", "vx", "vy", "p", "tps_infecte", "etat")
+
+
+def _attacher(memoire):
+    """ Ouvre les tableaux en mémoire partagée créés par la simulation
+    ---
+    paramètre :
+
+        - memoire (dict(str: tuple(str, str, int))) pour chaque tableau, le nom du segment, le type et la longueur
+
+    résultats :
+
+        - dict(str: np.array) les tableaux
+        - list(SharedMemory) les segments, à fermer à la fin
+    """
+    tableaux, segments = {}, []
+    for nom, (segment, dtype, longueur) in memoire.items():
+        # Les processus lancés par spawn partagent le suivi des ressources de la simulation, qui seule détruit les segments
+        segments.append(shared_memory.SharedMemory(name=segment))
+        tableaux[nom] = np.ndarray(longueur, dtype=dtype, buffer=segments[-1].buf)
+    return tableaux, segments
+
+
+def _lancer_tuile(connexion, *arguments):
+    """ Boucle d'un processus de tuile : exécute les commandes de la simulation jusqu'à la commande "fin"
+    ---
+    paramètres :
+
+        - connexion (Connection) la liaison avec la simulation
+        - arguments les paramètres de Tuile
+    """
+    # Chaque tuile a son processus, les noyaux numba n'ont donc pas besoin de fils d'exécution supplémentaires
+    set_num_threads(1)
+    tuile = Tuile(*arguments)
+    try:
+        while True:
+            commande, *parametres = connexion.recv()
+            if commande == "fin":
+                break
+            connexion.send(getattr(tuile, commande)(*parametres))
+    except Exception as e:
+        # L'erreur est renvoyée à la simulation, qui la relance
+        connexion.send(e)
+    finally:
+        tuile.fermer()
+
+
+# Une bande verticale de l'espace de simulation, calculée dans son propre processus.
+# Une tuile possède les personnes dont l'abscisse est dans sa bande, et voit en plus celles des tuiles voisines à moins d'un halo de ses bords.
+class Tuile:
+
+    def __init__(self, numero, bornes, halo, memoire, constantes, proprietaires, generateur, gauche, droite):
+        """ Initialisation de la tuile
+        ---
+        paramètres :
+
+            - numero (int) le numéro de la tuile, de gauche à droite
+            - bornes (np.array(int)) les abscisses des séparations entre tuiles
+            - halo (int) la largeur de la bande vue chez les tuiles voisines
+            - memoire (dict) les tableaux partagés (voir _attacher)
+            - constantes (tuple) le rayon, la vitesse maximale, k, f et les dimensions de l'espace de simulation
+            - proprietaires (np.array(int)) les indices des personnes de la tuile, triés
+            - generateur (np.random.Generator) le générateur de nombres aléatoires de la tuile
+            - gauche, droite (Connection / None) les liaisons avec les tuiles voisines
+        """
+        self.numero = numero
+        self.bornes = bornes
+        self.halo = halo
+        # La bande de la tuile (les tuiles des bords s'étendent à l'infini)
+        self.debut = bornes[numero - 1] if numero > 0 else -np.inf
+        self.fin = bornes[numero] if numero < len(bornes) else np.inf
+        self.tableaux, self.segments = _attacher(memoire)
+        for nom, tableau in self.tableaux.items():
+            setattr(self, nom, tableau)
+        self.RAYON, self.VMAX, self.k, self.f, self.largeur_sim, self.hauteur_sim = constantes
+        self.proprietaires = proprietaires
+        self.generateur = generateur
+        self.gauche = gauche
+        self.droite = droite
+        # Les personnes de la tuile suivies de celles du halo, pour l'itération en cours
+        self.locales = proprietaires
+
+
+    def echanger(self, vers_gauche, vers_droite):
+        """ Échange des indices avec les tuiles voisines
+        ---
+        paramètres :
+
+            - vers_gauche (np.array(int)) les indices envoyés à la tuile de gauche
+            - vers_droite (np.array(int)) les indices envoyés à la tuile de droite
+
+        résultats :
+
+            - np.array(int) les indices reçus de la tuile de gauche
+            - np.array(int) les indices reçus de la tuile de droite
+        """
+        de_gauche = de_droite = np.empty(0, dtype=np.int64)
+        # Dans chaque paire de voisines, celle de gauche envoie en premier : les échanges se font de proche en proche, sans interblocage
+        if self.gauche is not None:
+            de_gauche = self.gauche.recv()
+            self.gauche.send(vers_gauche)
+        if self.droite is not None:
+            self.droite.send(vers_droite)
+            de_droite = self.droite.recv()
+        return de_gauche, de_droite
+
+
+    def vitesses(self, comportement, exceptions):
+        """ Calcule les nouvelles vitesses des personnes de la tuile, après avoir échangé les halos
+        ---
+        paramètres :
+
+            - comportement (int) la valeur du comportement commun de la politique
+            - exceptions (dict(int: int)) la valeur du comportement de chaque personne qui fait exception
+        """
+        proprietaires = self.proprietaires
+        n = len(proprietaires)
+        x = self.x[proprietaires]
+        de_gauche, de_droite = self.echanger(proprietaires[x < self.debut + self.halo], proprietaires[x >= self.fin - self.halo])
+        self.locales = np.concatenate((proprietaires, de_gauche, de_droite))
+        xl, yl = self.x[self.locales], self.y[self.locales]
+        vx, vy = self.vx[self.locales], self.vy[self.locales]
+        # Les personnes de la tuile sont en tête des locales : leurs positions dans proprietaires sont aussi leurs positions dans les locales
+        politique = Politique(Comportement(comportement), {i: Comportement(c) for i, c in exceptions.items()})
+        mettre_a_jour_vitesses(politique.groupes_parmi(proprietaires), xl, yl, vx, vy, n, self.RAYON, self.k, self.f, self.VMAX,
+                               self.largeur_sim, self.hauteur_sim)
+        # Seules les vitesses des personnes de la tuile sont écrites
+        self.vx[proprietaires] = vx[:n]
+        self.vy[proprietaires] = vy[:n]
+
+
+    def deplacer(self):
+        """ Applique le schéma d'Euler pour la position des personnes de la tuile (troncature, comme int())
+        ---
+        """
+        proprietaires = self.proprietaires
+        self.x[proprietaires] += self.vx[proprietaires].astype(np.int64)
+        self.y[proprietaires] += self.vy[proprietaires].astype(np.int64)
+
+
+    def propager(self, infecteurs=False):
+        """ Marque les personnes saines en collision avec une personne infectée de la tuile
+        ---
+        paramètre :
+
+            - infecteurs (bool) si on cherche aussi qui a infecté chaque personne touchée
+
+        résultat :
+
+            - tuple(np.array(int), np.array(int)) / None les personnes touchées par la tuile et, pour chacune, la personne contagieuse
+              de la tuile de plus petit indice qui la touche (None si infecteurs est faux)
+        """
+        proprietaires = self.proprietaires
+        infectes = proprietaires[self.etat[proprietaires] == Etat.INFECTE.value]
+        # Chaque personne infectée a une probabilité p d'infecter au cours de cette itération
+        tirages = self.generateur.integers(0, 101, len(infectes))
+        contagieux = infectes[tirages <= self.p[infectes] * 100]
+        if not len(contagieux):
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)) if infecteurs else None
+        # Le halo, pris avant le déplacement, est assez large pour contenir toutes les personnes touchables après
+        locales = self.locales
+        xl, yl = self.x[locales], self.y[locales]
+        cles, debut, ordre, hauteur = _construire_cellules(xl, yl, 5 * self.RAYON)
+        touche = np.zeros(len(locales), dtype=np.bool_)
+        # Les personnes de la tuile sont en tête de locales, dans l'ordre
+        contagieux = np.searchsorted(proprietaires, contagieux)
+        _propager_infection(contagieux, xl, yl, self.etat[locales], Etat.SAIN.value, float(self.RAYON), debut, ordre, cles, hauteur, touche)
+        # Plusieurs tuiles peuvent marquer la même personne, elles écrivent la même valeur
+        self.touche[locales[touche]] = 1
+        if infecteurs:
+            touches = np.flatnonzero(touche)
+            return locales[touches], trouver_infecteurs(touches, contagieux, xl, yl, self.RAYON, locales)
+
+
+    def reassigner(self, iteration):
+        """ Applique les changements d'état de l'itération, puis transmet aux voisines les personnes sorties de la bande
+        ---
+        paramètre :
+
+            - iteration (int) le numéro de l'itération
+
+        résultat :
+
+            - np.array(int) le nombre de personnes saines, infectées et rétablies de la tuile
+        """
+        proprietaires = self.proprietaires
+        infectes = proprietaires[self.etat[proprietaires] == Etat.INFECTE.value]
+        self.etat[infectes[self.guerison[infectes] == iteration]] = Etat.RETABLI.value
+        nouveaux = proprietaires[self.touche[proprietaires] == 1]
+        self.etat[nouveaux] = Etat.INFECTE.value
+        self.guerison[nouveaux] = iteration + self.tps_infecte[nouveaux]
+        self.touche[nouveaux] = 0
+        # Une personne se déplace de moins d'une largeur de halo, elle ne peut donc aller que dans une tuile voisine
+        bande = np.searchsorted(self.bornes, self.x[proprietaires], side="right")
+        de_gauche, de_droite = self.echanger(proprietaires[bande < self.numero], proprietaires[bande > self.numero])
+        self.proprietaires = np.sort(np.concatenate((proprietaires[bande == self.numero], de_gauche, de_droite)))
+        return np.bincount(self.etat[self.proprietaires], minlength=4)[1:]
+
+
+    def capturer(self):
+        """ Donne ce que seule la tuile connaît, pour un instantané
+        ---
+        résultats :
+
+            - np.array(int) les indices des personnes de la tuile
+            - dict l'état du générateur de la tuile
+        """
+        return self.proprietaires, self.generateur.bit_generator.state
+
+
+    def restaurer(self, proprietaires, generateurs):
+        """ Remet la tuile dans un état capturé par capturer
+        ---
+        paramètres :
+
+            - proprietaires (list(np.array(int))) les indices des personnes de chaque tuile
+            - generateurs (list(dict)) l'état du générateur de chaque tuile
+        """
+        self.proprietaires = np.asarray(proprietaires[self.numero], dtype=np.int64)
+        self.locales = self.proprietaires
+        self.generateur.bit_generator.state = generateurs[self.numero]
+
+
+    def fermer(self):
+        """ Ferme les segments de mémoire partagée
+        ---
+        """
+        # Les vues doivent disparaître avant de fermer les segments
+        for nom in self.tableaux:
+            setattr(self, nom, None)
+        self.tableaux.clear()
+        for segment in self.segments:
+            segment.close()
+
+
+class SimulationDistribuee(SimulationVectorisee):
+
+    def __init__(self, population, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil, nb_processus=None):
+        """ Initialisation de la simulation, répartie en bandes verticales calculées chacune par un processus
+        ---
+        paramètres :
+
+            - population (PopulationVectorisee) la population de la simulation
+            - largeur_sim (int) la largeur de l'espace de la simulation
+            - hauteur_sim (int) la hauteur de l'espace de la simulation
+            - ecran (Pygame.Surface) la surface sur laquelle afficher la simulation
+            - taux_incidence (int) le nombre de personnes infectés simultanément avant de mettre en place une quarantaine
+            - seuil (float 0 <= seuil <= 1) le pourcentage de taux_incidence à atteindre afin de mettre fin à la quarantaine
+            - nb_processus (int / None) le nombre de tuiles (None pour une par cœur)
+        """
+        # Les dimensions sont nécessaires au découpage, fait avant qu'elles soient enregistrées par Simulation
+        self.largeur_sim = largeur_sim
+        self.hauteur_sim = hauteur_sim
+        self.nb_processus = nb_processus or os.cpu_count()
+        self.ferme = True
+        super().__init__(population, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.fermer()
+
+
+    def initialiser_population(self, population, grille):
+        """ Place la population en mémoire partagée et lance les processus des tuiles
+        ---
+        paramètres :
+
+            - population (PopulationVectorisee) la population de la simulation
+            - grille (bool) inutilisé, chaque tuile construit sa grille
+        """
+        self.population = population
+        self.nb_personnes = population.nb_personnes
+        self.grille = None
+        # Les générateurs des tuiles sont issus de celui de la population
+        self.generateur = population.generateur
+        # On infecte une personne
+        population.etat[0] = Etat.INFECTE.value
+        # Le halo couvre la répulsion (5 rayons) et la collision après un déplacement de part et d'autre
+        halo = 5 * population.RAYON + 3 * population.VMAX
+        # Une bande doit être plus large que le halo, pour que seules les tuiles voisines interagissent
+        nb_tuiles = max(1, min(self.nb_processus, self.largeur_sim // halo))
+        bornes = np.array([self.largeur_sim * k // nb_tuiles for k in range(1, nb_tuiles)], dtype=np.int64)
+
+        # Les colonnes de la population sont remplacées par des vues sur la mémoire partagée, l'affichage les lit directement
+        colonnes = {nom: getattr(population, nom) for nom in COLONNES}
+        # La date de guérison de chaque personne infectée, et les personnes touchées pendant l'itération
+        colonnes["guerison"] = np.full(self.nb_personnes, -1, dtype=np.int64)
+        colonnes["guerison"][0] = self.iteration + population.tps_infecte[0]
+        colonnes["touche"] = np.zeros(self.nb_personnes, dtype=np.uint8)
+        self.segments = []
+        memoire = {}
+        for nom, tableau in colonnes.items():
+            segment = shared_memory.SharedMemory(create=True, size=max(tableau.nbytes, 1))
+            vue = np.ndarray(len(tableau), dtype=tableau.dtype, buffer=segment.buf)
+            vue[:] = tableau
+            setattr(population, nom, vue)
+            self.segments.append(segment)
+            memoire[nom] = (segment.name, tableau.dtype.str, len(tableau))
+        self.effectifs = np.bincount(population.etat, minlength=4)[1:].tolist()
+        # Les personnes touchées pendant l'itération et la personne qui les a infectées, connues seulement si la simulation tient un journal
+        self.infections = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+        # On répartit les personnes entre les tuiles, chacune avec son propre flux de nombres aléatoires
+        bande = np.searchsorted(bornes, population.x, side="right")
+        generateurs = population.generateur.spawn(nb_tuiles)
+        constantes = (population.RAYON, population.VMAX, population.k, population.f, self.largeur_sim, self.hauteur_sim)
+        # Une liaison par paire de tuiles voisines
+        liens = [multiprocessing.Pipe() for _ in range(nb_tuiles - 1)]
+        # spawn plutôt que fork : les processus ne doivent pas hériter des fils d'exécution de numba
+        contexte = multiprocessing.get_context("spawn")
+        self.connexions, self.processus = [], []
+        for numero in range(nb_tuiles):
+            connexion, connexion_tuile = contexte.Pipe()
+            gauche = liens[numero - 1][1] if numero > 0 else None
+            droite = liens[numero][0] if numero < nb_tuiles - 1 else None
+            processus = contexte.Process(target=_lancer_tuile, daemon=True,
+                                         args=(connexion_tuile, numero, bornes, halo, memoire, constantes,
+                                               np.flatnonzero(bande == numero), generateurs[numero], gauche, droite))
+            processus.start()
+            # On ferme les extrémités des tuiles, pour être prévenu si un processus s'arrête
+            connexion_tuile.close()
+            self.connexions.append(connexion)
+            self.processus.append(processus)
+        for a, b in liens:
+            a.close()
+            b.close()
+        self.ferme = False
+        # On arrête les processus et on libère la mémoire partagée, même si le programme est quitté (Échap)
+        atexit.register(self.fermer)
+
+
+    def commander(self, *commande):
+        """ Envoie une commande à toutes les tuiles et attend leurs réponses
+        ---
+        paramètre :
+
+            - commande (tuple) le nom de la méthode de Tuile et ses paramètres
+
+        résultat :
+
+            - list une réponse par tuile
+        """
+        for connexion in self.connexions:
+            connexion.send(commande)
+        reponses = [connexion.recv() for connexion in self.connexions]
+        for reponse in reponses:
+            if isinstance(reponse, Exception):
+                raise reponse
+        return reponses
+
+
+    def reassignation(self):
+        """ Applique les changements d'état de l'itération et fait la somme des compartiments de toutes les tuiles
+        ---
+        """
+        # La quarantaine est décidée sur le nombre total d'infectés
+        self.effectifs = np.sum(self.commander("reassigner", self.iteration), axis=0).tolist()
+        # On écrit qui a infecté qui, où et quand : les tuiles ne déplacent personne pendant la réassignation
+        nouveaux, infecteurs = self.infections
+        if self.journal is not None and len(nouveaux):
+            self.journal.ajouter(self.iteration, infecteurs, nouveaux, self.population.x[nouveaux], self.population.y[nouveaux])
+        self.infections = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+
+    def deplacer_personnes(self):
+        """ Fait avancer toutes les personnes d'une itération
+        ---
+        """
+        # Toutes les vitesses sont calculées avant qu'une tuile ne déplace ses personnes
+        politique = self.politique
+        self.commander("vitesses", politique.comportement.value, {i: c.value for i, c in politique.exceptions.items()})
+        self.commander("deplacer")
+
+
+    def propager_infection(self):
+        """ Marque les personnes saines en contact avec une personne infectée, leur état change lors de la réassignation
+        ---
+        """
+        reponses = self.commander("propager", self.journal is not None)
+        if self.journal is not None:
+            # Une personne au bord peut être touchée depuis deux tuiles : on garde la personne contagieuse de plus petit indice
+            nouveaux = np.concatenate([reponse[0] for reponse in reponses])
+            infecteurs = np.concatenate([reponse[1] for reponse in reponses])
+            ordre = np.lexsort((infecteurs, nouveaux))
+            nouveaux, infecteurs = nouveaux[ordre], infecteurs[ordre]
+            premiere = np.ones(len(nouveaux), dtype=bool)
+            premiere[1:] = nouveaux[1:] != nouveaux[:-1]
+            self.infections = (nouveaux[premiere], infecteurs[premiere])
+
+
+    def etats_personnes(self, indices):
+        """ Donne l'état de personnes et leur itération de guérison, pour les transférer dans une autre simulation
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes
+
+        résultats :
+
+            - np.array(int) l'état de chaque personne (valeurs de Etat)
+            - np.array(int) l'itération de guérison programmée, -1 pour les personnes non infectées
+        """
+        # Les états et les dates de guérison sont en mémoire partagée, les tuiles n'y touchent pas entre deux itérations
+        population = self.population
+        etats = population.etat[indices].copy()
+        return etats, np.where(etats == Etat.INFECTE.value, population.guerison[indices], -1)
+
+
+    def remplacer_etats(self, indices, etats, guerisons):
+        """ Remplace l'état de personnes (par celui de voyageurs venus d'une autre simulation), en tenant à jour les compartiments
+        ---
+        paramètres :
+
+            - indices (np.array(int)) les indices des personnes, distincts
+            - etats (np.array(int)) le nouvel état de chaque personne (valeurs de Etat)
+            - guerisons (np.array(int)) l'itération de guérison des personnes infectées, postérieure à l'itération en cours
+        """
+        population = self.population
+        ecarts = np.bincount(etats, minlength=4)[1:] - np.bincount(population.etat[indices], minlength=4)[1:]
+        self.effectifs = (np.array(self.effectifs) + ecarts).tolist()
+        population.etat[indices] = etats
+        # Chaque tuile lit la date de guérison de ses infectés lors de la réassignation
+        infectes = etats == Etat.INFECTE.value
+        population.guerison[indices] = np.where(infectes, guerisons, -1)
+        if infectes.any():
+            self.terminee = False
+
+
+    def capturer_population(self):
+        """ Copie l'état de la population, depuis la mémoire partagée, et celui des tuiles
+        ---
+        résultat :
+
+            - dict
+        """
+        population = self.population
+        etat = {clee: getattr(population, clee).copy() for clee in COLONNES + ("guerison",)}
+        # Les personnes de chaque tuile et son générateur ne sont connus que de son processus
+        tuiles = self.commander("capturer")
+        etat.update({"classe": type(population).__name__,
+                     "rayon": population.RAYON,
+                     "generateur": population.generateur.bit_generator.state,
+                     "effectifs": list(self.effectifs),
+                     "proprietaires": [proprietaires for proprietaires, _ in tuiles],
+                     "generateurs": [generateur for _, generateur in tuiles]})
+        return etat
+
+
+    def restaurer_population(self, etat):
+        """ Remet la population et les tuiles dans un état capturé par capturer_population
+        ---
+        paramètre :
+
+            - etat (dict) le résultat de capturer_population
+        """
+        if len(etat["generateurs"]) != len(self.connexions):
+            raise ValueError(f"L'instantané a {len(etat['generateurs'])} tuiles, la simulation en a {len(self.connexions)}")
+        population = self.population
+        # On écrit dans la mémoire partagée, que les tuiles lisent directement
+        for clee in COLONNES + ("guerison",):
+            getattr(population, clee)[:] = etat[clee]
+        # Les instantanés sont pris entre deux itérations : aucune personne n'est touchée
+        population.touche[:] = 0
+        population.generateur.bit_generator.state = etat["generateur"]
+        self.effectifs = list(etat["effectifs"])
+        self.commander("restaurer", etat["proprietaires"], etat["generateurs"])
+
+
+    @classmethod
+    def depuis_etat(cls, etat, ecran=None):
+        """ Recrée une simulation distribuée depuis un état capturé par capturer_etat, avec le même nombre de tuiles
+        ---
+        paramètres :
+
+            - etat (dict) le résultat de capturer_etat
+            - ecran (Pygame.Surface / None) la surface sur laquelle afficher la simulation, None pour une simulation sans affichage
+
+        résultat :
+
+            - SimulationDistribuee
+        """
+        colonnes = etat["population"]
+        population = PopulationVectorisee(colonnes["x"], colonnes["y"], colonnes["vx"], colonnes["vy"], colonnes["p"], colonnes["rayon"], colonnes["tps_infecte"], np.random.default_rng())
+        simulation = cls(population, etat["largeur_sim"], etat["hauteur_sim"], ecran, etat["taux_incidence"], etat["seuil"], len(colonnes["generateurs"]))
+        simulation.restaurer_etat(etat)
+        return simulation
+
+
+    def fermer(self):
+        """ Arrête les processus des tuiles et libère la mémoire partagée, la population reste lisible
+        ---
+        """
+        if self.ferme:
+            return
+        self.ferme = True
+        for connexion in self.connexions:
+            try:
+                connexion.send(("fin",))
+            except (BrokenPipeError, OSError):
+                pass
+        for processus in self.processus:
+            processus.join()
+        # On recopie les colonnes hors de la mémoire partagée avant de la libérer
+        for nom in COLONNES + ("guerison",):
+            setattr(self.population, nom, getattr(self.population, nom).copy())
+        del self.population.touche
+        for segment in self.segments:
+            segment.close()
+            segment.unlink()
+        atexit.unregister(self.fermer)
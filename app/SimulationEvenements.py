@@ -0,0 +1,593 @@
+import heapq
+import math
+
+import numpy as np
+
+from PopulationVectorisee import TAILLE_BLOC, GrilleVectorisee, SimulationVectorisee
+from simulation import Comportement, Etat
+
+# Les types d'événements, dans l'ordre de traitement des événements simultanés : un test de contact passe avant un rebond à la même itération
+INFECTION = 0
+REBOND = 1
+# La marge de calcul autour des bornes d'un contact, dont chaque itération est de toute façon testée exactement
+EPSILON = 1e-9
+# La durée d'une époque, en itérations : les contacts possibles pendant une époque sont cherchés dans une grille construite à son début
+DUREE_EPOQUE = 10
+# Le nombre de personnes jusqu'auquel les cellules voisines sont lues personne par personne plutôt que par GrilleVectorisee.paires
+PETIT_GROUPE = 64
+
+
+# Classe de la simulation avancée d'événement en événement, pour les populations peu denses.
+# Les événements ont lieu aux itérations, comme les calculs des autres moteurs : les positions sont les mêmes, une personne contagieuse
+# fait un tirage par itération et une personne saine est infectée si elle est en collision (Personne.collision) avec elle.
+# La répulsion de la quarantaine ne donne pas de trajectoires en ligne droite : tant qu'un groupe est en quarantaine, la simulation avance pas à pas
+class SimulationEvenements(SimulationVectorisee):
+
+    def __init__(self, population, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil):
+        """ Initialisation de la simulation : les personnes vont en ligne droite entre deux rebonds, et seuls les rebonds et les contacts
+        infectieux sont calculés, au lieu de toutes les positions à chaque itération
+        ---
+        paramètres :
+
+            - population (PopulationVectorisee) la population de la simulation
+            - largeur_sim (int) la largeur de l'espace de la simulation
+            - hauteur_sim (int) la hauteur de l'espace de la simulation
+            - ecran (Pygame.Surface) la surface sur laquelle afficher la simulation
+            - taux_incidence (int) le nombre de personnes infectés simultanément avant de mettre en place une quarantaine
+            - seuil (float 0 <= seuil <= 1) le pourcentage de taux_incidence à atteindre afin de mettre fin à la quarantaine
+        """
+        # Les dimensions servent aux rebonds, calculés dès l'initialisation de la population
+        self.largeur_sim = largeur_sim
+        self.hauteur_sim = hauteur_sim
+        super().__init__(population, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil)
+
+
+    def initialiser_population(self, population, grille):
+        """ Initialisation de la population, de ses trajectoires et des premiers événements
+        ---
+        paramètres :
+
+            - population (PopulationVectorisee) la population de la simulation
+            - grille (bool) inutilisé, les contacts sont cherchés dans la grille de chaque époque
+        """
+        n = population.nb_personnes
+        # L'itération de guérison de chaque personne infectée, qui borne ses contacts (l'infini pour les autres)
+        self.dates_guerison = np.full(n, np.inf)
+        super().initialiser_population(population, grille)
+        # La distance au-delà de laquelle deux personnes ne sont pas en collision (Personne.collision)
+        self.distance = 4 * population.RAYON
+        # Le dernier tirage de chaque personne infectée : l'itération où il a été fait et si elle était alors contagieuse
+        self.iterations_tirage = np.full(n, -1.)
+        self.contagieuses = np.zeros(n, dtype=bool)
+        # Les infections de l'itération en cours (personne contagieuse, personne infectée, position de l'infection), pour le journal
+        self.infections = []
+        # Si la simulation avance pas à pas, pendant une quarantaine
+        self.pas_a_pas = False
+        # L'instant atteint par la simulation, qui avance d'une unité par itération
+        self.temps = 0.
+        # Chaque trajectoire est donnée par une position à un instant de référence (le dernier rebond) et une vitesse constante
+        self.x0 = np.zeros(n)
+        self.y0 = np.zeros(n)
+        self.t0 = np.zeros(n)
+        self.ux = np.zeros(n)
+        self.uy = np.zeros(n)
+        # Le numéro de la trajectoire de chaque personne, qui invalide les événements calculés sur une ancienne trajectoire
+        self.versions = np.zeros(n, dtype=np.int64)
+        # L'instant du prochain rebond de chaque personne, et la fin de la trajectoire suivie pour les contacts de chaque infecté
+        self.rebonds = np.zeros(n)
+        self.fins = np.zeros(n)
+        # Les positions au début de l'époque en cours, la grille où elles sont rangées, et l'instant de fin de l'époque
+        self.x_epoque = np.zeros(n, dtype=np.int64)
+        self.y_epoque = np.zeros(n, dtype=np.int64)
+        self.voisinage = None
+        self.fin_epoque = 0.
+        # Les cellules de la grille où se trouvait une personne infectée, et les décalages vers leurs cellules voisines
+        self.cellules_infectees = set()
+        self.decalages = []
+        # La file de priorité des événements : (itération, type, personne, numéro d'ordre, autre personne ou murs, versions, dernière itération
+        # du contact). À la même itération, les personnes infectées sont prises par indice croissant, comme pour le journal des autres moteurs
+        self.evenements = []
+        self.nb_evenements = 0
+        self.synchroniser()
+
+
+    def programmer_guerisons(self, indices, iterations=None):
+        """ Programme la guérison des personnes qui viennent d'être infectées, qui borne aussi leurs contacts
+        ---
+        paramètres :
+
+            - indices (np.array(int)) les indices des personnes
+            - iterations (np.array(int) / None) l'itération de guérison de chaque personne (None pour la fin de leur temps d'infection)
+        """
+        if iterations is None:
+            iterations = self.iteration + self.population.tps_infecte[indices]
+        super().programmer_guerisons(indices, iterations)
+        self.dates_guerison[indices] = iterations
+
+
+    def ajouter_evenement(self, t, type_evenement, i, j, version_i, version_j, derniere=0.):
+        """ Ajoute un événement à la file
+        ---
+        paramètres :
+
+            - t (float) l'itération de l'événement
+            - type_evenement (int) INFECTION (un test de contact) ou REBOND
+            - i (int) la personne infectée ou qui rebondit
+            - j (int) la personne saine, ou les murs touchés
+            - version_i, version_j (int) les versions des trajectoires sur lesquelles l'événement a été calculé
+            - derniere (float) la dernière itération où le contact est possible
+        """
+        heapq.heappush(self.evenements, (t, type_evenement, i, self.nb_evenements, j, version_i, version_j, derniere))
+        self.nb_evenements += 1
+
+
+    def positions(self, indices, t):
+        """ Calcule la position de personnes à un instant, sur leur trajectoire en cours
+        ---
+        paramètres :
+
+            - indices (np.array(int) / int / slice) les indices des personnes
+            - t (float) l'instant, au plus celui de leur prochain rebond
+
+        résultats :
+
+            - np.array(float) / float les abscisses
+            - np.array(float) / float les ordonnées
+        """
+        dt = t - self.t0[indices]
+        return self.x0[indices] + self.ux[indices] * dt, self.y0[indices] + self.uy[indices] * dt
+
+
+    def synchroniser(self):
+        """ Repart des positions et des vitesses de la population : toutes les trajectoires et tous les événements sont recalculés
+        ---
+        """
+        population = self.population
+        self.x0 = population.x.astype(np.float64)
+        self.y0 = population.y.astype(np.float64)
+        self.t0 = np.full(self.nb_personnes, self.temps)
+        # Les vitesses sont tronquées comme par le schéma d'Euler des autres moteurs, où une personne lente ne bouge pas
+        self.ux = np.trunc(population.vx)
+        self.uy = np.trunc(population.vy)
+        self.versions += 1
+        self.evenements = []
+        self.programmer_rebonds(np.arange(self.nb_personnes))
+        self.commencer_epoque()
+
+
+    def materialiser(self):
+        """ Écrit dans la population les positions atteintes, pour avancer pas à pas ; les événements seront recalculés par synchroniser
+        ---
+        """
+        x, y = self.positions(slice(None), self.temps)
+        self.population.x[:] = x.astype(np.int64)
+        self.population.y[:] = y.astype(np.int64)
+        self.evenements = []
+
+
+    def commencer_epoque(self):
+        """ Range les personnes dans la grille de la nouvelle époque et cherche les contacts de toutes les personnes infectées
+        ---
+        """
+        x, y = self.positions(slice(None), self.temps)
+        self.x_epoque = np.floor(x).astype(np.int64)
+        self.y_epoque = np.floor(y).astype(np.int64)
+        self.fin_epoque = self.temps + DUREE_EPOQUE
+        # Une personne parcourt au plus vmax par itération sur chaque axe, même en rebondissant : deux personnes en contact pendant l'époque
+        # étaient à son début à moins de la distance de contact et de deux parcours, et sont donc dans des cellules voisines
+        vmax = max(self.population.VMAX, float(np.abs(self.ux).max(initial=0)), float(np.abs(self.uy).max(initial=0)))
+        self.voisinage = GrilleVectorisee(math.ceil(self.distance + 2 * vmax * DUREE_EPOQUE) + 2)
+        self.voisinage.construire(self.x_epoque, self.y_epoque)
+        hauteur = self.voisinage.hauteur_grille
+        self.decalages = [dx * hauteur + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+        self.cellules_infectees = set()
+        self.contacts(self.indices_infectes)
+
+
+    def programmer_rebonds(self, indices):
+        """ Calcule le prochain rebond de personnes contre les bords et l'ajoute aux événements
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes, qui viennent de changer de trajectoire
+        """
+        x0, y0, ux, uy = self.x0[indices], self.y0[indices], self.ux[indices], self.uy[indices]
+        # Comme pour les autres moteurs, la vitesse change de sens à la première itération où la personne est sortie de l'espace
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tx = np.where(ux > 0, np.where(x0 > self.largeur_sim, 0, np.floor((self.largeur_sim - x0) / ux) + 1),
+                          np.where(ux < 0, np.where(x0 < 0, 0, np.floor(x0 / -ux) + 1), np.inf))
+            ty = np.where(uy > 0, np.where(y0 > self.hauteur_sim, 0, np.floor((self.hauteur_sim - y0) / uy) + 1),
+                          np.where(uy < 0, np.where(y0 < 0, 0, np.floor(y0 / -uy) + 1), np.inf))
+        dt = np.minimum(tx, ty)
+        self.rebonds[indices] = self.t0[indices] + dt
+        # Les murs touchés : 1 pour un bord vertical, 2 pour un bord horizontal, 3 pour un coin
+        murs = (tx == dt) + 2 * (ty == dt)
+        for i, t, mur in zip(indices.tolist(), self.rebonds[indices].tolist(), murs.tolist()):
+            if t < math.inf:
+                self.ajouter_evenement(t, REBOND, i, mur, int(self.versions[i]), 0)
+
+
+    def programmer_rebond(self, i):
+        """ Calcule le prochain rebond d'une personne contre les bords, comme programmer_rebonds, sans passer par des tableaux
+        ---
+        paramètre :
+
+            - i (int) l'indice de la personne, qui vient de changer de trajectoire
+        """
+        x0, y0, ux, uy = float(self.x0[i]), float(self.y0[i]), float(self.ux[i]), float(self.uy[i])
+        if ux > 0:
+            tx = 0 if x0 > self.largeur_sim else (self.largeur_sim - x0) // ux + 1
+        else:
+            tx = (0 if x0 < 0 else x0 // -ux + 1) if ux < 0 else math.inf
+        if uy > 0:
+            ty = 0 if y0 > self.hauteur_sim else (self.hauteur_sim - y0) // uy + 1
+        else:
+            ty = (0 if y0 < 0 else y0 // -uy + 1) if uy < 0 else math.inf
+        dt = min(tx, ty)
+        t = float(self.t0[i]) + dt
+        self.rebonds[i] = t
+        if t < math.inf:
+            self.ajouter_evenement(t, REBOND, i, (tx == dt) + 2 * (ty == dt), int(self.versions[i]), 0)
+
+
+    def programmer_contacts(self, infecteurs, sains, t, fins):
+        """ Calcule les contacts entre des personnes infectées et des personnes saines, et ajoute aux événements le test de la première
+        itération de chaque contact
+        ---
+        paramètres :
+
+            - infecteurs (np.array(int)) les indices des personnes infectées, une par paire
+            - sains (np.array(int)) les indices des personnes saines, une par paire
+            - t (float) l'itération après laquelle les contacts sont cherchés
+            - fins (np.array(float)) la dernière itération où les deux trajectoires de chaque paire sont suivies
+        """
+        xi, yi = self.positions(infecteurs, t)
+        xs, ys = self.positions(sains, t)
+        dx, dy = xs - xi, ys - yi
+        dvx, dvy = self.ux[sains] - self.ux[infecteurs], self.uy[sains] - self.uy[infecteurs]
+        # La distance au carré est un polynôme du second degré en la durée écoulée : a u² + b u + c
+        a = dvx ** 2 + dvy ** 2
+        b = 2 * (dx * dvx + dy * dvy)
+        c = dx ** 2 + dy ** 2 - self.distance ** 2
+        discriminant = b ** 2 - 4 * a * c
+        contact = discriminant >= 0
+        if not contact.any():
+            return
+        infecteurs, sains, fins = infecteurs[contact], sains[contact], fins[contact]
+        a, b, c, racine = a[contact], b[contact], c[contact], np.sqrt(discriminant[contact])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            debut = np.where(a > 0, (-b - racine) / (2 * a), np.where(c <= 0, -np.inf, np.inf))
+            fin = np.where(a > 0, (-b + racine) / (2 * a), np.inf)
+        # Les personnes ne peuvent être en collision qu'aux itérations où elles sont à moins de la distance, après t et jusqu'à la fin des trajectoires
+        premiere = t + np.maximum(np.ceil(debut - EPSILON), 1)
+        derniere = np.minimum(t + np.floor(fin + EPSILON), fins)
+        contact = premiere <= derniere
+        for i, j, u, v in zip(infecteurs[contact].tolist(), sains[contact].tolist(), premiere[contact].tolist(), derniere[contact].tolist()):
+            self.ajouter_evenement(u, INFECTION, i, j, int(self.versions[i]), int(self.versions[j]), v)
+
+
+    def contagieuse(self, i):
+        """ Indique si une personne infectée est contagieuse à l'itération en cours : comme pour les autres moteurs, elle l'est avec la
+        probabilité p, par un seul tirage par itération pour tous ses contacts
+        ---
+        paramètre :
+
+            - i (int) l'indice de la personne
+
+        résultat :
+
+            - bool
+        """
+        if self.iterations_tirage[i] != self.temps:
+            self.iterations_tirage[i] = self.temps
+            self.contagieuses[i] = self.generateur.integers(0, 101) <= self.population.p[i] * 100
+        return self.contagieuses[i]
+
+
+    def tester_contact(self, i, j, derniere):
+        """ Infecte une personne saine si elle est en collision avec une personne infectée contagieuse à l'itération en cours, et
+        sinon programme le test de l'itération suivante du contact
+        ---
+        paramètres :
+
+            - i (int) l'indice de la personne infectée
+            - j (int) l'indice de la personne saine
+            - derniere (float) la dernière itération où le contact est possible
+        """
+        xi, yi = self.positions(i, self.temps)
+        xj, yj = self.positions(j, self.temps)
+        dx, dy = xi - xj, yi - yj
+        # Le test de Personne.collision, sur les positions entières des autres moteurs
+        rayon = self.population.RAYON
+        if dx < 1.5 * 2 * rayon and dy < 1.5 * 2 * rayon and dx ** 2 + dy ** 2 <= 4 * 4 * rayon ** 2 and self.contagieuse(i):
+            self.infecter(i, j)
+        elif self.temps < derniere:
+            self.ajouter_evenement(self.temps + 1, INFECTION, i, j, int(self.versions[i]), int(self.versions[j]), derniere)
+
+
+    def paires_voisines(self, indices):
+        """ Donne les paires (personne donnée, personne d'une des 9 cellules voisines de la grille de l'époque)
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes dont on cherche les voisins
+
+        résultats :
+
+            - np.array(int) les indices des personnes données
+            - np.array(int) les indices de leurs voisins potentiels
+        """
+        # Le coût de GrilleVectorisee.paires ne dépend presque pas du nombre de personnes : pour quelques personnes, il vaut mieux les prendre une à une
+        if len(indices) > PETIT_GROUPE:
+            return self.voisinage.paires(indices)
+        voisins = [self.voisinage.voisins(i) for i in indices.tolist()]
+        if not voisins:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.repeat(indices, [len(v) for v in voisins]), np.concatenate(voisins)
+
+
+    def contacts(self, indices):
+        """ Cherche les contacts de personnes qui commencent une trajectoire avec les personnes des cellules voisines, jusqu'à la fin de l'époque
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes
+        """
+        etat = self.population.etat
+        infectes = indices[etat[indices] == Etat.INFECTE.value]
+        sains = indices[etat[indices] == Etat.SAIN.value]
+        self.cellules_infectees.update(self.voisinage.cles[infectes].tolist())
+        self.fins[infectes] = np.minimum(np.minimum(self.rebonds[infectes], self.dates_guerison[infectes]), self.fin_epoque)
+        for debut in range(0, len(infectes), TAILLE_BLOC):
+            i, j = self.paires_voisines(infectes[debut:debut + TAILLE_BLOC])
+            saine = etat[j] == Etat.SAIN.value
+            i, j = i[saine], j[saine]
+            self.programmer_contacts(i, j, self.temps, np.minimum(self.fins[i], self.rebonds[j]))
+        if not len(sains):
+            return
+        # Une paire dont les deux personnes commencent une trajectoire a déjà été vue depuis la personne infectée
+        deja_vus = np.zeros(self.nb_personnes, dtype=bool)
+        deja_vus[infectes] = True
+        for debut in range(0, len(sains), TAILLE_BLOC):
+            j, i = self.paires_voisines(sains[debut:debut + TAILLE_BLOC])
+            infecte = (etat[i] == Etat.INFECTE.value) & ~deja_vus[i]
+            i, j = i[infecte], j[infecte]
+            self.programmer_contacts(i, j, self.temps, np.minimum(self.fins[i], self.rebonds[j]))
+
+
+    def contacts_infecte(self, i):
+        """ Cherche les contacts d'une personne infectée avec les personnes saines des cellules voisines, jusqu'à la fin de sa trajectoire
+        ---
+        paramètre :
+
+            - i (int) l'indice de la personne infectée
+        """
+        self.fins[i] = min(self.rebonds[i], self.dates_guerison[i], self.fin_epoque)
+        self.cellules_infectees.add(int(self.voisinage.cles[i]))
+        voisins = self.voisinage.voisins(i)
+        sains = voisins[self.population.etat[voisins] == Etat.SAIN.value]
+        if len(sains):
+            self.programmer_contacts(np.full(len(sains), i), sains, self.temps, np.minimum(self.rebonds[sains], self.fins[i]))
+
+
+    def contacts_sain(self, j):
+        """ Cherche les contacts d'une personne saine avec les personnes infectées des cellules voisines, jusqu'à la fin de sa trajectoire
+        ---
+        paramètre :
+
+            - j (int) l'indice de la personne saine
+        """
+        # On évite de parcourir les cellules voisines quand aucune n'a accueilli de personne infectée pendant l'époque
+        cle = int(self.voisinage.cles[j])
+        if not any(cle + decalage in self.cellules_infectees for decalage in self.decalages):
+            return
+        voisins = self.voisinage.voisins(j)
+        infectes = voisins[self.population.etat[voisins] == Etat.INFECTE.value]
+        if len(infectes):
+            self.programmer_contacts(infectes, np.full(len(infectes), j), self.temps, np.minimum(self.fins[infectes], self.rebonds[j]))
+
+
+    def changer_trajectoires(self, indices):
+        """ Fait partir des personnes de leur position actuelle avec leur vitesse dans la population, et recalcule leurs événements
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes, distincts
+        """
+        population = self.population
+        self.x0[indices], self.y0[indices] = self.positions(indices, self.temps)
+        self.t0[indices] = self.temps
+        self.ux[indices] = np.trunc(population.vx[indices])
+        self.uy[indices] = np.trunc(population.vy[indices])
+        # Les événements calculés sur les anciennes trajectoires sont invalidés par le changement de version
+        self.versions[indices] += 1
+        self.programmer_rebonds(indices)
+        self.contacts(indices)
+
+
+    def rebondir(self, i, murs):
+        """ Fait rebondir une personne contre un bord et recalcule les contacts de sa nouvelle trajectoire
+        ---
+        paramètres :
+
+            - i (int) l'indice de la personne
+            - murs (int) les bords touchés (1 vertical, 2 horizontal, 3 les deux)
+        """
+        population = self.population
+        self.x0[i], self.y0[i] = self.positions(i, self.temps)
+        self.t0[i] = self.temps
+        # La vitesse de la population change de sens avec la trajectoire, pour pouvoir repartir pas à pas
+        if murs & 1:
+            self.ux[i] = -self.ux[i]
+            population.vx[i] = -population.vx[i]
+        if murs & 2:
+            self.uy[i] = -self.uy[i]
+            population.vy[i] = -population.vy[i]
+        self.versions[i] += 1
+        self.programmer_rebond(i)
+        # Les contacts calculés sur l'ancienne trajectoire sont invalidés par le changement de version
+        etat = population.etat[i]
+        if etat == Etat.INFECTE.value:
+            self.contacts_infecte(i)
+        elif etat == Etat.SAIN.value and self.effectifs[1]:
+            self.contacts_sain(i)
+
+
+    def infecter(self, i, j):
+        """ Infecte une personne saine au contact d'une personne infectée ; comme pour les autres moteurs, elle ne sera contagieuse
+        qu'à partir de l'itération suivante
+        ---
+        paramètres :
+
+            - i (int) l'indice de la personne infectée
+            - j (int) l'indice de la personne saine
+        """
+        self.population.etat[j] = Etat.INFECTE.value
+        self.indices_infectes = np.append(self.indices_infectes, j)
+        self.effectifs[0] -= 1
+        self.effectifs[1] += 1
+        # La guérison a lieu lors d'une réassignation, comme pour les autres moteurs
+        self.programmer_guerisons(np.array([j]))
+        if self.journal is not None:
+            x, y = self.positions(j, self.temps)
+            self.infections.append((i, j, int(x), int(y)))
+        # Ses contacts sont cherchés après l'itération en cours
+        self.contacts_infecte(j)
+
+
+    def accelerer(self, indices):
+        """ Porte à la vitesse maximale des personnes qui se déplacent, en changeant la trajectoire de celles dont la vitesse effective change
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices des personnes
+        """
+        population = self.population
+        population.vitesse_maximale(indices)
+        change = (np.trunc(population.vx[indices]) != self.ux[indices]) | (np.trunc(population.vy[indices]) != self.uy[indices])
+        if change.any():
+            self.changer_trajectoires(indices[change])
+
+
+    def deplacer_personnes(self):
+        """ Traite les événements jusqu'à la fin de l'itération, sans calculer les positions des personnes sauf pour les afficher.
+        Tant qu'un groupe est en quarantaine, fait plutôt avancer toutes les personnes d'une itération
+        ---
+        """
+        groupes = self.politique.groupes(self.nb_personnes)
+        pas_a_pas = any(comportement == Comportement.QUARANTAINE and (indices is None or len(indices)) for comportement, indices in groupes)
+        if pas_a_pas != self.pas_a_pas:
+            self.pas_a_pas = pas_a_pas
+            # On part des positions atteintes pour avancer pas à pas, puis des positions et des vitesses calculées pour revenir aux événements
+            if pas_a_pas:
+                self.materialiser()
+            else:
+                self.synchroniser()
+        if pas_a_pas:
+            self.population.mise_a_jour(self.largeur_sim, self.hauteur_sim, groupes)
+            self.temps = float(self.iteration)
+            return
+
+        if self.temps >= self.fin_epoque:
+            self.commencer_epoque()
+        # Les personnes qui se déplacent vont tout droit à la vitesse maximale
+        for comportement, indices in groupes:
+            if comportement == Comportement.DEPLACEMENT:
+                self.accelerer(np.arange(self.nb_personnes) if indices is None else indices)
+        etat, versions, file = self.population.etat, self.versions, self.evenements
+        while file and file[0][0] <= self.iteration:
+            t, type_evenement, i, _, j, version_i, version_j, derniere = heapq.heappop(file)
+            # Un événement calculé sur une trajectoire qui a changé depuis est ignoré
+            if versions[i] != version_i:
+                continue
+            self.temps = t
+            if type_evenement == REBOND:
+                self.rebondir(i, j)
+            # Un contact n'est testé que si les deux personnes sont encore sur les trajectoires et dans les états du calcul
+            elif versions[j] == version_j and etat[i] == Etat.INFECTE.value and etat[j] == Etat.SAIN.value:
+                self.tester_contact(i, j, derniere)
+        self.temps = float(self.iteration)
+        if self.affichage:
+            x, y = self.positions(slice(None), self.temps)
+            self.population.x[:] = x.astype(np.int64)
+            self.population.y[:] = y.astype(np.int64)
+
+
+    def propager_infection(self):
+        """ Pendant une quarantaine, infecte les personnes saines en contact avec une personne infectée ; sinon les infections sont
+        des événements, déjà traités par deplacer_personnes
+        ---
+        """
+        if self.pas_a_pas:
+            super().propager_infection()
+
+
+    def reassignation(self):
+        """ Écrit dans le journal les infections traitées comme événements, puis applique les guérisons et les infections pas à pas
+        ---
+        """
+        if self.infections:
+            infecteurs, infectes, x, y = np.array(self.infections).T
+            self.journal.ajouter(self.iteration, infecteurs, infectes, x, y)
+            self.infections = []
+        super().reassignation()
+
+
+    def remplacer_etats(self, indices, etats, guerisons):
+        """ Remplace l'état de personnes (par celui de voyageurs venus d'une autre simulation), en tenant à jour les compartiments
+        ---
+        paramètres :
+
+            - indices (np.array(int)) les indices des personnes, distincts
+            - etats (np.array(int)) le nouvel état de chaque personne (valeurs de Etat)
+            - guerisons (np.array(int)) l'itération de guérison des personnes infectées, postérieure à l'itération en cours
+        """
+        super().remplacer_etats(indices, etats, guerisons)
+        self.dates_guerison[indices[etats != Etat.INFECTE.value]] = np.inf
+        # Les contacts calculés pour ces personnes ne correspondent plus à leur état : on les recalcule sur la même trajectoire
+        if not self.pas_a_pas:
+            self.changer_trajectoires(indices)
+
+
+    def capturer_population(self):
+        """ Copie l'état de la population, des compartiments, des trajectoires et de la file des événements
+        ---
+        résultat :
+
+            - dict
+        """
+        etat = super().capturer_population()
+        etat.update({clee: getattr(self, clee).copy() for clee in ("x0", "y0", "t0", "ux", "uy", "versions", "rebonds", "fins", "x_epoque", "y_epoque")})
+        etat.update({"pas_a_pas": self.pas_a_pas,
+                     "fin_epoque": self.fin_epoque,
+                     "taille_cellule": self.voisinage.taille_cellule,
+                     # L'ordre de la file dépend de son histoire : on la garde telle quelle, avec le numéro du prochain événement
+                     "evenements": [list(evenement) for evenement in self.evenements],
+                     "nb_evenements": self.nb_evenements})
+        return etat
+
+
+    def restaurer_population(self, etat):
+        """ Remet la population, les compartiments, les trajectoires et la file des événements dans un état capturé par capturer_population
+        ---
+        paramètre :
+
+            - etat (dict) le résultat de capturer_population
+        """
+        super().restaurer_population(etat)
+        for clee in ("x0", "y0", "t0", "ux", "uy", "versions", "rebonds", "fins", "x_epoque", "y_epoque"):
+            getattr(self, clee)[:] = etat[clee]
+        self.dates_guerison[:] = np.inf
+        for iteration, tableaux in self.guerisons.items():
+            for tableau in tableaux:
+                self.dates_guerison[tableau] = iteration
+        self.pas_a_pas = etat["pas_a_pas"]
+        self.temps = float(self.iteration)
+        self.fin_epoque = etat["fin_epoque"]
+        self.voisinage = GrilleVectorisee(etat["taille_cellule"])
+        self.voisinage.construire(self.x_epoque, self.y_epoque)
+        hauteur = self.voisinage.hauteur_grille
+        self.decalages = [dx * hauteur + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+        self.cellules_infectees = set(self.voisinage.cles[self.indices_infectes].tolist())
+        self.evenements = [tuple(evenement) for evenement in etat["evenements"]]
+        self.nb_evenements = etat["nb_evenements"]
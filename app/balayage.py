@@ -0,0 +1,244 @@
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm import tqdm
+
+from simulation import creer_simulation, executer, graines_repliques
+
+# Les paramètres de simuler que l'on peut faire varier
+PARAMETRES_BALAYES = ("taux_incidence", "seuil", "p", "rayon")
+# Les indicateurs calculés pour chaque réplique
+INDICATEURS = ("pic_infectes", "date_pic", "taille_finale", "nb_quarantaines", "duree_quarantaine", "duree_max_quarantaine")
+# La version des graines des répliques, dans l'empreinte : les caches calculés avec d'autres graines ne sont pas relus
+VERSION_GRAINES = 2
+
+
+def points_grille(grille):
+    """ Énumère tous les points d'une grille de paramètres
+    ---
+    paramètre :
+
+        - grille (dict(str: list)) les valeurs à essayer pour chaque paramètre balayé
+
+    résultat :
+
+        - list(dict) un dictionnaire de paramètres par point, dans l'ordre du produit cartésien
+    """
+    for clee in grille:
+        if clee not in PARAMETRES_BALAYES:
+            raise ValueError(f"Le paramètre {clee} ne peut pas être balayé (parmi {', '.join(PARAMETRES_BALAYES)})")
+    return [dict(zip(grille, valeurs)) for valeurs in itertools.product(*grille.values())]
+
+
+def clee_point(parametres, nb_repliques, graine, nb_iterations_max=None):
+    """ Calcule l'empreinte d'un point, qui sert de nom au fichier du cache
+    ---
+    paramètres :
+
+        - parametres (dict) tous les paramètres de creer_simulation pour ce point
+        - nb_repliques (int) le nombre de répliques
+        - graine (int) la graine du balayage
+        - nb_iterations_max (int / None) le nombre maximal d'itérations
+
+    résultat :
+
+        - str
+    """
+    # Tout ce qui change les résultats fait partie de l'empreinte, les clées sont triées pour qu'elle ne dépende pas de l'ordre
+    description = json.dumps({"parametres": parametres, "nb_repliques": nb_repliques, "graine": graine, "nb_iterations_max": nb_iterations_max,
+                              "version_graines": VERSION_GRAINES}, sort_keys=True)
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+
+def _replique(arguments):
+    """ Lance une réplique d'un point dans un processus du pool
+    ---
+    paramètre :
+
+        - arguments (tuple(np.random.SeedSequence, dict, int / None)) la graine de la réplique, les paramètres de creer_simulation et le nombre maximal d'itérations
+
+    résultat :
+
+        - dict les données de la simulation et ses dates de quarantaine
+    """
+    graine, parametres, nb_iterations_max = arguments
+    simulation = creer_simulation(**parametres, graine=graine)
+    donnees = executer(simulation, nb_iterations_max)
+    simulation.fermer()
+    # On convertit en int python pour pouvoir écrire le résultat en json
+    return {"donnees": {clee: [int(v) for v in serie] for clee, serie in donnees.items()},
+            "dates_quarantaine": [int(date) for date in simulation.dates_quarantaine]}
+
+
+def indicateurs(replique, nb_personnes):
+    """ Calcule les indicateurs d'une réplique
+    ---
+    paramètres :
+
+        - replique (dict) le résultat de _replique
+        - nb_personnes (int) le nombre de personnes de la simulation
+
+    résultat :
+
+        - dict(str: float) une valeur par indicateur de INDICATEURS
+    """
+    infectes = replique["donnees"]["Infectés"]
+    dates = list(replique["dates_quarantaine"])
+    # Une quarantaine encore en cours à la fin dure jusqu'à la dernière itération
+    if len(dates) % 2:
+        dates.append(len(infectes) - 1)
+    durees = [fin - debut for debut, fin in zip(dates[::2], dates[1::2])]
+    return {"pic_infectes": max(infectes),
+            "date_pic": int(np.argmax(infectes)),
+            # Toutes les personnes qui ne sont plus saines ont été infectées
+            "taille_finale": nb_personnes - replique["donnees"]["Sains"][-1],
+            "nb_quarantaines": len(durees),
+            "duree_quarantaine": sum(durees),
+            "duree_max_quarantaine": max(durees, default=0)}
+
+
+def _ecrire_cache(nom_fichier, contenu):
+    """ Écrit un fichier du cache, sans laisser de fichier incomplet si le programme est interrompu
+    ---
+    paramètres :
+
+        - nom_fichier (str) le chemin du fichier
+        - contenu (dict) le contenu à écrire en json
+    """
+    with open(nom_fichier + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(contenu, f)
+    os.replace(nom_fichier + ".tmp", nom_fichier)
+
+
+def balayer(grille, parametres, nb_repliques, dossier_cache, graine=0, nb_iterations_max=None, nb_processus=None):
+    """ Lance toutes les répliques de tous les points d'une grille de paramètres, en sautant les points déjà dans le cache
+    ---
+    paramètres :
+
+        - grille (dict(str: list)) les valeurs à essayer pour chaque paramètre balayé
+        - parametres (dict) les autres paramètres de creer_simulation (nb_personnes, largeur_sim, hauteur_sim, ...)
+        - nb_repliques (int) le nombre de répliques par point
+        - dossier_cache (str) le dossier où sont conservés les résultats de chaque point
+        - graine (int) la graine du balayage (les graines d'un point ne dépendent que d'elle et du point)
+        - nb_iterations_max (int / None) le nombre maximal d'itérations
+        - nb_processus (int / None) le nombre de processus (None pour un par cœur)
+
+    résultat :
+
+        - list(tuple(dict, list(dict))) pour chaque point, ses paramètres et le résultat de chaque réplique
+    """
+    if not os.path.exists(dossier_cache):
+        os.makedirs(dossier_cache)
+    points = points_grille(grille)
+    resultats = [None] * len(points)
+    # Le nombre de répliques à attendre avant de mettre chaque point en cache
+    restantes = [0] * len(points)
+    taches = []
+    fichiers = []
+    for n, point in enumerate(points):
+        complets = {**parametres, **point}
+        clee = clee_point(complets, nb_repliques, graine, nb_iterations_max)
+        fichiers.append(os.path.join(dossier_cache, f"{clee}.json"))
+        if os.path.exists(fichiers[n]):
+            with open(fichiers[n], encoding="utf-8") as f:
+                resultats[n] = json.load(f)["repliques"]
+        else:
+            # Les graines dépendent du point, pas de sa place dans la grille : le cache reste valable si la grille change
+            _, graines = graines_repliques(nb_repliques, [graine, int(clee, 16)])
+            taches += [(n, r, (g, complets, nb_iterations_max)) for r, g in enumerate(graines)]
+            resultats[n] = [None] * nb_repliques
+            restantes[n] = nb_repliques
+
+    # Les tâches sont soumises point par point : les premiers points sont mis en cache tôt si le balayage est interrompu
+    if taches:
+        with ProcessPoolExecutor(nb_processus) as executeur:
+            futurs = {executeur.submit(_replique, arguments): (n, r) for n, r, arguments in taches}
+            for futur in tqdm(as_completed(futurs), total=len(futurs)):
+                n, r = futurs[futur]
+                resultats[n][r] = futur.result()
+                restantes[n] -= 1
+                # On met le point en cache dès que toutes ses répliques sont finies
+                if not restantes[n]:
+                    _ecrire_cache(fichiers[n], {"parametres": {**parametres, **points[n]}, "graine": graine,
+                                                "nb_iterations_max": nb_iterations_max, "repliques": resultats[n]})
+    return list(zip(points, resultats))
+
+
+def resumer(balayage, nb_personnes):
+    """ Calcule la moyenne et l'écart type de chaque indicateur, pour chaque point
+    ---
+    paramètres :
+
+        - balayage (list(tuple(dict, list(dict)))) le résultat de balayer
+        - nb_personnes (int) le nombre de personnes des simulations
+
+    résultat :
+
+        - list(dict) une ligne par point : ses paramètres, puis {indicateur}_moyenne et {indicateur}_ecart_type
+    """
+    lignes = []
+    for point, repliques in balayage:
+        valeurs = np.array([[mesures[clee] for clee in INDICATEURS] for mesures in (indicateurs(r, nb_personnes) for r in repliques)], dtype=np.float64)
+        ligne = dict(point)
+        ligne["nb_repliques"] = len(repliques)
+        for clee, moyenne, ecart_type in zip(INDICATEURS, valeurs.mean(axis=0), valeurs.std(axis=0)):
+            ligne[f"{clee}_moyenne"] = float(moyenne)
+            ligne[f"{clee}_ecart_type"] = float(ecart_type)
+        lignes.append(ligne)
+    return lignes
+
+
+def sauvegarder_resume(nom_fichier, parametres, graine, lignes):
+    """ Enregistre le résumé d'un balayage dans une base de donnée
+    ---
+    paramètres :
+
+        - nom_fichier (str) le nom de la base de donnée
+        - parametres (dict) les paramètres fixes du balayage
+        - graine (int) la graine du balayage
+        - lignes (list(dict)) le résultat de resumer
+    """
+    colonnes = list(lignes[0])
+    bdd = sqlite3.connect(nom_fichier)
+    # Tout est écrit en une seule transaction
+    with bdd:
+        bdd.execute("DROP TABLE IF EXISTS Parametres")
+        bdd.execute("DROP TABLE IF EXISTS Resume")
+        bdd.execute("CREATE TABLE Parametres (clee text PRIMARY KEY, valeur text)")
+        bdd.executemany("INSERT INTO Parametres VALUES (?, ?)",
+                        [(clee, str(valeur)) for clee, valeur in parametres.items()] + [("graine", str(graine))])
+        bdd.execute(f"""CREATE TABLE Resume (id integer PRIMARY KEY, {",".join([f'{clee} real' for clee in colonnes])})""")
+        bdd.executemany(f"INSERT INTO Resume VALUES (NULL, {','.join('?' * len(colonnes))})",
+                        ([ligne[clee] for clee in colonnes] for ligne in lignes))
+    bdd.close()
+
+
+if __name__ == "__main__":
+    # Les valeurs à essayer pour chaque paramètre
+    GRILLE = {"taux_incidence": [0, 50, 100, 200],
+              "seuil": [0.1, 0.3, 0.5],
+              "p": [0.3, 0.5],
+              "rayon": [6]}
+    # Le nombre de répliques par point
+    NB_REPLIQUES = 8
+    # Le nombre de personnes de la simulation
+    NB_PERSONNES = 1200
+    # La graine du balayage
+    GRAINE = 0
+    # Le dossier de sauvegarde
+    NOM_DOSSIER = os.path.join("Simulation", "Balayage")
+
+    parametres = {"nb_personnes": NB_PERSONNES, "largeur_sim": 950, "hauteur_sim": 1070, "vectorise": False}
+
+    t = time.perf_counter()
+    resultats = balayer(GRILLE, parametres, NB_REPLIQUES, os.path.join(NOM_DOSSIER, "cache"), GRAINE)
+    print(f"{len(resultats)} points en {time.perf_counter() - t:.1f} s")
+
+    sauvegarder_resume(os.path.join(NOM_DOSSIER, f"Résumé - Personnes {NB_PERSONNES}, graine {GRAINE}.db"),
+                       parametres, GRAINE, resumer(resultats, NB_PERSONNES))
@@ -0,0 +1,272 @@
+import argparse
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+from simulation import Comportement, creer_simulation
+
+# Les tailles de population mesurées
+TAILLES = (1000, 10000, 100000)
+# Les moteurs de simulation mesurés et les paramètres de creer_simulation correspondants
+MOTEURS = {"personnes": {"vectorise": False},
+           "vectorise": {"vectorise": True},
+           "compile": {"vectorise": True, "compile": True},
+           "evenements": {"evenements": True, "compile": True}}
+# Les régimes de quarantaine : la proportion de la population infectée qui déclenche la quarantaine (0 pour aucune mesure), le seuil de fin, et si la quarantaine est imposée dès le début
+REGIMES = {"sans_quarantaine": (0, 0, False),
+           "quarantaine": (0, 0, True),
+           "alternance": (.02, .5, False)}
+# Les densités de population, en personnes par million de pixels (la simulation affichée en a environ 1200)
+DENSITES = {"faible": 300, "moyenne": 1200, "forte": 5000}
+# La graine des simulations mesurées, fixe pour que toutes les mesures portent sur le même travail
+GRAINE = 0
+# Le nombre de mises à jour de personnes visé par cas : les petites populations font plus d'itérations pour que la mesure ne soit pas trop courte
+MISES_A_JOUR_PAR_CAS = 200000
+# La taille de la simulation de préchauffage, et son nombre maximal d'itérations (elle s'arrête plus tôt à sa première guérison)
+NB_PERSONNES_PRECHAUFFAGE = 200
+NB_ITERATIONS_PRECHAUFFAGE_MAX = 200
+# La baisse relative du nombre d'itérations par seconde au-delà de laquelle comparer signale un ralentissement
+SEUIL_RALENTISSEMENT = .1
+
+
+def clee_cas(moteur, nb_personnes, regime, densite):
+    """ Donne le nom d'un cas du banc d'essai, qui sert de clée dans les fichiers de référence
+    ---
+    paramètres :
+
+        - moteur (str) le moteur, parmi MOTEURS
+        - nb_personnes (int) le nombre de personnes
+        - regime (str) le régime de quarantaine, parmi REGIMES
+        - densite (str) la densité, parmi DENSITES
+
+    résultat :
+
+        - str
+    """
+    return f"{moteur}/{nb_personnes}/{regime}/{densite}"
+
+
+def creer_cas(moteur, nb_personnes, regime, densite):
+    """ Crée la simulation sans affichage d'un cas du banc d'essai
+    ---
+    paramètres :
+
+        - moteur (str) le moteur, parmi MOTEURS
+        - nb_personnes (int) le nombre de personnes
+        - regime (str) le régime de quarantaine, parmi REGIMES
+        - densite (str) la densité, parmi DENSITES
+
+    résultat :
+
+        - Simulation
+    """
+    proportion, seuil, imposee = REGIMES[regime]
+    # L'espace est carré, de côté choisi pour avoir la densité demandée
+    cote = round(math.sqrt(nb_personnes / DENSITES[densite]) * 1000)
+    simulation = creer_simulation(nb_personnes, cote, cote, round(proportion * nb_personnes), seuil, graine=GRAINE, **MOTEURS[moteur])
+    if imposee:
+        simulation.politique.changer(Comportement.QUARANTAINE)
+    return simulation
+
+
+def mesurer_cas(moteur, nb_personnes, regime, densite, nb_iterations=None, nb_prechauffage=3):
+    """ Mesure la vitesse et la mémoire d'un cas du banc d'essai
+    ---
+    paramètres :
+
+        - moteur (str) le moteur, parmi MOTEURS
+        - nb_personnes (int) le nombre de personnes
+        - regime (str) le régime de quarantaine, parmi REGIMES
+        - densite (str) la densité, parmi DENSITES
+        - nb_iterations (int / None) le nombre d'itérations mesurées (None pour viser MISES_A_JOUR_PAR_CAS, avec au moins 5 itérations)
+        - nb_prechauffage (int) le nombre d'itérations lancées avant la mesure du temps
+
+    résultat :
+
+        - dict(str: float) les itérations par seconde et les mises à jour de personnes par seconde (tirées du temps médian d'une itération),
+          le temps médian d'une itération, les itérations par seconde tirées du temps moyen et la mémoire maximale
+    """
+    # Une petite simulation compile les noyaux numba (ou les charge du cache) avant les mesures : certains ne servent qu'une fois une
+    # personne contagieuse ou guérie, on la fait donc avancer jusqu'à sa première guérison
+    prechauffage = creer_cas(moteur, NB_PERSONNES_PRECHAUFFAGE, regime, densite)
+    while not prechauffage.terminee and prechauffage.iteration < NB_ITERATIONS_PRECHAUFFAGE_MAX and not any(prechauffage.donnees["Rétablis"]):
+        prechauffage.mise_a_jour()
+    prechauffage.fermer()
+    # La mémoire est suivie pendant la création et le préchauffage, pas pendant la mesure du temps que tracemalloc ralentirait
+    tracemalloc.start()
+    simulation = creer_cas(moteur, nb_personnes, regime, densite)
+    for _ in range(nb_prechauffage):
+        simulation.mise_a_jour()
+    memoire = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Le nombre d'itérations est fixe : deux mesures d'un même cas portent sur exactement le même travail
+    if nb_iterations is None:
+        nb_iterations = max(5, MISES_A_JOUR_PAR_CAS // nb_personnes)
+    durees = []
+    for _ in range(nb_iterations):
+        t = time.perf_counter()
+        simulation.mise_a_jour()
+        durees.append(time.perf_counter() - t)
+    simulation.fermer()
+    # La vitesse comparée vient du temps médian, qu'une itération isolée beaucoup plus lente (une compilation tardive) ne fausse pas
+    duree_mediane = float(np.median(durees))
+    return {"nb_iterations": len(durees),
+            "iterations_par_seconde": 1 / duree_mediane,
+            "mises_a_jour_par_seconde": nb_personnes / duree_mediane,
+            "duree_mediane": duree_mediane,
+            "iterations_par_seconde_moyenne": len(durees) / sum(durees),
+            "memoire_max": memoire}
+
+
+def machine():
+    """ Décrit la machine des mesures, pour ne comparer que des références comparables
+    ---
+    résultat :
+
+        - dict(str: str / int)
+    """
+    return {"plateforme": platform.platform(),
+            "processeur": platform.processor(),
+            "nb_coeurs": os.cpu_count(),
+            "python": platform.python_version(),
+            "numpy": np.__version__}
+
+
+def lancer(tailles=TAILLES, moteurs=tuple(MOTEURS), regimes=tuple(REGIMES), densites=tuple(DENSITES), **options):
+    """ Mesure tous les cas du banc d'essai
+    ---
+    paramètres :
+
+        - tailles (tuple(int)) les nombres de personnes
+        - moteurs (tuple(str)) les moteurs, parmi MOTEURS
+        - regimes (tuple(str)) les régimes de quarantaine, parmi REGIMES
+        - densites (tuple(str)) les densités, parmi DENSITES
+        - options les paramètres de mesurer_cas (nb_iterations, nb_prechauffage)
+
+    résultat :
+
+        - dict la description de la machine, la date et les mesures de chaque cas
+    """
+    cas = {}
+    for moteur in moteurs:
+        for nb_personnes in tailles:
+            for regime in regimes:
+                for densite in densites:
+                    clee = clee_cas(moteur, nb_personnes, regime, densite)
+                    cas[clee] = mesurer_cas(moteur, nb_personnes, regime, densite, **options)
+                    print(f"{clee:40} {cas[clee]['iterations_par_seconde']:10.2f} it/s {cas[clee]['mises_a_jour_par_seconde']:14.0f} maj/s "
+                          f"{cas[clee]['memoire_max'] / 2 ** 20:9.1f} Mio (moyenne {cas[clee]['iterations_par_seconde_moyenne']:.2f} it/s)")
+    return {"machine": machine(), "date": time.strftime("%Y-%m-%d %H:%M:%S"), "cas": cas}
+
+
+def comparer(reference, mesures, seuil=SEUIL_RALENTISSEMENT):
+    """ Compare des mesures à une référence, cas par cas
+    ---
+    paramètres :
+
+        - reference (dict) le résultat de lancer pris comme référence
+        - mesures (dict) le résultat de lancer à comparer
+        - seuil (float) la baisse relative d'itérations par seconde au-delà de laquelle un cas est ralenti
+
+    résultat :
+
+        - list(dict) pour chaque cas présent dans les deux, les deux vitesses, leur rapport, le rapport des mémoires et si le cas est ralenti
+    """
+    lignes = []
+    for clee, mesure in mesures["cas"].items():
+        if clee not in reference["cas"]:
+            continue
+        ancienne = reference["cas"][clee]
+        rapport = mesure["iterations_par_seconde"] / ancienne["iterations_par_seconde"]
+        lignes.append({"cas": clee,
+                       "reference": ancienne["iterations_par_seconde"],
+                       "mesure": mesure["iterations_par_seconde"],
+                       "rapport": rapport,
+                       "rapport_memoire": mesure["memoire_max"] / ancienne["memoire_max"],
+                       "ralenti": rapport < 1 - seuil})
+    return lignes
+
+
+def afficher_comparaison(lignes):
+    """ Affiche le résultat de comparer sous forme de tableau
+    ---
+    paramètre :
+
+        - lignes (list(dict)) le résultat de comparer
+    """
+    print(f"{'cas':40} {'référence':>12} {'mesure':>12} {'vitesse':>8} {'mémoire':>8}")
+    for ligne in lignes:
+        print(f"{ligne['cas']:40} {ligne['reference']:10.2f}/s {ligne['mesure']:10.2f}/s {ligne['rapport']:7.2f}x {ligne['rapport_memoire']:7.2f}x"
+              + ("  RALENTI" if ligne["ralenti"] else ""))
+
+
+def charger(nom_fichier):
+    """ Lit un fichier de mesures écrit par enregistrer
+    ---
+    paramètre :
+
+        - nom_fichier (str) le chemin du fichier
+
+    résultat :
+
+        - dict
+    """
+    with open(nom_fichier, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def enregistrer(nom_fichier, mesures):
+    """ Écrit des mesures dans un fichier json
+    ---
+    paramètres :
+
+        - nom_fichier (str) le chemin du fichier
+        - mesures (dict) le résultat de lancer
+    """
+    dossier = os.path.dirname(nom_fichier)
+    if dossier and not os.path.exists(dossier):
+        os.makedirs(dossier)
+    with open(nom_fichier, "w", encoding="utf-8") as f:
+        json.dump(mesures, f, indent=2)
+
+
+if __name__ == "__main__":
+    analyseur = argparse.ArgumentParser(description="Banc d'essai de la vitesse de la simulation")
+    commandes = analyseur.add_subparsers(dest="commande", required=True)
+    mesurer = commandes.add_parser("mesurer", help="mesure les cas choisis et les enregistre")
+    mesurer.add_argument("fichier", help="le fichier json des mesures")
+    mesurer.add_argument("--tailles", type=int, nargs="+", default=TAILLES)
+    mesurer.add_argument("--moteurs", nargs="+", choices=MOTEURS, default=tuple(MOTEURS))
+    mesurer.add_argument("--regimes", nargs="+", choices=REGIMES, default=tuple(REGIMES))
+    mesurer.add_argument("--densites", nargs="+", choices=DENSITES, default=tuple(DENSITES))
+    mesurer.add_argument("--iterations", type=int, help="le nombre d'itérations mesurées par cas")
+    mesurer.add_argument("--reference", help="un fichier de mesures auquel comparer les nouvelles")
+    mesurer.add_argument("--seuil", type=float, default=SEUIL_RALENTISSEMENT)
+    comparaison = commandes.add_parser("comparer", help="compare deux fichiers de mesures")
+    comparaison.add_argument("reference", help="le fichier des mesures de référence")
+    comparaison.add_argument("fichier", help="le fichier des mesures à comparer")
+    comparaison.add_argument("--seuil", type=float, default=SEUIL_RALENTISSEMENT)
+    arguments = analyseur.parse_args()
+
+    if arguments.commande == "mesurer":
+        mesures = lancer(arguments.tailles, arguments.moteurs, arguments.regimes, arguments.densites, nb_iterations=arguments.iterations)
+        enregistrer(arguments.fichier, mesures)
+        reference = charger(arguments.reference) if arguments.reference else None
+    else:
+        mesures = charger(arguments.fichier)
+        reference = charger(arguments.reference)
+
+    if reference is not None:
+        lignes = comparer(reference, mesures, arguments.seuil)
+        afficher_comparaison(lignes)
+        if reference["machine"] != mesures["machine"]:
+            print("Attention : les mesures n'ont pas été faites sur la même machine")
+        # Un code de retour non nul permet d'arrêter une intégration continue en cas de ralentissement
+        if any(ligne["ralenti"] for ligne in lignes):
+            raise SystemExit(1)
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+from simulation import graines_repliques, simuler
+
+# Les quantiles des bandes de l'ensemble
+QUANTILES = (.05, .25, .5, .75, .95)
+
+
+def _replique(arguments):
+    """ Lance une réplique dans un processus du pool
+    ---
+    paramètre :
+
+        - arguments (tuple(np.random.SeedSequence, dict)) la graine de la réplique et les paramètres de simuler
+
+    résultat :
+
+        - dict(str: list(int)) les données de la simulation
+    """
+    graine, parametres = arguments
+    return simuler(**parametres, graine=graine)
+
+
+def lancer_ensemble(nb_sim, parametres, graine=None, nb_processus=None):
+    """ Lance les répliques d'une même simulation en parallèle, sans affichage
+    ---
+    paramètres :
+
+        - nb_sim (int) le nombre de répliques
+        - parametres (dict) les paramètres de simuler (nb_personnes, largeur_sim, hauteur_sim, taux_incidence, seuil, ...)
+        - graine (int / None) la graine de l'ensemble
+        - nb_processus (int / None) le nombre de processus (None pour un par cœur)
+
+    résultats :
+
+        - int (la graine de l'ensemble)
+        - list(dict(str: list(int))) les données de chaque réplique, dans l'ordre des graines
+    """
+    entropie, graines = graines_repliques(nb_sim, graine)
+    with ProcessPoolExecutor(nb_processus) as executeur:
+        resultats = list(tqdm(executeur.map(_replique, [(g, parametres) for g in graines]), total=nb_sim))
+    return entropie, resultats
+
+
+def aligner(resultats, clee):
+    """ Met les séries d'une catégorie à la même longueur, en prolongeant chacune par sa dernière valeur
+    ---
+    paramètres :
+
+        - resultats (list(dict(str: list(int)))) les données de chaque réplique
+        - clee (str) la catégorie
+
+    résultat :
+
+        - np.array(float) de dimension (nombre de répliques, longueur maximale)
+    """
+    # Une simulation terminée n'a plus d'infectés, les effectifs ne changent donc plus
+    longueur = max(len(donnees[clee]) for donnees in resultats)
+    tableau = np.empty((len(resultats), longueur))
+    for n, donnees in enumerate(resultats):
+        serie = donnees[clee]
+        tableau[n, :len(serie)] = serie
+        tableau[n, len(serie):] = serie[-1]
+    return tableau
+
+
+def agreger(resultats, quantiles=QUANTILES):
+    """ Calcule la moyenne et les quantiles de chaque catégorie, à chaque itération
+    ---
+    paramètres :
+
+        - resultats (list(dict(str: list(int)))) les données de chaque réplique
+        - quantiles (tuple(float)) les quantiles à calculer
+
+    résultat :
+
+        - dict(catégorie (str): dict(statistique (str): np.array(float)))
+    """
+    agregat = {}
+    for clee in resultats[0]:
+        tableau = aligner(resultats, clee)
+        agregat[clee] = {"Moyenne": tableau.mean(axis=0)}
+        for q, valeurs in zip(quantiles, np.quantile(tableau, quantiles, axis=0)):
+            agregat[clee][f"Q{round(q * 100)}"] = valeurs
+    return agregat
+
+
+def sauvegarder_ensemble(nom_fichier, parametres, entropie, resultats, agregat):
+    """ Enregistre les répliques et leur agrégat dans une seule base de donnée
+    ---
+    paramètres :
+
+        - nom_fichier (str) le nom de la base de donnée
+        - parametres (dict) les paramètres de simuler
+        - entropie (int) la graine de l'ensemble
+        - resultats (list(dict(str: list(int)))) les données de chaque réplique
+        - agregat (dict) le résultat de agreger
+    """
+    N = parametres["nb_personnes"]
+    categories = list(resultats[0])
+    statistiques = [f"{clee}_{stat}" for clee in agregat for stat in agregat[clee]]
+    bdd = sqlite3.connect(nom_fichier)
+    # Tout est écrit en une seule transaction
+    with bdd:
+        bdd.execute("DROP TABLE IF EXISTS Parametres")
+        bdd.execute("DROP TABLE IF EXISTS Repliques")
+        bdd.execute("DROP TABLE IF EXISTS Ensemble")
+        bdd.execute("CREATE TABLE Parametres (clee text PRIMARY KEY, valeur text)")
+        bdd.executemany("INSERT INTO Parametres VALUES (?, ?)",
+                        [(clee, str(valeur)) for clee, valeur in parametres.items()] + [("graine", str(entropie)), ("nb_sim", str(len(resultats)))])
+        # Comme pour les tables Sim de simulation.py, les effectifs sont en proportion de la population
+        bdd.execute(f"""CREATE TABLE Repliques (id integer PRIMARY KEY, replique int, iteration int, {",".join([f'{clee} real' for clee in categories])})""")
+        bdd.executemany(f"INSERT INTO Repliques VALUES (NULL, ?, ?, {','.join('?' * len(categories))})",
+                        ((n, k, *[donnees[clee][k] / N for clee in categories])
+                         for n, donnees in enumerate(resultats) for k in range(len(donnees[categories[0]]))))
+        bdd.execute(f"""CREATE TABLE Ensemble (iteration integer PRIMARY KEY, {",".join([f'{stat} real' for stat in statistiques])})""")
+        colonnes = [agregat[clee][stat] / N for clee in agregat for stat in agregat[clee]]
+        bdd.executemany(f"INSERT INTO Ensemble VALUES (?, {','.join('?' * len(colonnes))})",
+                        ((k, *[float(colonne[k]) for colonne in colonnes]) for k in range(len(colonnes[0]))))
+    bdd.close()
+
+
+if __name__ == "__main__":
+    # Le nombre de simulation à faire
+    NB_SIM = 32
+    # Le fraction du seuil critique pour arrêter la quarantaine
+    SEUIL = 0.3
+    # Le nombre de personnes de la simulation
+    NB_PERSONNES = 1200
+    # Le nombre de personnes infectés critique
+    TAUX_INCIDENCE = 100
+    # La graine de l'ensemble (None pour en tirer une au hasard)
+    GRAINE = None
+    # Le dossier de sauvegarde
+    NOM_DOSSIER = os.path.join("Simulation", f"Taux incidence {TAUX_INCIDENCE}")
+
+    parametres = {"nb_personnes": NB_PERSONNES, "largeur_sim": 950, "hauteur_sim": 1070,
+                  "taux_incidence": TAUX_INCIDENCE, "seuil": SEUIL, "vectorise": False}
+
+    t = time.perf_counter()
+    entropie, resultats = lancer_ensemble(NB_SIM, parametres, GRAINE)
+    print(f"{NB_SIM} simulations en {time.perf_counter() - t:.1f} s (graine {entropie})")
+
+    # On crée le dossier s'il n'existe pas
+    if not os.path.exists(NOM_DOSSIER):
+        os.makedirs(NOM_DOSSIER)
+    sauvegarder_ensemble(os.path.join(NOM_DOSSIER, f"Ensemble - Personnes {NB_PERSONNES}, SEUIL {SEUIL}, graine {entropie}.db"),
+                         parametres, entropie, resultats, agreger(resultats))
@@ -0,0 +1,339 @@
+import sqlite3
+
+import numpy as np
+from numba import njit, prange
+
+# Les compartiments du modèle SIRD, dans l'ordre des colonnes des solutions (le modèle SIR est le cas sans mortalité)
+COMPARTIMENTS = ("Sains", "Infectés", "Rétablis", "Morts")
+# Le pas de temps de la méthode de Runge-Kutta d'ordre 4, en jours (arrondi pour qu'un jour compte un nombre entier de pas)
+PAS = .5
+# La tolérance relative de la méthode adaptative (la tolérance absolue est 1000 fois plus petite, les états étant des proportions)
+TOLERANCE = 1e-6
+# Le premier pas de la méthode adaptative, en jours
+PAS_INITIAL = .1
+# Le nombre de jeux de paramètres avancés ensemble par Runge-Kutta d'ordre 4
+TAILLE_BLOC = 64
+
+# Les coefficients de la méthode de Dormand-Prince : les étapes, la solution d'ordre 5 et l'écart avec celle d'ordre 4
+A21 = 1 / 5
+A31, A32 = 3 / 40, 9 / 40
+A41, A42, A43 = 44 / 45, -56 / 15, 32 / 9
+A51, A52, A53, A54 = 19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729
+A61, A62, A63, A64, A65 = 9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656
+B1, B3, B4, B5, B6 = 35 / 384, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84
+E1, E3, E4, E5, E6, E7 = 71 / 57600, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40
+# Les coefficients de l'interpolation d'ordre 4 à l'intérieur d'un pas (Shampine) : pour chaque étape, les coefficients de theta, theta², theta³ et theta⁴
+P1 = (1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432)
+P3 = (0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799)
+P4 = (0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072)
+P5 = (0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632)
+P6 = (0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844)
+P7 = (0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423)
+
+
+@njit(cache=True)
+def _derivees(s, i, beta, gamma, mu):
+    """ Calcule les dérivées des sains et des infectés du modèle SIRD
+    ---
+    paramètres :
+
+        - s, i (float) les proportions de sains et d'infectés
+        - beta (float) le taux de contamination
+        - gamma (float) le taux de guérison
+        - mu (float) le taux de mortalité
+
+    résultat :
+
+        - float, float
+    """
+    contaminations = beta * s * i
+    return - contaminations, contaminations - (gamma + mu) * i
+
+
+@njit(cache=True)
+def _ecrire(solutions, n, jour, s, i, etats, gamma, mu):
+    """ Écrit l'état d'un jeu de paramètres un jour donné, les rétablis et les morts étant déduits des sains et des infectés
+    ---
+    paramètres :
+
+        - solutions (np.array(float)) les solutions, remplies sur place
+        - n, jour (int) le jeu de paramètres et le jour
+        - s, i (float) les proportions de sains et d'infectés
+        - etats (np.array(float)) l'état initial de chaque jeu
+        - gamma, mu (float) les taux de guérison et de mortalité
+    """
+    # Les personnes qui ne sont plus ni saines ni infectées se répartissent entre rétablis et morts selon les taux (la somme reste exactement 1)
+    sortis = etats[n, 0] + etats[n, 1] - s - i
+    part = gamma / (gamma + mu) if gamma + mu > 0 else 1.
+    solutions[n, jour, 0] = s
+    solutions[n, jour, 1] = i
+    solutions[n, jour, 2] = etats[n, 2] + part * sortis
+    solutions[n, jour, 3] = etats[n, 3] + (1 - part) * sortis
+
+
+@njit(cache=True, parallel=True)
+def _rk4(etats, beta, gamma, mu, nb_jours, nb_sous_pas, solutions):
+    """ Intègre le modèle SIRD par la méthode de Runge-Kutta d'ordre 4 à pas fixe, en parallèle sur des blocs de jeux de paramètres
+    ---
+    paramètres :
+
+        - etats (np.array(float)) l'état initial de chaque jeu, de forme (nb_jeux, 4)
+        - beta, gamma, mu (np.array(float)) les paramètres de chaque jeu
+        - nb_jours (int) le nombre de jours à calculer
+        - nb_sous_pas (int) le nombre de pas par jour
+        - solutions (np.array(float)) l'état de chaque jeu chaque jour, de forme (nb_jeux, nb_jours + 1, 4), rempli sur place
+    """
+    h = 1 / nb_sous_pas
+    nb_jeux = len(beta)
+    for bloc in prange((nb_jeux + TAILLE_BLOC - 1) // TAILLE_BLOC):
+        debut = bloc * TAILLE_BLOC
+        fin = min(nb_jeux, debut + TAILLE_BLOC)
+        s = etats[debut:fin, 0].copy()
+        i = etats[debut:fin, 1].copy()
+        solutions[debut:fin, 0] = etats[debut:fin]
+        for jour in range(1, nb_jours + 1):
+            for _ in range(nb_sous_pas):
+                # Les jeux du bloc sont indépendants : la boucle la plus interne est sur les jeux, pour que le compilateur la vectorise
+                for k in range(fin - debut):
+                    b, g, m = beta[debut + k], gamma[debut + k], mu[debut + k]
+                    sk, ik = s[k], i[k]
+                    ks1, ki1 = _derivees(sk, ik, b, g, m)
+                    ks2, ki2 = _derivees(sk + h / 2 * ks1, ik + h / 2 * ki1, b, g, m)
+                    ks3, ki3 = _derivees(sk + h / 2 * ks2, ik + h / 2 * ki2, b, g, m)
+                    ks4, ki4 = _derivees(sk + h * ks3, ik + h * ki3, b, g, m)
+                    s[k] = sk + h / 6 * (ks1 + 2 * ks2 + 2 * ks3 + ks4)
+                    i[k] = ik + h / 6 * (ki1 + 2 * ki2 + 2 * ki3 + ki4)
+            for k in range(fin - debut):
+                _ecrire(solutions, debut + k, jour, s[k], i[k], etats, gamma[debut + k], mu[debut + k])
+
+
+@njit(cache=True)
+def _polynome(p, theta):
+    """ Évalue un coefficient de l'interpolation de Dormand-Prince
+    ---
+    paramètres :
+
+        - p (tuple(float)) les coefficients de theta, theta², theta³ et theta⁴
+        - theta (float, 0 <= theta <= 1) la position dans le pas
+
+    résultat :
+
+        - float
+    """
+    return theta * (p[0] + theta * (p[1] + theta * (p[2] + theta * p[3])))
+
+
+@njit(cache=True, parallel=True)
+def _dormand_prince(etats, beta, gamma, mu, nb_jours, tolerance, pas_initial, solutions, nb_pas):
+    """ Intègre le modèle SIRD par la méthode adaptative de Dormand-Prince 5(4), chaque jeu de paramètres avec ses propres pas
+    ---
+    paramètres :
+
+        - etats (np.array(float)) l'état initial de chaque jeu, de forme (nb_jeux, 4)
+        - beta, gamma, mu (np.array(float)) les paramètres de chaque jeu
+        - nb_jours (int) le nombre de jours à calculer
+        - tolerance (float) la tolérance relative sur chaque pas
+        - pas_initial (float) le premier pas essayé
+        - solutions (np.array(float)) l'état de chaque jeu chaque jour, de forme (nb_jeux, nb_jours + 1, 4), rempli sur place
+        - nb_pas (np.array(int)) le nombre de pas acceptés de chaque jeu, rempli sur place
+    """
+    atol = tolerance / 1000
+    for n in prange(len(beta)):
+        b, g, m = beta[n], gamma[n], mu[n]
+        s, i = etats[n, 0], etats[n, 1]
+        solutions[n, 0] = etats[n]
+        # La dérivée à la fin d'un pas est la première étape du suivant (FSAL)
+        ks1, ki1 = _derivees(s, i, b, g, m)
+        t, h, jour, acceptes = 0., pas_initial, 1, 0
+        while jour <= nb_jours:
+            ks2, ki2 = _derivees(s + h * A21 * ks1, i + h * A21 * ki1, b, g, m)
+            ks3, ki3 = _derivees(s + h * (A31 * ks1 + A32 * ks2), i + h * (A31 * ki1 + A32 * ki2), b, g, m)
+            ks4, ki4 = _derivees(s + h * (A41 * ks1 + A42 * ks2 + A43 * ks3), i + h * (A41 * ki1 + A42 * ki2 + A43 * ki3), b, g, m)
+            ks5, ki5 = _derivees(s + h * (A51 * ks1 + A52 * ks2 + A53 * ks3 + A54 * ks4),
+                                 i + h * (A51 * ki1 + A52 * ki2 + A53 * ki3 + A54 * ki4), b, g, m)
+            ks6, ki6 = _derivees(s + h * (A61 * ks1 + A62 * ks2 + A63 * ks3 + A64 * ks4 + A65 * ks5),
+                                 i + h * (A61 * ki1 + A62 * ki2 + A63 * ki3 + A64 * ki4 + A65 * ki5), b, g, m)
+            s5 = s + h * (B1 * ks1 + B3 * ks3 + B4 * ks4 + B5 * ks5 + B6 * ks6)
+            i5 = i + h * (B1 * ki1 + B3 * ki3 + B4 * ki4 + B5 * ki5 + B6 * ki6)
+            ks7, ki7 = _derivees(s5, i5, b, g, m)
+            # L'écart entre les solutions d'ordre 5 et 4, rapporté à la tolérance
+            es = h * (E1 * ks1 + E3 * ks3 + E4 * ks4 + E5 * ks5 + E6 * ks6 + E7 * ks7)
+            ei = h * (E1 * ki1 + E3 * ki3 + E4 * ki4 + E5 * ki5 + E6 * ki6 + E7 * ki7)
+            erreur = max(abs(es) / (atol + tolerance * max(abs(s), abs(s5))), abs(ei) / (atol + tolerance * max(abs(i), abs(i5))))
+            if erreur <= 1:
+                # On interpole les jours compris dans le pas, avec la même précision que le pas lui-même
+                while jour <= nb_jours and jour <= t + h:
+                    theta = (jour - t) / h
+                    c1, c3, c4, c5 = _polynome(P1, theta), _polynome(P3, theta), _polynome(P4, theta), _polynome(P5, theta)
+                    c6, c7 = _polynome(P6, theta), _polynome(P7, theta)
+                    _ecrire(solutions, n, jour, s + h * (c1 * ks1 + c3 * ks3 + c4 * ks4 + c5 * ks5 + c6 * ks6 + c7 * ks7),
+                            i + h * (c1 * ki1 + c3 * ki3 + c4 * ki4 + c5 * ki5 + c6 * ki6 + c7 * ki7), etats, g, m)
+                    jour += 1
+                t += h
+                s, i = s5, i5
+                ks1, ki1 = ks7, ki7
+                acceptes += 1
+            # Le pas suivant est choisi pour que l'erreur soit juste sous la tolérance
+            h *= min(5., max(.2, .9 * (erreur + 1e-16) ** -.2))
+        nb_pas[n] = acceptes
+
+
+def lot_parametres(beta, gamma, mu=0.):
+    """ Met les paramètres sous forme de tableaux de même longueur, un élément par jeu de paramètres
+    ---
+    paramètres :
+
+        - beta (float / np.array(float)) le taux de contamination
+        - gamma (float / np.array(float)) le taux de guérison
+        - mu (float / np.array(float)) le taux de mortalité (0 pour le modèle SIR)
+
+    résultat :
+
+        - np.array(float), np.array(float), np.array(float)
+    """
+    beta, gamma, mu = np.broadcast_arrays(*(np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in (beta, gamma, mu)))
+    return np.ascontiguousarray(beta.ravel()), np.ascontiguousarray(gamma.ravel()), np.ascontiguousarray(mu.ravel())
+
+
+def grille_parametres(betas, gammas, mus=(0.,)):
+    """ Crée tous les jeux de paramètres d'une grille
+    ---
+    paramètres :
+
+        - betas, gammas, mus (list(float)) les valeurs de chaque paramètre
+
+    résultat :
+
+        - np.array(float), np.array(float), np.array(float) (les paramètres de chaque jeu, beta variant le plus lentement)
+    """
+    return lot_parametres(*np.meshgrid(betas, gammas, mus, indexing="ij"))
+
+
+def etat_initial(nb_personnes, infectes, retablis=0, morts=0):
+    """ Donne l'état initial en proportions de la population
+    ---
+    paramètres :
+
+        - nb_personnes (int) la population
+        - infectes, retablis, morts (int) le nombre de personnes de chaque compartiment au départ, les autres sont saines
+
+    résultat :
+
+        - np.array(float) les proportions de sains, infectés, rétablis et morts
+    """
+    return np.array([nb_personnes - infectes - retablis - morts, infectes, retablis, morts], dtype=np.float64) / nb_personnes
+
+
+def resoudre(etat, beta, gamma, mu=0., nb_jours=200, adaptatif=False, pas=PAS, tolerance=TOLERANCE):
+    """ Résout le modèle SIRD pour un lot de jeux de paramètres
+    ---
+    paramètres :
+
+        - etat (np.array(float)) l'état initial en proportions (voir etat_initial), commun à tous les jeux ou de forme (nb_jeux, 4)
+        - beta, gamma, mu (float / np.array(float)) les paramètres de chaque jeu (voir lot_parametres)
+        - nb_jours (int) le nombre de jours à calculer (l'unité de temps des taux : une itération pour comparer à une simulation)
+        - adaptatif (bool) si on utilise la méthode adaptative de Dormand-Prince plutôt que Runge-Kutta d'ordre 4 à pas fixe
+        - pas (float) le pas de Runge-Kutta d'ordre 4, en jours
+        - tolerance (float) la tolérance relative de la méthode adaptative
+
+    résultat :
+
+        - np.array(float) les proportions de sains, infectés, rétablis et morts de chaque jeu chaque jour, de forme (nb_jeux, nb_jours + 1, 4)
+    """
+    beta, gamma, mu = lot_parametres(beta, gamma, mu)
+    etats = np.ascontiguousarray(np.broadcast_to(np.asarray(etat, dtype=np.float64), (len(beta), 4)))
+    solutions = np.empty((len(beta), nb_jours + 1, 4))
+    if adaptatif:
+        _dormand_prince(etats, beta, gamma, mu, nb_jours, tolerance, PAS_INITIAL, solutions, np.empty(len(beta), dtype=np.int64))
+    else:
+        _rk4(etats, beta, gamma, mu, nb_jours, max(1, round(1 / pas)), solutions)
+    return solutions
+
+
+def erreurs(solutions, observations, nb_personnes, compartiments=COMPARTIMENTS[:3]):
+    """ Mesure l'écart entre les solutions et une courbe observée (simulation ou données réelles)
+    ---
+    paramètres :
+
+        - solutions (np.array(float)) le résultat de resoudre
+        - observations (dict(str: list(int))) les effectifs observés de chaque compartiment chaque jour (par exemple les données d'une simulation)
+        - nb_personnes (int) la population
+        - compartiments (tuple(str)) les compartiments comparés, parmi COMPARTIMENTS
+
+    résultat :
+
+        - np.array(float) la racine de l'erreur quadratique moyenne de chaque jeu, en proportion de la population
+    """
+    nb_jours = min(solutions.shape[1], *(len(observations[clee]) for clee in compartiments))
+    colonnes = [COMPARTIMENTS.index(clee) for clee in compartiments]
+    observees = np.array([observations[clee][:nb_jours] for clee in compartiments], dtype=np.float64).T / nb_personnes
+    return np.sqrt(((solutions[:, :nb_jours, colonnes] - observees) ** 2).mean(axis=(1, 2)))
+
+
+def ajuster(observations, nb_personnes, betas, gammas, mus=(0.,), compartiments=COMPARTIMENTS[:3], **options):
+    """ Cherche dans une grille les paramètres dont la solution est la plus proche d'une courbe observée
+    ---
+    paramètres :
+
+        - observations (dict(str: list(int))) les effectifs observés de chaque compartiment chaque jour
+        - nb_personnes (int) la population
+        - betas, gammas, mus (list(float)) les valeurs de chaque paramètre essayées
+        - compartiments (tuple(str)) les compartiments comparés, parmi COMPARTIMENTS
+        - options les paramètres de resoudre (adaptatif, pas, tolerance)
+
+    résultat :
+
+        - dict(str: float) les meilleurs beta, gamma et mu, et leur erreur
+    """
+    beta, gamma, mu = grille_parametres(betas, gammas, mus)
+    # On part de l'état observé le premier jour
+    premier = {clee: observations[clee][0] if clee in observations else 0 for clee in COMPARTIMENTS[1:]}
+    etat = etat_initial(nb_personnes, premier["Infectés"], premier["Rétablis"], premier["Morts"])
+    nb_jours = min(len(observations[clee]) for clee in compartiments) - 1
+    ecarts = erreurs(resoudre(etat, beta, gamma, mu, nb_jours, **options), observations, nb_personnes, compartiments)
+    k = int(np.argmin(ecarts))
+    return {"beta": float(beta[k]), "gamma": float(gamma[k]), "mu": float(mu[k]), "erreur": float(ecarts[k])}
+
+
+def lire_pays_bdd(nom_fichier, tag):
+    """ Lit les effectifs d'un pays dans une base de données de l'épidémie réelle (Epidémie-COVID-*.db)
+    ---
+    paramètres :
+
+        - nom_fichier (str) le chemin de la base de données
+        - tag (str) le tag du pays
+
+    résultats :
+
+        - dict(str: list(int)) les effectifs de chaque compartiment, chaque jour
+        - int la population du pays
+    """
+    bdd = sqlite3.connect(nom_fichier)
+    lignes = bdd.execute(f"SELECT {', '.join(COMPARTIMENTS)} FROM {tag} ORDER BY id").fetchall()
+    bdd.close()
+    observations = {clee: [ligne[k] for ligne in lignes] for k, clee in enumerate(COMPARTIMENTS)}
+    return observations, sum(lignes[0])
+
+
+if __name__ == "__main__":
+    import time
+
+    # Une grille de 40 x 40 x 5 jeux de paramètres, en échelle logarithmique pour les taux de contamination et de guérison
+    betas, gammas, mus = np.geomspace(.005, 1, 40), np.geomspace(.001, .5, 40), np.linspace(0, .002, 5)
+    beta, gamma, mu = grille_parametres(betas, gammas, mus)
+    etat = etat_initial(1000000, 10)
+    for adaptatif in (False, True):
+        # Le premier appel compile les noyaux (ou les charge du cache)
+        resoudre(etat, beta[:2], gamma[:2], mu[:2], 10, adaptatif)
+        t = time.perf_counter()
+        solutions = resoudre(etat, beta, gamma, mu, 365, adaptatif)
+        print(f"{'Dormand-Prince' if adaptatif else 'Runge-Kutta 4'} : {len(beta)} jeux de paramètres sur 365 jours en {(time.perf_counter() - t) * 1e3:.1f} ms")
+
+    # Les paramètres SIR les plus proches d'une simulation (le temps est alors compté en itérations)
+    from simulation import simuler
+    donnees = simuler(1200, 950, 1070, 0, 0, vectorise=True, graine=0)
+    print("Simulation :", ajuster(donnees, 1200, betas, gammas))
+
+    # Les paramètres SIRD les plus proches de l'épidémie réelle en France
+    observations, nb_personnes = lire_pays_bdd("Epidémie-COVID-2021-05-14.db", "FRA")
+    print("France :", ajuster(observations, nb_personnes, betas, gammas, mus, COMPARTIMENTS[1:]))
@@ -3,13 +3,15 @@ from __future__ import print_function
 import datetime
 import math
 import os
-import random
-import sqlite3
 import time
 from enum import Enum
 
+import numpy as np
 from tqdm import tqdm
 
+from EnregistreurResultats import EnregistreurResultats
+from GrilleSpatiale import GrilleSpatiale
+from Profileur import PROFILEUR
 from outils import BG, FG, QC, centrer_texte, creer_masque, echelloner_valeur
 
 # Empêche l'import de pygame d'afficher du texte
@@ -20,6 +22,8 @@ os.environ['SDL_VIDEO_WINDOW_POS'] = "0,0"
 import pygame
 
 colors = [pygame.Color(20, 100, 255), pygame.Color(255, 100, 20), pygame.Color(100, 100, 100)]
+# La date maximale de l'abscisse du graphique au début de la simulation
+CAPACITE_GRAPHIQUE = 64
 
 
 class Etat(Enum):
@@ -37,9 +41,131 @@ class Comportement(Enum):
         return self._name_.capitalize()
 
 
+# Le comportement d'une population : un comportement commun, que l'on change en une opération, et quelques exceptions individuelles
+class Politique:
+
+    def __init__(self, comportement=Comportement.NORMAL, exceptions=None):
+        """ Initialisation de la politique
+        ---
+        paramètres :
+
+            - comportement (Comportement) le comportement de toutes les personnes sans exception
+            - exceptions (dict(int: Comportement) / None) le comportement particulier de certaines personnes, par indice
+        """
+        self.comportement = comportement
+        self.exceptions = {} if exceptions is None else dict(exceptions)
+        # Les groupes de personnes, recalculés seulement quand les exceptions changent
+        self.partition = None
+
+
+    def changer(self, comportement):
+        """ Change le comportement commun, sans toucher aux personnes
+        ---
+        paramètre :
+
+            - comportement (Comportement) le nouveau comportement
+        """
+        self.comportement = comportement
+
+
+    def ajouter_exception(self, indice, comportement):
+        """ Donne un comportement particulier à une personne, qui ne suit plus le comportement commun
+        ---
+        paramètres :
+
+            - indice (int) l'indice de la personne
+            - comportement (Comportement) son comportement
+        """
+        self.exceptions[indice] = comportement
+        self.partition = None
+
+
+    def retirer_exception(self, indice):
+        """ Fait de nouveau suivre le comportement commun à une personne
+        ---
+        paramètre :
+
+            - indice (int) l'indice de la personne
+        """
+        if self.exceptions.pop(indice, None) is not None:
+            self.partition = None
+
+
+    def comportement_de(self, indice):
+        """ Donne le comportement d'une personne
+        ---
+        paramètre :
+
+            - indice (int) l'indice de la personne
+
+        résultat :
+
+            - Comportement
+        """
+        return self.exceptions.get(indice, self.comportement)
+
+
+    def groupes(self, nb_personnes):
+        """ Répartit la population en groupes de même comportement, pour les faire avancer groupe par groupe
+        ---
+        paramètre :
+
+            - nb_personnes (int) le nombre de personnes
+
+        résultat :
+
+            - list(tuple(Comportement, np.array(int) / None)) le comportement et les indices triés de chaque groupe (None pour toute la population)
+        """
+        # Sans exception, toute la population forme un seul groupe
+        if not self.exceptions:
+            return [(self.comportement, None)]
+        # Le groupe qui suit le comportement commun (None dans la partition) ne change pas quand ce comportement change
+        if self.partition is None:
+            self.partition = self.repartir(np.arange(nb_personnes))
+        return [(self.comportement if comportement is None else comportement, positions) for comportement, positions in self.partition]
+
+
+    def groupes_parmi(self, indices):
+        """ Répartit une partie de la population en groupes de même comportement
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices triés des personnes à répartir
+
+        résultat :
+
+            - list(tuple(Comportement, np.array(int) / None)) le comportement de chaque groupe et les positions de ses personnes dans indices (None pour toutes)
+        """
+        if not self.exceptions:
+            return [(self.comportement, None)]
+        return [(self.comportement if comportement is None else comportement, positions) for comportement, positions in self.repartir(indices)]
+
+
+    def repartir(self, indices):
+        """ Sépare les personnes qui suivent le comportement commun de celles qui ont une exception
+        ---
+        paramètre :
+
+            - indices (np.array(int)) les indices triés des personnes à répartir
+
+        résultat :
+
+            - list(tuple(Comportement / None, np.array(int))) les positions dans indices de chaque groupe (None pour le comportement commun)
+        """
+        exceptions = np.array(sorted(self.exceptions), dtype=np.int64)
+        valeurs = np.array([self.exceptions[indice].value for indice in exceptions.tolist()], dtype=np.int8)
+        # On ne garde que les exceptions qui concernent ces personnes
+        positions = np.minimum(np.searchsorted(indices, exceptions), max(len(indices) - 1, 0))
+        presentes = indices[positions] == exceptions if len(indices) else np.zeros(len(exceptions), dtype=bool)
+        positions, valeurs = positions[presentes], valeurs[presentes]
+        communs = np.ones(len(indices), dtype=bool)
+        communs[positions] = False
+        return [(None, np.flatnonzero(communs))] + [(Comportement(int(valeur)), positions[valeurs == valeur]) for valeur in np.unique(valeurs).tolist()]
+
+
 class Personne:
 
-    def __init__(self, id, x, y, vx, vy, ax, ay, p, rayon):
+    def __init__(self, id, x, y, vx, vy, ax, ay, p, rayon, tps_infecte):
         """ Initialisation de la personne
         ---
         paramètres :
@@ -52,6 +178,8 @@ class Personne:
             - ax (float) l'accélération en absisce
             - ay (float) l'accélération en ordonnée
             - p (float 0 <= p <= 1) la probabilité de contaminer une personne
+            - rayon (int) la taille de la personne
+            - tps_infecte (int) la durée de l'infection, en itérations
         """
         # L'identifiant de la personne
         self.id = id
@@ -62,11 +190,10 @@ class Personne:
         self.ax = ax
         self.ay = ay
         self.p = p
-        # En cas d'infection, la personne restera infecté pendant self.TPS_INFECTE itérations
-        self.TPS_INFECTE = random.randint(40, 60)
+        # En cas d'infection, la personne restera infecté pendant self.TPS_INFECTE itérations (sa guérison est programmée par la simulation)
+        self.TPS_INFECTE = tps_infecte
         # État d'origine de la personne
         self.etat = Etat.SAIN
-        self.comportement = Comportement.NORMAL
         # La vitesse maximale de déplacement de la personne
         self.VMAX = 5
         # La taille de la personne
@@ -103,7 +230,7 @@ class Personne:
 
 
     def mise_a_jour(self, largeur_sim, hauteur_sim, personnes):
-        """ Calcul de l'étape suivante
+        """ Calcul de l'étape suivante, pour le comportement normal
         ---
         paramètres :
 
@@ -113,9 +240,49 @@ class Personne:
         """
         # On remet l'accelération à zéro
         self.ax = self.ay = 0
-        # Pendant une quarantaine, on introduit une force de répulsion pour éviter les contacts, et une force de frottement fluide pour stabiliser le mouvement
-        if self.comportement == Comportement.QUARANTAINE:
-            self.repulsion(personnes)
+        self.avancer(largeur_sim, hauteur_sim)
+
+
+    def mise_a_jour_quarantaine(self, largeur_sim, hauteur_sim, personnes):
+        """ Calcul de l'étape suivante, pendant une quarantaine
+        ---
+        paramètres :
+
+            - largeur_sim (int) la largeur de l'espace de simulation
+            - hauteur_sim (int) la hauteur de l'espace de simulation
+            - personnes (list(Personne)) les personnes proches
+        """
+        self.ax = self.ay = 0
+        # On introduit une force de répulsion pour éviter les contacts, et une force de frottement fluide pour stabiliser le mouvement
+        self.repulsion(personnes)
+        self.avancer(largeur_sim, hauteur_sim)
+
+
+    def mise_a_jour_deplacement(self, largeur_sim, hauteur_sim, personnes):
+        """ Calcul de l'étape suivante, pour une personne qui se déplace : elle va tout droit à la vitesse maximale
+        ---
+        paramètres :
+
+            - largeur_sim (int) la largeur de l'espace de simulation
+            - hauteur_sim (int) la hauteur de l'espace de simulation
+            - personnes (list(Personne)) la liste des personnes de la simulation
+        """
+        self.ax = self.ay = 0
+        v = math.hypot(self.vx, self.vy)
+        if v > 0:
+            self.vx *= self.VMAX / v
+            self.vy *= self.VMAX / v
+        self.avancer(largeur_sim, hauteur_sim)
+
+
+    def avancer(self, largeur_sim, hauteur_sim):
+        """ Applique l'accélération puis la vitesse, commun à tous les comportements
+        ---
+        paramètres :
+
+            - largeur_sim (int) la largeur de l'espace de simulation
+            - hauteur_sim (int) la hauteur de l'espace de simulation
+        """
         # On applique le schéma d'Euler pour la vitesse
         self.vx += self.ax
         self.vy += self.ay
@@ -129,13 +296,6 @@ class Personne:
         # On applique le schéma d'Euler pour la position
         self.x += int(self.vx)
         self.y += int(self.vy)
-        # Si la personne est infectée
-        if self.etat == Etat.INFECTE:
-            # Un jour en étant infecté s'est écoulé
-            self.TPS_INFECTE -= 1
-        # Si la personne n'est plus infecté
-        if self.TPS_INFECTE == 0:
-            self.etat = Etat.RETABLI
 
 
     def repulsion(self, personnes):
@@ -217,9 +377,18 @@ class Personne:
         pygame.draw.circle(ecran, self.couleur(), (self.x, self.y + haut), self.RAYON)
 
 
+# La méthode de Personne qui calcule l'étape suivante, pour chaque comportement
+MISES_A_JOUR = {Comportement.NORMAL: Personne.mise_a_jour,
+                Comportement.QUARANTAINE: Personne.mise_a_jour_quarantaine,
+                Comportement.DEPLACEMENT: Personne.mise_a_jour_deplacement}
+
+
 class Simulation:
 
-    def __init__(self, personnes, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil):
+    # Si la simulation sait capturer son état pour les instantanés (capturer_etat)
+    instantanes_possibles = True
+
+    def __init__(self, personnes, largeur_sim, hauteur_sim, ecran, taux_incidence, seuil, grille=True, generateur=None):
         """ Initialisation de la simulation
         ---
         paramètres :
@@ -227,18 +396,29 @@ class Simulation:
             - personnes (list(Personne)) la liste de personne de la simulation
             - largeur_sim (int) la largeur de l'espace de la simulation
             - hauteur_sim (int) la hauteur de l'espace de la simulation
-            - ecran (Pygame.Surface) la surface sur laquelle afficher la simulation
+            - ecran (Pygame.Surface / None) la surface sur laquelle afficher la simulation, None pour une simulation sans affichage
             - taux_incidence (int) le nombre de personnes infectés simultanément avant de mettre en place une quarantaine
             - seuil (float 0 <= seuil <= 1) le pourcentage de taux_incidence à atteindre afin de mettre fin à la quarantaine
             - comportement_urgence (Comportement) le comportement de la simulation si le nombre d'inféctés est supérieur à taux_incidence
+            - grille (bool) si on recherche les voisins avec une grille spatiale plutôt qu'en parcourant toutes les personnes
+            - generateur (np.random.Generator / None) le générateur de nombres aléatoires de la simulation (None pour en créer un)
         """
-        self.personnes = personnes
-        # On infecte une personne
-        self.personnes[0].etat = Etat.INFECTE
-        # On assigne les personnes
-        self.sains = self.personnes[0:-1]
-        self.infectes = [self.personnes[0]]
-        self.retablis = []
+        # Le générateur de nombres aléatoires propre à la simulation : deux simulations de même graine sont identiques
+        self.generateur = np.random.default_rng() if generateur is None else generateur
+        # Le numéro de l'itération en cours
+        self.iteration = 0
+        # Le comportement de la population, normal par défaut
+        self.politique = Politique()
+        # Le journal où sont écrites les infections (None pour ne pas les garder)
+        self.journal = None
+        # L'enregistreur des images affichées (None pour ne pas les garder)
+        self.enregistreur_images = None
+        # On crée la population et ses compartiments
+        self.initialiser_population(personnes, grille)
+        # La graine du générateur (celui de la population, pour une population vectorisée), à conserver avec les résultats :
+        # l'entropie et la clée de la séquence fille, qui la recréent avec np.random.SeedSequence(entropie, spawn_key=clee)
+        sequence = self.generateur.bit_generator.seed_seq
+        self.graine = (sequence.entropy, sequence.spawn_key)
 
         # les dimensions de l'espace de la simulation
         self.largeur_sim = largeur_sim
@@ -249,9 +429,12 @@ class Simulation:
 
         # Les données de la simulation
         self.donnees = {"Sains": [], "Infectés": [], "Rétablis": []}
+        # Sans écran, on ne fait aucun affichage (ni texte, ni graphique), ce qui permet de tourner sans pygame initialisé
+        self.affichage = ecran is not None
         # Les polices d'écriture pour l'affichage
-        self.police_donnees = pygame.font.SysFont("montserrat", 18)
-        self.police = pygame.font.SysFont("montserrat", 24)
+        if self.affichage:
+            self.police_donnees = pygame.font.SysFont("montserrat", 18)
+            self.police = pygame.font.SysFont("montserrat", 24)
 
         # On met à jour et on enregistre les données
         self.reassignation()
@@ -259,8 +442,6 @@ class Simulation:
 
         # L'écran pour afficher les points
         self.ecran = ecran
-        # Le comportement par défaut de la simulation
-        self.comportement = Comportement.NORMAL
         # Le nombre d'infectés au dessus duquel une quarantaine est déclarée, si elle doit l'être
         self.TAUX_INCIDENCE = taux_incidence
         # Les dates de début et fin de quarantaine
@@ -290,12 +471,57 @@ class Simulation:
         self.mesure_urgence = taux_incidence != 0
         # Si la simulation est termin
         self.terminee = False
+        # On n'affiche qu'une itération sur periode_affichage, la simulation peut ainsi avancer plus vite que l'affichage
+        self.periode_affichage = 1
+        # Le graphique est gardé sur sa propre surface, à laquelle on ajoute seulement les nouveaux segments
+        self.graphique = None
+        # La date maximale de l'abscisse, doublée quand elle est atteinte
+        self.capacite = CAPACITE_GRAPHIQUE
+        # Le nombre de points déjà tracés sur le graphique
+        self.nb_traces = 0
+
+
+    def initialiser_population(self, personnes, grille):
+        """ Initialisation de la population et de ses compartiments
+        ---
+        paramètres :
+
+            - personnes (list(Personne)) la liste de personne de la simulation
+            - grille (bool) si on recherche les voisins avec une grille spatiale
+        """
+        self.personnes = personnes
+        self.nb_personnes = len(personnes)
+        # On infecte une personne
+        self.personnes[0].etat = Etat.INFECTE
+        # Les compartiments associent l'indice de chaque personne à la personne, dans l'ordre d'arrivée
+        self.sains, self.infectes, self.retablis = {}, {}, {}
+        # Les personnes infectées pendant l'itération en cours, ajoutées aux infectés lors de la réassignation, associées à la personne qui les infecte
+        self.nouveaux_infectes = {}
+        # Les guérisons programmées : le numéro d'itération associé à la liste des indices des personnes qui guérissent
+        self.guerisons = {}
+        # On assigne les personnes
+        for indice, personne in enumerate(self.personnes):
+            if personne.etat == Etat.SAIN:
+                self.sains[indice] = personne
+            elif personne.etat == Etat.INFECTE:
+                self.infectes[indice] = personne
+                self.programmer_guerison(indice)
+            else:
+                self.retablis[indice] = personne
+
+        # La grille de voisinage, dont les cellules couvrent la distance de répulsion (5 rayons) et donc celle de collision
+        self.grille = None
+        if grille:
+            self.grille = GrilleSpatiale(5 * max(p.RAYON for p in self.personnes))
+            self.grille.construire(self.personnes)
 
 
     def initialisation_affichage(self):
         """ Initialisation de l'affichage de la simulation
         ---
         """
+        if not self.affichage:
+            return
         # On affiche une fois pour toute le comportement de la simulation si il ne changera pas
         if not self.mesure_urgence:
             centrer_texte(self.ecran, self.police_donnees, "Aucunes mesures", FG, 500, 20, self.DIST_HAUT - 30, 1200)
@@ -309,7 +535,7 @@ class Simulation:
             centrer_texte(self.ecran, self.police, clee, FG, 100, 50, self.DIST_HAUT + 400, 1150 + 250 * x)
 
         # la valeur maximale du graphique
-        mx = len(self.personnes)
+        mx = self.nb_personnes
         # Le coefficient de proportionalité pour ramener les valeurs sur le graphique
         dx = self.hauteur_graph / mx
 
@@ -332,47 +558,87 @@ class Simulation:
 
 
     def mise_a_jour_graphique(self):
-        """ Affiche le graphique du pays donné
+        """ Affiche le graphique de la simulation, en ne traçant que ce qui est nouveau depuis le dernier affichage
         ---
         """
-        # La valeur maximale des ordonées
-        mx = len(self.personnes)
-        # La valeur maximale de l'abcsisse (1 pour éviter une division par 0)
-        my = max(self.y[-1], 1)
+        # Le nombre de points des courbes
+        n = len(self.donnees["Sains"])
+        # Si le graphique n'existe pas encore, ou si l'abscisse est pleine, on double l'abscisse et on retrace tout
+        if self.graphique is None or n - 1 > self.capacite:
+            while n - 1 > self.capacite:
+                self.capacite *= 2
+            self.graphique = pygame.Surface((self.largeur_graph, self.hauteur_graph))
+            self.graphique.fill(BG)
+            self.tracer_quarantaines(0, n - 1)
+            self.tracer_courbes(0)
+            self.tracer_abscisse()
+        # Sinon, on ajoute seulement les nouveaux segments, en partant du dernier point tracé
+        else:
+            self.tracer_quarantaines(self.nb_traces - 1, n - 1)
+            self.tracer_courbes(self.nb_traces - 1)
+        self.nb_traces = n
+        self.ecran.blit(self.graphique, (self.GAUCHE + self.MARGE + 2, self.DIST_HAUT + self.MARGE))
 
-        # Les proporotions pour remettre les données à l'échelle
-        dx = self.hauteur_graph / mx
-        dy = self.largeur_graph / my
 
-        # On "efface" le graphique
-        creer_masque(self.DIST_HAUT + self.MARGE, self.GAUCHE + self.MARGE + 2,
-                    self.LARGEUR - 2 * self.MARGE, self.HAUTEUR - 2 * self.MARGE, BG, self.ecran)
+    def tracer_quarantaines(self, debut, fin):
+        """ Colorie en violet les périodes de quarantaine sur le graphique, entre deux dates
+        ---
+        paramètres :
+
+            - debut (int) la première date
+            - fin (int) la dernière date
+        """
+        # Les proportions pour remettre les dates à l'échelle
+        dy = self.largeur_graph / self.capacite
+        dates = list(self.dates_quarantaine)
+        # Une quarantaine en cours dure jusqu'à la dernière date
+        if len(dates) % 2:
+            dates.append(fin)
+        for date_debut, date_fin in zip(dates[::2], dates[1::2]):
+            gauche, droite = max(date_debut, debut), min(date_fin, fin)
+            if gauche < droite:
+                self.graphique.fill(QC, pygame.Rect(int(gauche * dy) - 2, 0, int(droite * dy) - int(gauche * dy) + 1, self.hauteur_graph))
+
+
+    def tracer_courbes(self, debut):
+        """ Trace les courbes à partir d'un point, réduites à la largeur du graphique en pixels
+        ---
+        paramètre :
+
+            - debut (int) l'indice du premier point à tracer
+        """
+        # Les proportions pour remettre les données à l'échelle
+        dx = self.hauteur_graph / self.nb_personnes
+        dy = self.largeur_graph / self.capacite
+        for couleur, serie in zip(colors, self.donnees.values()):
+            valeurs = np.asarray(serie[debut:], dtype=np.float64)
+            if len(valeurs) < 2:
+                continue
+            # La colonne de pixels de chaque point
+            colonnes = (np.arange(debut, debut + len(valeurs)) * dy).astype(np.int64)
+            # On ne garde que le premier, le minimum, le maximum et le dernier point de chaque colonne : le tracé est le même, au pixel près
+            premiers = np.flatnonzero(np.r_[True, colonnes[1:] != colonnes[:-1]])
+            derniers = np.r_[premiers[1:], len(valeurs)] - 1
+            points = np.empty((len(premiers), 4, 2))
+            points[:, :, 0] = colonnes[premiers, None] - 2
+            points[:, 0, 1] = valeurs[premiers]
+            points[:, 1, 1] = np.minimum.reduceat(valeurs, premiers)
+            points[:, 2, 1] = np.maximum.reduceat(valeurs, premiers)
+            points[:, 3, 1] = valeurs[derniers]
+            points[:, :, 1] = (self.nb_personnes - points[:, :, 1]) * dx
+            pygame.draw.lines(self.graphique, couleur, False, points.reshape(-1, 2).tolist(), 2)
+
+
+    def tracer_abscisse(self):
+        """ Affiche l'axe des abscisses et sa légende, qui ne changent que lorsque l'abscisse est agrandie
+        ---
+        """
+        dy = self.largeur_graph / self.capacite
         # On "efface" la barre de l'abcsisse
         creer_masque(self.DIST_HAUT + self.HAUTEUR - self.MARGE + 2, self.GAUCHE + self.MARGE - 10,
                     self.LARGEUR - self.MARGE + 10, self.MARGE, BG, self.ecran)
-
-        # les abcsisses des date de quarantaine
-        c_y = [x * dy + self.MARGE + self.GAUCHE for x in self.dates_quarantaine]
-
-        # On affiche en violet les périodes de quarantaine
-        for x in range((len(c_y) + 1) // 2):
-            # Si il existe un point après celui-ci, on sait où s'arrête
-            if 2 * x + 1 < len(c_y):
-                creer_masque(self.DIST_HAUT + self.MARGE, c_y[2 * x], c_y[2 * x + 1] - c_y[2 * x], self.HAUTEUR - 2 * self.MARGE, QC, self.ecran)
-            # Sinon on s'arrête au bord du graphique
-            else:
-                creer_masque(self.DIST_HAUT + self.MARGE, c_y[2 * x], self.GAUCHE + self.LARGEUR - self.MARGE - c_y[2 * x], self.HAUTEUR - 2 * self.MARGE, QC, self.ecran)
-
-        # On trace les courbes
-        for clee in self.donnees:
-            c_x = [(mx - x) * dx + self.MARGE + self.DIST_HAUT for x in self.donnees[clee]]
-            c_y = [x * dy + self.MARGE + self.GAUCHE for x in self.y]
-            pts = list(zip(c_y, c_x))
-            for x in range(len(pts) - 1):
-                pygame.draw.line(self.ecran, colors[list(self.donnees.keys()).index(clee)], pts[x], pts[x + 1], 2)
-
         # On affiche la légende de l'abcsisse
-        y_coord = echelloner_valeur(0, my, 10)
+        y_coord = echelloner_valeur(0, self.capacite, 10)
         for y in y_coord:
             X = self.MARGE + int(y * dy)
             d = str(int(y))
@@ -395,34 +661,46 @@ class Simulation:
         self.donnees["Rétablis"].append(len(self.retablis))
 
 
+    def programmer_guerison(self, indice):
+        """ Programme la guérison d'une personne qui vient d'être infectée
+        ---
+        paramètre :
+
+            - indice (int) l'indice de la personne
+        """
+        # La personne reste infectée pendant TPS_INFECTE itérations
+        self.guerisons.setdefault(self.iteration + self.personnes[indice].TPS_INFECTE, []).append(indice)
+
+
     def reassignation(self):
-        """ Assigne les personnes dans leurs compartiments respectifs en fonction de leur état
+        """ Déplace entre les compartiments les personnes dont l'état change à cette itération
         ---
         """
-        p = 0
-        # Tant que l'on a pas regarde chaque personne de self.infectes
-        while len(self.infectes) - p > 0:
-            # Si la personne est rétablie on la déplace
-            if self.infectes[p].etat == Etat.RETABLI:
-                self.retablis.append(self.infectes[p])
-                self.infectes.pop(p)
-            # Sinon on passe à la personne suivante
-            else:
-                p += 1
-        p = 0
-        # On fait de même avec les personnes saines
-        while len(self.sains) - p > 0:
-            if self.sains[p].etat == Etat.INFECTE:
-                self.infectes.append(self.sains[p])
-                self.sains.pop(p)
-            else:
-                p += 1
+        # Les personnes dont la guérison est programmée à cette itération sont rétablies
+        for indice in self.guerisons.pop(self.iteration, []):
+            personne = self.infectes.pop(indice)
+            personne.etat = Etat.RETABLI
+            self.retablis[indice] = personne
+        # Les personnes infectées pendant l'itération deviennent infectées, par ordre d'indice pour ne pas dépendre de la recherche de voisins
+        nouveaux = sorted(self.nouveaux_infectes)
+        for indice in nouveaux:
+            personne = self.sains.pop(indice)
+            personne.etat = Etat.INFECTE
+            self.infectes[indice] = personne
+            self.programmer_guerison(indice)
+        # On écrit qui a infecté qui, où et quand
+        if self.journal is not None and nouveaux:
+            self.journal.ajouter(self.iteration, [self.nouveaux_infectes[indice] for indice in nouveaux], nouveaux,
+                                 [self.personnes[indice].x for indice in nouveaux], [self.personnes[indice].y for indice in nouveaux])
+        self.nouveaux_infectes.clear()
 
 
     def afficher(self):
         """ Affiche la simulation
         ---
         """
+        if not self.doit_afficher():
+            return
         # On "efface" l'espace de simulation
         creer_masque(self.DIST_HAUT - 50, -20, self.largeur_sim + 100, self.hauteur_sim + 20, BG, self.ecran)
         # On trace les ligne du contour de l'espace
@@ -437,9 +715,20 @@ class Simulation:
             (0, self.hauteur_sim + self.DIST_HAUT - 50))
         pygame.draw.line(self.ecran, pygame.Color(200, 200, 200), (0, self.hauteur_sim + self.DIST_HAUT - 50), (0, self.DIST_HAUT - 50))
         # On affiche chaque personne
-        [p.afficher(self.ecran, self.DIST_HAUT - 50) for p in self.personnes]
-        # On enregistre ce tour
-        self.y.append(len(self.y))
+        with PROFILEUR.phase("personnes"):
+            self.afficher_personnes()
+        # L'image est complète : on la confie à l'enregistreur, qui l'encode dans ses propres fils d'exécution
+        if self.enregistreur_images is not None:
+            with PROFILEUR.phase("images"):
+                self.enregistreur_images.ajouter(self.ecran, self.iteration, self.terminee)
+
+
+    def afficher_personnes(self):
+        """ Affiche chaque personne de la simulation
+        ---
+        """
+        for p in self.personnes:
+            p.afficher(self.ecran, self.DIST_HAUT - 50)
 
 
     def mise_a_jour_texte(self):
@@ -450,7 +739,7 @@ class Simulation:
         if self.mesure_urgence:
             # On "efface" l'en-tête du graphique et on affiche les informations
             creer_masque(self.DIST_HAUT - 30, 1200, 500, 100, BG, self.ecran)
-            centrer_texte(self.ecran, self.police_donnees, "Comportement de la population : " + str(self.comportement), FG, 500, 20, self.DIST_HAUT - 30, 1200)
+            centrer_texte(self.ecran, self.police_donnees, "Comportement de la population : " + str(self.politique.comportement), FG, 500, 20, self.DIST_HAUT - 30, 1200)
             centrer_texte(self.ecran, self.police_donnees,
                         f"Taux d'incidence : {self.TAUX_INCIDENCE}", FG, 500, 20, self.DIST_HAUT, 1200)
         # On met à jour le nombre de personnes dans chaque partie
@@ -465,32 +754,141 @@ class Simulation:
         """ Met à jour la simulation
         ---
         """
-        # On met à jour chaque personne
-        for personnne in self.personnes:
-            personnne.mise_a_jour(self.largeur_sim, self.hauteur_sim, self.personnes)
-        # On regarde si il y a collision entre une personne infectée et une personne saine
-        for personnne in self.infectes:
+        # Chaque phase est mesurée par le profileur, s'il est activé
+        with PROFILEUR.phase("iteration"):
+            self.iteration += 1
+            # On met à jour chaque personne
+            with PROFILEUR.phase("deplacement"):
+                self.deplacer_personnes()
+            # On regarde si il y a collision entre une personne infectée et une personne saine
+            with PROFILEUR.phase("infection"):
+                self.propager_infection()
+            # Tant qu'il y a des infectés, il peut se passer quelque chose
+            if self.nb_infectes() > 0:
+                # On réassigne les personnes et on fait avancer la simulation d'une itération
+                with PROFILEUR.phase("reassignation"):
+                    self.reassignation()
+                with PROFILEUR.phase("comportement"):
+                    self.mise_a_jour_comportement()
+                with PROFILEUR.phase("donnees"):
+                    self.mise_a_jour_donnees()
+            # Sinon, la simulation est terminée
+            else:
+                self.terminee = True
+            # On enregistre ce tour
+            self.y.append(len(self.y))
+            # On met à jour l'affichage
+            if self.doit_afficher():
+                with PROFILEUR.phase("texte"):
+                    self.mise_a_jour_texte()
+                with PROFILEUR.phase("graphique"):
+                    self.mise_a_jour_graphique()
+                with PROFILEUR.phase("display.update"):
+                    pygame.display.update()
+
+
+    def doit_afficher(self):
+        """ Indique si l'itération en cours doit être affichée
+        ---
+        résultat :
+
+            - bool (une itération sur periode_affichage, et toujours la dernière)
+        """
+        return self.affichage and (self.iteration % self.periode_affichage == 0 or self.terminee)
+
+
+    def deplacer_personnes(self):
+        """ Fait avancer chaque personne d'une itération, groupe de comportement par groupe
+        ---
+        """
+        for comportement, indices in self.politique.groupes(self.nb_personnes):
+            # Le temps passé dans le groupe en quarantaine est compté à part, comme celui de la répulsion des populations vectorisées
+            if comportement == Comportement.QUARANTAINE:
+                with PROFILEUR.phase("repulsion"):
+                    self.deplacer_groupe(comportement, indices)
+            else:
+                self.deplacer_groupe(comportement, indices)
+
+
+    def deplacer_groupe(self, comportement, indices):
+        """ Fait avancer d'une itération les personnes d'un groupe de comportement
+        ---
+        paramètres :
+
+            - comportement (Comportement) le comportement du groupe
+            - indices (np.array(int) ou None) les indices des personnes du groupe, None pour toute la population
+        """
+        # La méthode est choisie une fois pour tout le groupe
+        mise_a_jour = MISES_A_JOUR[comportement]
+        for indice in (range(self.nb_personnes) if indices is None else indices.tolist()):
+            personnne = self.personnes[indice]
+            mise_a_jour(personnne, self.largeur_sim, self.hauteur_sim, self.personnes_proches(personnne, comportement))
+            # On garde la grille à jour pour que les personnes suivantes voient la nouvelle position
+            if self.grille is not None:
+                self.grille.deplacer(indice, personnne.x, personnne.y)
+
+
+    def propager_infection(self):
+        """ Infecte les personnes saines en contact avec une personne infectée
+        ---
+        """
+        # Les tirages de toutes les personnes infectées sont faits en une fois
+        tirages = self.generateur.integers(0, 101, len(self.infectes)).tolist()
+        for personnne, tirage in zip(self.infectes.values(), tirages):
             # On a une probabilité p d'infecter une personne saine
-            if random.randint(0, 100) <= personnne.p * 100:
+            if tirage <= personnne.p * 100:
                 # Si le conctact doit infecter, on regarde la collision avec chaque personne saine
-                for sain in self.sains:
+                for indice in self.sains_proches(personnne):
                     # Si il y a collision
-                    if personnne.collision(sain):
-                        # La personne est alors infectée
-                        sain.etat = Etat.INFECTE
-        # Tant qu'il y a des infectés, il peut se passer quelque chose
-        if len(self.infectes) > 0:
-            # On réassigne les personnes et on fait avancer la simulation d'une itération
-            self.reassignation()
-            self.mise_a_jour_comportement()
-            self.mise_a_jour_donnees()
-            self.mise_a_jour_texte()
-            self.mise_a_jour_graphique()
-        # Sinon, la simulation est terminée
-        else:
-            self.terminee = True
-        # On met à jour l'affichage
-        pygame.display.update()
+                    if personnne.collision(self.personnes[indice]):
+                        # La personne sera alors infectée, lors de la réassignation, par la personne d'indice le plus petit qui la touche
+                        infecteur = self.nouveaux_infectes.get(indice)
+                        if infecteur is None or personnne.id < infecteur:
+                            self.nouveaux_infectes[indice] = personnne.id
+
+
+    def nb_infectes(self):
+        """ Donne le nombre de personnes du compartiment des infectés
+        ---
+        résultat :
+
+            - int
+        """
+        return len(self.infectes)
+
+
+    def personnes_proches(self, personne, comportement):
+        """ Donne les personnes susceptibles d'interagir avec la personne donnée
+        ---
+        paramètres :
+
+            - personne (Personne) la personne dont on cherche les voisins
+            - comportement (Comportement) le comportement de la personne
+
+        résultat :
+
+            - list(Personne)
+        """
+        # Sans grille, ou hors quarantaine (la répulsion n'est pas calculée), on donne toutes les personnes
+        if self.grille is None or comportement != Comportement.QUARANTAINE:
+            return self.personnes
+        return [self.personnes[indice] for indice in self.grille.voisins(personne.x, personne.y)]
+
+
+    def sains_proches(self, personne):
+        """ Donne les indices des personnes saines susceptibles d'être en collision avec la personne donnée
+        ---
+        paramètre :
+
+            - personne (Personne) la personne infectée
+
+        résultat :
+
+            - list(int)
+        """
+        if self.grille is None:
+            return self.sains
+        return [indice for indice in self.grille.voisins(personne.x, personne.y) if indice in self.sains]
 
 
     def mise_a_jour_comportement(self):
@@ -500,113 +898,456 @@ class Simulation:
         # Si des mesures doivent être prises
         if self.mesure_urgence:
             # Si le nombre d'infecté dépasse le seuil critique et qu'aucune mesures n'est actuellement appliquée
-            if len(self.infectes) > self.TAUX_INCIDENCE and self.comportement == Comportement.NORMAL:
-                # On commence une quarantaine
+            if self.nb_infectes() > self.TAUX_INCIDENCE and self.politique.comportement == Comportement.NORMAL:
+                # On commence une quarantaine : toutes les personnes (sauf exceptions) doivent s'éviter
                 self.dates_quarantaine.append(self.y[-1])
-                self.comportement = Comportement.QUARANTAINE
-                # Toutes les personnes doivent s'éviter
-                for p in self.personnes:
-                    p.comportement = Comportement.QUARANTAINE
+                self.politique.changer(Comportement.QUARANTAINE)
             # Si le nombre d'infecté est en dessous d'une proportion du seuil critique est qu'une quarantaine est en cours, on y met fin
-            elif len(self.infectes) < self.TAUX_INCIDENCE * self.seuil and self.comportement == Comportement.QUARANTAINE:
-                # On met fin à la quarantaine
+            elif self.nb_infectes() < self.TAUX_INCIDENCE * self.seuil and self.politique.comportement == Comportement.QUARANTAINE:
+                # On met fin à la quarantaine : les personnes peuvent se déplacer normallement
                 self.dates_quarantaine.append(self.y[-1])
-                self.comportement = Comportement.NORMAL
-                # Les personnes peuvent se déplacer normallement
-                for p in self.personnes:
-                    p.comportement = Comportement.NORMAL
-
-
-# On lance le moteur graphique
-pygame.init()
-info = pygame.display.Info()
-
-# On crée l'écran
-ecran = pygame.display.set_mode((info.current_w, info.current_h), pygame.NOFRAME)
-ecran.fill(BG)
-
-# On récupère les dimensios de l'espace de simulation
-largeur_sim = info.current_w // 2 - 10
-hauteur_sim = info.current_h - 10
-
-# Le nombre de simulation à faire
-NB_SIM = 1
-# Le fraction du seuil critique pour arrêter la quarantaine
-SEUIL = 0.3
-# Si on doit sauvegarder
-SAUVEGARDER = False
-# Le nombre de personnes de la simulation
-NB_PERSONNES = 1200
-# Le nombre de personnes infectés critique
-TAUX_INCIDENCE = 100
-# Le dossier de sauvegarde
-NOM_DOSSIER = f"E:\\Python\\Projet\\TIPE\\Modele_epidemiologique\\app\\Simulation\\Taux incidence {TAUX_INCIDENCE}"
-
-
-for _ in range(NB_SIM):
-    # On crée aléatoirment les personnes
-    personnes = []
-    for k in range(NB_PERSONNES):
-        v, theta = random.randint(0, 500) / 100, random.randint(0, 628) / 100
-        vx, vy = v * math.cos(theta), v * math.sin(theta)
-        personnes.append(
-            Personne(k,
-                random.randint(0, largeur_sim),
-                random.randint(0, hauteur_sim),
-                vx, vy, 0, 0, .5, 6))
-
-    # On initialise la simulation
-    Sim = Simulation(personnes, largeur_sim, hauteur_sim, ecran, TAUX_INCIDENCE, SEUIL)
-    Sim.initialisation_affichage()
-
-    # On crée une table dans la base de donnée pour enregistrer les donnée de la simulation
-    if SAUVEGARDER:
+                self.politique.changer(Comportement.NORMAL)
+
+
+    def fermer(self):
+        """ Libère les ressources de la simulation (rien à faire pour une simulation dans un seul processus)
+        ---
+        """
+
+
+    def capturer_etat(self):
+        """ Copie l'état complet de la simulation, pour pouvoir la reprendre plus tard à l'identique
+        ---
+        résultat :
+
+            - dict (valeurs python et tableaux numpy, indépendants de la simulation qui peut continuer)
+        """
+        return {"type": type(self).__name__,
+                "iteration": self.iteration,
+                "largeur_sim": self.largeur_sim,
+                "hauteur_sim": self.hauteur_sim,
+                "taux_incidence": self.TAUX_INCIDENCE,
+                "seuil": self.seuil,
+                "y": np.array(self.y, dtype=np.int64),
+                "donnees": {clee: np.array(serie, dtype=np.int64) for clee, serie in self.donnees.items()},
+                "dates_quarantaine": list(self.dates_quarantaine),
+                "comportement": self.politique.comportement.value,
+                "exceptions": {indice: comportement.value for indice, comportement in self.politique.exceptions.items()},
+                "terminee": self.terminee,
+                "graine": self.graine,
+                # L'état du générateur, utilisé pour les tirages d'infection
+                "generateur": self.generateur.bit_generator.state,
+                "population": self.capturer_population()}
+
+
+    def restaurer_etat(self, etat):
+        """ Remet la simulation dans un état capturé par capturer_etat
+        ---
+        paramètre :
+
+            - etat (dict) le résultat de capturer_etat
+        """
+        self.iteration = etat["iteration"]
+        self.y = etat["y"].tolist()
+        self.donnees = {clee: serie.tolist() for clee, serie in etat["donnees"].items()}
+        self.dates_quarantaine = list(etat["dates_quarantaine"])
+        self.politique = Politique(Comportement(etat["comportement"]),
+                                   {indice: Comportement(valeur) for indice, valeur in etat.get("exceptions", {}).items()})
+        self.terminee = etat["terminee"]
+        # Les instantanés plus anciens n'ont que l'état du générateur de la population vectorisée, restauré avec elle
+        graine = etat.get("graine")
+        self.graine = graine if graine is None or isinstance(graine, int) else (graine[0], tuple(graine[1]))
+        if "generateur" in etat:
+            self.generateur.bit_generator.state = etat["generateur"]
+        self.restaurer_population(etat["population"])
+
+
+    def capturer_population(self):
+        """ Copie l'état des personnes et des compartiments
+        ---
+        résultat :
+
+            - dict
+        """
+        personnes = self.personnes
+        return {"x": np.array([p.x for p in personnes], dtype=np.int64),
+                "y": np.array([p.y for p in personnes], dtype=np.int64),
+                "vx": np.array([p.vx for p in personnes], dtype=np.float64),
+                "vy": np.array([p.vy for p in personnes], dtype=np.float64),
+                "ax": np.array([p.ax for p in personnes], dtype=np.float64),
+                "ay": np.array([p.ay for p in personnes], dtype=np.float64),
+                "p": np.array([p.p for p in personnes], dtype=np.float64),
+                "rayon": np.array([p.RAYON for p in personnes], dtype=np.int64),
+                "tps_infecte": np.array([p.TPS_INFECTE for p in personnes], dtype=np.int64),
+                "etat": np.array([p.etat.value for p in personnes], dtype=np.int8),
+                # L'ordre des compartiments fixe l'ordre des tirages, on le conserve
+                "sains": np.array(list(self.sains), dtype=np.int64),
+                "infectes": np.array(list(self.infectes), dtype=np.int64),
+                "retablis": np.array(list(self.retablis), dtype=np.int64),
+                "nouveaux_infectes": np.array(sorted(self.nouveaux_infectes), dtype=np.int64),
+                "infecteurs": np.array([self.nouveaux_infectes[indice] for indice in sorted(self.nouveaux_infectes)], dtype=np.int64),
+                "guerisons": {iteration: np.array(indices, dtype=np.int64) for iteration, indices in self.guerisons.items()},
+                "grille": self.grille is not None}
+
+
+    def restaurer_population(self, etat):
+        """ Remet les personnes et les compartiments dans un état capturé par capturer_population
+        ---
+        paramètre :
+
+            - etat (dict) le résultat de capturer_population
+        """
+        colonnes = zip(etat["x"].tolist(), etat["y"].tolist(), etat["vx"].tolist(), etat["vy"].tolist(), etat["ax"].tolist(), etat["ay"].tolist(),
+                       etat["p"].tolist(), etat["tps_infecte"].tolist(), etat["etat"].tolist())
+        for personne, (x, y, vx, vy, ax, ay, p, tps_infecte, valeur_etat) in zip(self.personnes, colonnes):
+            personne.x, personne.y, personne.vx, personne.vy, personne.ax, personne.ay, personne.p = x, y, vx, vy, ax, ay, p
+            personne.TPS_INFECTE = tps_infecte
+            personne.etat = Etat(valeur_etat)
+        self.sains = {indice: self.personnes[indice] for indice in etat["sains"].tolist()}
+        self.infectes = {indice: self.personnes[indice] for indice in etat["infectes"].tolist()}
+        self.retablis = {indice: self.personnes[indice] for indice in etat["retablis"].tolist()}
+        # Les instantanés plus anciens que le journal des infections n'ont pas les personnes contagieuses
+        infecteurs = etat.get("infecteurs", np.full(len(etat["nouveaux_infectes"]), -1)).tolist()
+        self.nouveaux_infectes = dict(zip(etat["nouveaux_infectes"].tolist(), infecteurs))
+        self.guerisons = {iteration: indices.tolist() for iteration, indices in etat["guerisons"].items()}
+        # La grille ne dépend que des positions
+        if self.grille is not None:
+            self.grille.construire(self.personnes)
+
+
+    @classmethod
+    def depuis_etat(cls, etat, ecran=None):
+        """ Recrée une simulation depuis un état capturé par capturer_etat
+        ---
+        paramètres :
+
+            - etat (dict) le résultat de capturer_etat
+            - ecran (Pygame.Surface / None) la surface sur laquelle afficher la simulation, None pour une simulation sans affichage
+
+        résultat :
+
+            - Simulation
+        """
+        population = etat["population"]
+        # Les personnes sont remplies par restaurer_population, seule leur taille sert à construire la grille
+        personnes = [Personne(k, 0, 0, 0, 0, 0, 0, 0, rayon, 0) for k, rayon in enumerate(population["rayon"].tolist())]
+        simulation = cls(personnes, etat["largeur_sim"], etat["hauteur_sim"], ecran, etat["taux_incidence"], etat["seuil"], population["grille"])
+        simulation.restaurer_etat(etat)
+        return simulation
+
+
+def creer_personnes(nb_personnes, largeur_sim, hauteur_sim, p, rayon, generateur=None):
+    """ Crée aléatoirement les personnes d'une simulation
+    ---
+    paramètres :
+
+        - nb_personnes (int) le nombre de personnes
+        - largeur_sim (int) la largeur de l'espace de simulation
+        - hauteur_sim (int) la hauteur de l'espace de simulation
+        - p (float, 0 <= p <= 1) la probabilité de contaminer une personne
+        - rayon (int) la taille des personnes
+        - generateur (np.random.Generator / None) le générateur de nombres aléatoires (celui de la simulation)
+
+    résultat :
+
+        - list(Personne)
+    """
+    generateur = np.random.default_rng() if generateur is None else generateur
+    # Les tirages sont faits en bloc, dans le même ordre que PopulationVectorisee.aleatoire : une même graine donne les mêmes personnes
+    v = generateur.integers(0, 501, nb_personnes) / 100
+    theta = generateur.integers(0, 629, nb_personnes) / 100
+    x = generateur.integers(0, largeur_sim + 1, nb_personnes)
+    y = generateur.integers(0, hauteur_sim + 1, nb_personnes)
+    tps_infecte = generateur.integers(40, 61, nb_personnes)
+    colonnes = zip((v * np.cos(theta)).tolist(), (v * np.sin(theta)).tolist(), x.tolist(), y.tolist(), tps_infecte.tolist())
+    return [Personne(k, x, y, vx, vy, 0, 0, p, rayon, tps) for k, (vx, vy, x, y, tps) in enumerate(colonnes)]
+
+
+def graines_repliques(nb_sim, graine=None):
+    """ Crée des graines indépendantes et reproductibles pour chaque réplique
+    ---
+    paramètres :
+
+        - nb_sim (int) le nombre de répliques
+        - graine (int / None) la graine de l'ensemble (None pour en tirer une au hasard)
+
+    résultats :
+
+        - int (la graine de l'ensemble, à conserver pour reproduire les résultats)
+        - list(np.random.SeedSequence) (la graine de chaque réplique, à passer telle quelle à np.random.default_rng)
+    """
+    # Les séquences filles gardent toute l'entropie de l'ensemble : les réduire à un entier de 32 bits ferait perdre leur indépendance
+    sequence = np.random.SeedSequence(graine)
+    return sequence.entropy, sequence.spawn(nb_sim)
+
+
+def executer(simulation, nb_iterations_max=None, instantanes=None):
+    """ Fait tourner une simulation jusqu'à sa fin, aussi vite que possible
+    ---
+    paramètres :
+
+        - simulation (Simulation) la simulation, de préférence créée sans écran
+        - nb_iterations_max (int / None) le nombre maximal d'itérations (None pour aller jusqu'à la fin de l'épidémie)
+        - instantanes (Instantanes / None) l'enregistreur des sauvegardes périodiques de la simulation
+
+    résultat :
+
+        - dict(str: list(int)) les données de la simulation
+    """
+    n = 0
+    while not simulation.terminee and (nb_iterations_max is None or n < nb_iterations_max):
+        simulation.mise_a_jour()
+        if instantanes is not None:
+            instantanes.enregistrer(simulation)
+        n += 1
+    return simulation.donnees
+
+
+def creer_simulation(nb_personnes, largeur_sim, hauteur_sim, taux_incidence, seuil, p=.5, rayon=6, vectorise=False, grille=True, graine=None, compile=False, nb_tuiles=0, evenements=False):
+    """ Crée une simulation sans affichage, prête à être lancée par executer
+    ---
+    paramètres :
+
+        - nb_personnes (int) le nombre de personnes
+        - largeur_sim (int) la largeur de l'espace de simulation
+        - hauteur_sim (int) la hauteur de l'espace de simulation
+        - taux_incidence (int) le nombre de personnes infectés simultanément avant de mettre en place une quarantaine (0 pour aucune mesure)
+        - seuil (float 0 <= seuil <= 1) le pourcentage de taux_incidence à atteindre afin de mettre fin à la quarantaine
+        - p (float, 0 <= p <= 1) la probabilité de contaminer une personne
+        - rayon (int) la taille des personnes
+        - vectorise (bool) si on utilise la population vectorisée
+        - grille (bool) si on recherche les voisins avec une grille spatiale (population de Personne seulement)
+        - graine (int / np.random.SeedSequence / None) la graine des générateurs aléatoires, pour pouvoir reproduire la simulation
+        - compile (bool) si la population vectorisée est calculée par les noyaux numba parallèles
+        - nb_tuiles (int) le nombre de processus entre lesquels l'espace est découpé (0 pour tout calculer dans ce processus, implique vectorise)
+        - evenements (bool) si la simulation avance d'événement en événement, plus rapide pour une population peu dense (pas à pas pendant une quarantaine, par les noyaux numba si compile)
+
+    résultat :
+
+        - Simulation
+    """
+    if evenements:
+        from PopulationVectorisee import PopulationVectorisee
+        from SimulationEvenements import SimulationEvenements
+        if compile:
+            from PopulationCompilee import PopulationCompilee as PopulationVectorisee
+        population = PopulationVectorisee.aleatoire(nb_personnes, largeur_sim, hauteur_sim, p, rayon, np.random.default_rng(graine))
+        return SimulationEvenements(population, largeur_sim, hauteur_sim, None, taux_incidence, seuil)
+    if nb_tuiles:
+        from PopulationVectorisee import PopulationVectorisee
+        from SimulationDistribuee import SimulationDistribuee
+        population = PopulationVectorisee.aleatoire(nb_personnes, largeur_sim, hauteur_sim, p, rayon, np.random.default_rng(graine))
+        return SimulationDistribuee(population, largeur_sim, hauteur_sim, None, taux_incidence, seuil, nb_tuiles)
+    if vectorise:
+        from PopulationVectorisee import PopulationVectorisee, SimulationVectorisee
+        if compile:
+            from PopulationCompilee import PopulationCompilee as PopulationVectorisee
+        population = PopulationVectorisee.aleatoire(nb_personnes, largeur_sim, hauteur_sim, p, rayon, np.random.default_rng(graine))
+        return SimulationVectorisee(population, largeur_sim, hauteur_sim, None, taux_incidence, seuil)
+    # Les personnes et les tirages de la simulation viennent du même générateur
+    generateur = np.random.default_rng(graine)
+    personnes = creer_personnes(nb_personnes, largeur_sim, hauteur_sim, p, rayon, generateur)
+    return Simulation(personnes, largeur_sim, hauteur_sim, None, taux_incidence, seuil, grille, generateur)
+
+
+def simuler(nb_personnes, largeur_sim, hauteur_sim, taux_incidence, seuil, p=.5, rayon=6, vectorise=False, grille=True, nb_iterations_max=None, graine=None, compile=False, nb_tuiles=0, evenements=False):
+    """ Lance une simulation sans affichage, utilisable sur un serveur sans écran
+    ---
+    paramètres :
+
+        - nb_iterations_max (int / None) le nombre maximal d'itérations
+        - les autres paramètres sont ceux de creer_simulation
+
+    résultat :
+
+        - dict(str: list(int)) les données de la simulation
+    """
+    simulation = creer_simulation(nb_personnes, largeur_sim, hauteur_sim, taux_incidence, seuil, p, rayon, vectorise, grille, graine, compile, nb_tuiles, evenements)
+    donnees = executer(simulation, nb_iterations_max)
+    simulation.fermer()
+    return donnees
+
+
+if __name__ == "__main__":
+    # Si on affiche la simulation (False pour tourner sans fenêtre, aussi vite que possible)
+    AFFICHAGE = True
+    # Si l'affichage est fait dans un écran virtuel, sans fenêtre (pilote vidéo "dummy", pour enregistrer les images sur un serveur)
+    ECRAN_VIRTUEL = False
+
+    if AFFICHAGE:
+        if ECRAN_VIRTUEL:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+        # On lance le moteur graphique
+        pygame.init()
+        info = pygame.display.Info()
+
+        # On crée l'écran (un écran virtuel a la taille d'un écran 1920 x 1080)
+        taille_ecran = (1920, 1080) if ECRAN_VIRTUEL else (info.current_w, info.current_h)
+        ecran = pygame.display.set_mode(taille_ecran, pygame.NOFRAME)
+        ecran.fill(BG)
+
+        # On récupère les dimensios de l'espace de simulation
+        largeur_sim = taille_ecran[0] // 2 - 10
+        hauteur_sim = taille_ecran[1] - 10
+    else:
+        ecran = None
+        # Les dimensions de l'espace de simulation sur un écran 1920 x 1080
+        largeur_sim, hauteur_sim = 950, 1070
+
+    # Le nombre de simulation à faire
+    NB_SIM = 1
+    # Le fraction du seuil critique pour arrêter la quarantaine
+    SEUIL = 0.3
+    # Si on doit sauvegarder
+    SAUVEGARDER = False
+    # Le nombre de personnes de la simulation
+    NB_PERSONNES = 1200
+    # Si on utilise la grille spatiale pour la recherche de voisins (False pour le parcours exhaustif, utile pour valider)
+    GRILLE = True
+    # Si on utilise la population vectorisée (tableaux numpy) plutôt qu'une liste de Personne
+    VECTORISE = False
+    # Si la population vectorisée est calculée par les noyaux numba parallèles
+    COMPILE = False
+    # Le nombre de processus entre lesquels l'espace de simulation est découpé (0 pour tout calculer dans ce processus)
+    NB_TUILES = 0
+    # Le nombre de personnes infectés critique
+    TAUX_INCIDENCE = 100
+    # On n'affiche qu'une itération sur PERIODE_AFFICHAGE (1 pour toutes les afficher)
+    PERIODE_AFFICHAGE = 1
+    # Le dossier de sauvegarde
+    NOM_DOSSIER = os.path.join("Simulation", f"Taux incidence {TAUX_INCIDENCE}")
+    # Le nombre d'itérations entre deux instantanés de la simulation (0 pour ne pas en faire)
+    PERIODE_INSTANTANES = 0
+    # L'instantané depuis lequel reprendre la première simulation (None pour partir de zéro)
+    REPRENDRE = None
+    # Si on mesure le temps passé dans chaque phase d'une itération dès le début (la touche P active et désactive les mesures)
+    PROFILAGE = False
+    # La graine des simulations (None pour en tirer une au hasard), chaque simulation a sa propre graine qui en est issue
+    GRAINE = None
+    # Si on écrit chaque infection (itération, personne contagieuse, personne infectée, position) dans un journal binaire
+    JOURNAL = False
+    # Si on enregistre les images affichées (sautées si l'encodage prend du retard), dans une archive zip si ARCHIVE_IMAGES, sinon dans un dossier
+    ENREGISTRER_IMAGES = False
+    ARCHIVE_IMAGES = True
+
+    if PROFILAGE:
+        PROFILEUR.activer()
+
+
+    # Des graines indépendantes pour chaque simulation : elles sont enregistrées avec les résultats
+    _, graines = graines_repliques(NB_SIM, GRAINE)
+
+    for n in range(NB_SIM):
+        generateur = np.random.default_rng(graines[n])
+        if n == 0 and REPRENDRE is not None:
+            from Instantanes import reprendre
+            # On reprend la simulation là où l'instantané l'a laissée
+            Sim = reprendre(REPRENDRE, ecran)
+        elif NB_TUILES:
+            from PopulationVectorisee import PopulationVectorisee
+            from SimulationDistribuee import SimulationDistribuee
+            population = PopulationVectorisee.aleatoire(NB_PERSONNES, largeur_sim, hauteur_sim, .5, 6, generateur)
+            # Chaque bande de l'espace est calculée par son propre processus
+            Sim = SimulationDistribuee(population, largeur_sim, hauteur_sim, ecran, TAUX_INCIDENCE, SEUIL, NB_TUILES)
+        elif VECTORISE:
+            from PopulationVectorisee import PopulationVectorisee, SimulationVectorisee
+            if COMPILE:
+                from PopulationCompilee import PopulationCompilee as PopulationVectorisee
+            # On crée aléatoirement la population, directement sous forme de tableaux
+            population = PopulationVectorisee.aleatoire(NB_PERSONNES, largeur_sim, hauteur_sim, .5, 6, generateur)
+            # On initialise la simulation
+            Sim = SimulationVectorisee(population, largeur_sim, hauteur_sim, ecran, TAUX_INCIDENCE, SEUIL)
+        else:
+            # On crée aléatoirment les personnes
+            personnes = creer_personnes(NB_PERSONNES, largeur_sim, hauteur_sim, .5, 6, generateur)
+            # On initialise la simulation
+            Sim = Simulation(personnes, largeur_sim, hauteur_sim, ecran, TAUX_INCIDENCE, SEUIL, GRILLE, generateur)
+        # Tous les moteurs ne savent pas capturer leur état : on le vérifie avant de lancer la simulation, pas au premier instantané
+        if PERIODE_INSTANTANES and not Sim.instantanes_possibles:
+            Sim.fermer()
+            raise ValueError(f"Les instantanés ne sont pas disponibles pour une simulation {type(Sim).__name__} (PERIODE_INSTANTANES)")
+        Sim.periode_affichage = PERIODE_AFFICHAGE
+        Sim.initialisation_affichage()
+
+        # On crée une table dans la base de donnée pour enregistrer les donnée de la simulation
+        if SAUVEGARDER:
+            # On crée le dossier s'il n'existe pas
+            if not os.path.exists(NOM_DOSSIER):
+                os.makedirs(NOM_DOSSIER)
+            # On crée une table portant le numéro suivant, remplie par paquets depuis un autre fil d'exécution
+            enregistreur = EnregistreurResultats(os.path.join(NOM_DOSSIER, "result.db"), Sim.donnees, graine=Sim.graine)
+
+        # On garde la trace de chaque infection, pour reconstruire les chaînes de transmission
+        if JOURNAL:
+            from JournalInfections import JournalInfections
+            Sim.journal = JournalInfections(os.path.join(NOM_DOSSIER, f"Infections - Personnes {NB_PERSONNES}, SEUIL {SEUIL}, simulation {n}.bin"))
+
+        # On enregistre chaque image affichée, encodée depuis d'autres fils d'exécution
+        if ENREGISTRER_IMAGES and AFFICHAGE:
+            from EnregistreurImages import EnregistreurImages
+            nom_images = os.path.join(NOM_DOSSIER, f"Images - Personnes {NB_PERSONNES}, SEUIL {SEUIL}, simulation {n}")
+            Sim.enregistreur_images = EnregistreurImages(nom_images + ".zip" if ARCHIVE_IMAGES else nom_images, ARCHIVE_IMAGES)
+
+        # On sauvegarde régulièrement l'état complet de la simulation, depuis un autre fil d'exécution
+        if PERIODE_INSTANTANES:
+            from Instantanes import Instantanes
+            instantanes = Instantanes(os.path.join(NOM_DOSSIER, "Instantanes"), PERIODE_INSTANTANES)
+
+
+        x = 0
+        # Boucle principale de la simulation
+        while not Sim.terminee:
+            if AFFICHAGE:
+                # On gère les interactions avec l'utilisateur
+                for event in pygame.event.get():
+                    # Si on appuie sur Échap
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                        # On ferme le programme
+                        quit()
+                    # Si on appuie sur P, on active ou désactive les mesures des phases
+                    if event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                        PROFILEUR.basculer()
+
+                # On attend entre chaque itération affichée
+                if Sim.iteration % PERIODE_AFFICHAGE == 0:
+                    time.sleep(.01)
+            # On met à jour la simulation
+            Sim.mise_a_jour()
+            # On l'affiche
+            Sim.afficher()
+            if PERIODE_INSTANTANES:
+                instantanes.enregistrer(Sim)
+            if SAUVEGARDER:
+                # On sauvegarde les nouvelles données
+                enregistreur.ajouter([Sim.donnees[clee][x] / NB_PERSONNES for clee in Sim.donnees])
+                x += 1
+
+        # On écrit les dernières données et on ferme la base de donnée (fait aussi à la sortie du programme)
+        if SAUVEGARDER:
+            enregistreur.fermer()
+        if PERIODE_INSTANTANES:
+            instantanes.fermer()
+        if JOURNAL:
+            Sim.journal.fermer()
+        if Sim.enregistreur_images is not None:
+            Sim.enregistreur_images.fermer()
+            print(f"{Sim.enregistreur_images.nb_enregistrees} images enregistrées, {Sim.enregistreur_images.nb_sautees} sautées")
+        # On arrête les processus éventuels de la simulation
+        Sim.fermer()
+
         # On crée le dossier s'il n'existe pas
         if not os.path.exists(NOM_DOSSIER):
             os.makedirs(NOM_DOSSIER)
-        # On se déplace dans ce dossier
-        os.chdir(NOM_DOSSIER)
-        # On se connecte à la base de donnée
-        bdd = sqlite3.connect("result.db", check_same_thread=False)
-        curseur = bdd.cursor()
-        # On récupère le nombre de simulation
-        l = len(curseur.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall())
-        # On crée une table portant le numéro suivant
-        curseur.execute(f"""CREATE TABLE IF NOT EXISTS Sim{l} (id integer PRIMARY KEY, {",".join([f'{clee} int' for clee in Sim.donnees])})""")
-
-
-    x = 0
-    # Boucle principale de la simulation
-    while not Sim.terminee:
-        # On gère les interactions avec l'utilisateur
-        for event in pygame.event.get():
-            # Si on appuie sur Échap
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                # On ferme le programme
-                quit()
-
-        # On attend entre chaque itération
-        time.sleep(.01)
-        # On met à jour la simulation
-        Sim.mise_a_jour()
-        # On l'affiche
-        Sim.afficher()
-        if SAUVEGARDER:
-            # On sauvegarde les nouvelles données
-            curseur.execute(f"""INSERT INTO Sim{l} VALUES (NULL, {",".join([str(Sim.donnees[clee][x] / NB_PERSONNES) for clee in Sim.donnees])})""")
-            bdd.commit()
-            x += 1
-
-    # On ferme la base de donnée
-    if SAUVEGARDER:
-        bdd.close()
 
-    # On crée le dossier s'il n'existe pas
-    if not os.path.exists(NOM_DOSSIER):
-        os.makedirs(NOM_DOSSIER)
+        # On sauvegarde la dernière image de la simulation
+        if AFFICHAGE:
+            pygame.image.save(Sim.ecran, os.path.join(NOM_DOSSIER, f"Résultat - Personnes {NB_PERSONNES}, SEUIL {SEUIL}.jpg"))
 
-    # On sauvegarde la dernière image de la simulation
-    pygame.image.save(Sim.ecran, f"{NOM_DOSSIER}\\Résultat - Personnes {NB_PERSONNES}, SEUIL {SEUIL}.jpg")
+        # On affiche le temps passé dans chaque phase et on écrit la trace, à ouvrir dans chrome://tracing
+        if PROFILEUR.phases:
+            print(PROFILEUR.tableau())
+            PROFILEUR.ecrire_trace(os.path.join(NOM_DOSSIER, f"Trace - Personnes {NB_PERSONNES}, SEUIL {SEUIL}.json"))
+            PROFILEUR.reinitialiser()
 
 
 # TODO: